@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Annotated
+
+from fastapi import APIRouter, Body, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from profiling import (
+    PROFILE_REQUEST_HEADER,
+    ProfilerBusyException,
+    create_profile_request_token,
+    profile_process,
+    request_profiles,
+)
+from pydantic import BaseModel, Field
+from settings import settings
+from telemetry import span_processor, trace_sampler, update_trace_sampling
+from trace_sampling import TraceExportConfig, TraceSamplingConfig
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+admin_router = APIRouter()
+
+
+class TraceSamplingSettings(BaseModel):
+    sampling: Annotated[
+        TraceSamplingConfig, Field(description="The trace sampling rules")
+    ]
+    export: Annotated[
+        TraceExportConfig, Field(description="The span batching and queue sizes")
+    ]
+
+
+@admin_router.get(
+    path="/telemetry/tracing",
+    summary="Get the trace sampling and export settings",
+)
+async def get_trace_sampling_settings() -> TraceSamplingSettings:
+    return TraceSamplingSettings(
+        sampling=trace_sampler.config, export=span_processor.export_config
+    )
+
+
+@admin_router.put(
+    path="/telemetry/tracing",
+    summary="Update the trace sampling and export settings",
+    description="Applies new sampling rules and span export settings to this replica without a redeploy. Settings are not persisted and reset to the environment configuration on restart.",
+)
+async def update_trace_sampling_settings(
+    trace_sampling_settings: Annotated[TraceSamplingSettings, Body],
+) -> TraceSamplingSettings:
+    logger.info(
+        f"Updating trace sampling settings: {trace_sampling_settings.model_dump_json()}"
+    )
+    # New export settings flush and shut down the previous span processor,
+    # which waits on its exporter.
+    await asyncio.to_thread(
+        update_trace_sampling,
+        sampling_config=trace_sampling_settings.sampling,
+        export_config=trace_sampling_settings.export,
+    )
+    return await get_trace_sampling_settings()
+
+
+class ProfileRequestToken(BaseModel):
+    header_name: Annotated[str, Field(description="The request header to send")]
+    header_value: Annotated[str, Field(description="The signed header value")]
+    expires_at: Annotated[
+        int, Field(description="When the token expires (Unix time in seconds)")
+    ]
+
+
+@admin_router.get(
+    path="/profiling/process",
+    summary="Profile this replica",
+    description="Samples the stacks of every thread of this replica (the event loop, request workers and background resizes) for the given duration and returns them in the collapsed stack format read by flamegraph.pl, inferno and speedscope.",
+    response_class=PlainTextResponse,
+)
+async def get_process_profile(
+    duration_seconds: Annotated[
+        float, Query(gt=0, le=settings.PROFILER_MAX_DURATION_SECONDS)
+    ] = 10,
+    interval_seconds: Annotated[
+        float, Query(ge=0.001, le=1)
+    ] = settings.PROFILER_SAMPLING_INTERVAL_SECONDS,
+) -> PlainTextResponse:
+    try:
+        collapsed_stacks: str = await profile_process(
+            duration_seconds=duration_seconds, interval_seconds=interval_seconds
+        )
+    except ProfilerBusyException:
+        raise HTTPException(status_code=409, detail="A profile is already running")
+
+    filename: str = f"profile-{os.getpid()}-{int(time.time())}.folded"
+    return PlainTextResponse(
+        content=collapsed_stacks,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@admin_router.post(
+    path="/profiling/request-token",
+    summary="Create a token that enables profiling of requests",
+    description="Requests sent with the returned header are profiled individually; their responses carry an X-Profile-Id header to fetch the profile with.",
+)
+async def create_request_profiling_token(
+    ttl_seconds: Annotated[
+        int, Query(gt=0, le=settings.PROFILE_REQUEST_TOKEN_MAX_TTL_SECONDS)
+    ] = 300,
+) -> ProfileRequestToken:
+    header_value: str = create_profile_request_token(ttl_seconds=ttl_seconds)
+    return ProfileRequestToken(
+        header_name=PROFILE_REQUEST_HEADER,
+        header_value=header_value,
+        expires_at=int(header_value.split(".")[0]),
+    )
+
+
+@admin_router.get(
+    path="/profiling/requests/{profile_id}",
+    summary="Get the profile of a request",
+    description="Profiles are kept by the replica process that handled the request, for a limited time.",
+    response_class=PlainTextResponse,
+)
+async def get_request_profile(profile_id: str) -> PlainTextResponse:
+    collapsed_stacks: str | None = request_profiles.get(key=profile_id)
+    if collapsed_stacks is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(content=collapsed_stacks)
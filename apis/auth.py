@@ -1,8 +1,14 @@
-import jwt
+import hmac
+import logging
+from typing import Annotated
+from uuid import UUID, uuid4
+
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.security import APIKeyHeader, SecurityScopes
 from fastapi_azure_auth import SingleTenantAzureAuthorizationCodeBearer
-from jwt import PyJWKClient
+from fastapi_azure_auth.user import User
+from pydantic import BaseModel, Field
 from settings import settings
-import logging
 
 logger: logging.Logger = logging.getLogger(__name__)
 
@@ -15,20 +21,71 @@ azure_scheme = SingleTenantAzureAuthorizationCodeBearer(
     allow_guest_users=True,
 )
 
+admin_api_key_scheme = APIKeyHeader(name="X-Admin-Api-Key", auto_error=False)
+
+
+class Principal(BaseModel):
+    oid: Annotated[UUID, Field(description="The object ID of the caller")]
+    is_guest: Annotated[
+        bool, Field(description="Whether the caller is an unauthenticated guest")
+    ]
+    user: Annotated[
+        User | None, Field(description="The validated token claims", default=None)
+    ]
+
+
+async def authenticate_request(request: Request) -> Principal:
+    """
+    Verify the bearer token (if any) exactly once and attach the resulting
+    principal to `request.state.principal`.
+    """
+    if "Authorization" not in request.headers:
+        principal = Principal(oid=uuid4(), is_guest=True)
+    else:
+        logger.info("Validating JWT token")
+        user: User = await azure_scheme(
+            request=request, security_scopes=SecurityScopes()
+        )
+        if user.oid is None:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Token does not contain an object ID",
+            )
+        principal = Principal(oid=UUID(user.oid), is_guest=False, user=user)
+        logger.info("Validated JWT token")
+
+    request.state.principal = principal
+    return principal
+
+
+def get_principal(request: Request) -> Principal:
+    return request.state.principal
 
-def decode_jwt_token(token: str, jwks_url: str, audience: str) -> dict:
-    logger.info("Decoding JWT token")
-    token = token.split(" ")[1]
 
-    jwks_client = PyJWKClient(jwks_url)
-    signing_key = jwks_client.get_signing_key_from_jwt(token).key
+async def require_registered_principal(
+    request: Request,
+    # Declares the OAuth2 scheme in the OpenAPI document; validation already
+    # happened once in the authentication middleware.
+    _access_token: Annotated[str, Depends(azure_scheme.oauth)],
+) -> Principal:
+    principal: Principal = get_principal(request=request)
+    if principal.is_guest:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated"
+        )
+    return principal
 
-    decoded_token = jwt.decode(
-        token,
-        signing_key,
-        algorithms=["RS256"],
-        audience=audience,
-    )
 
-    logger.info("Decoded JWT token")
-    return decoded_token
+def require_admin_api_key(
+    api_key: Annotated[str | None, Depends(admin_api_key_scheme)],
+) -> None:
+    if settings.ADMIN_API_KEY is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Admin API is disabled"
+        )
+    if api_key is None or not hmac.compare_digest(
+        api_key.encode(), settings.ADMIN_API_KEY.encode()
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Invalid admin API key"
+        )
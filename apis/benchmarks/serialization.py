@@ -0,0 +1,162 @@
+"""
+Serialization benchmark for the `/orchestrate` and `/photos/get-signed-url`
+response payloads.
+
+Each payload is serialized the way FastAPI does with a returned value (dump
+it, re-validate it against the response model, dump that to JSON-compatible
+data and encode it) with both `json` and orjson, and with the pre-built
+`TypeAdapter.dump_json` the routes use. `/orchestrate` also gets the path it
+took before it had a response model: `jsonable_encoder` over dicts of models.
+The median time per response is reported.
+
+Run from the `apis` directory with the application settings in the
+environment (or `.env`):
+
+    python -m benchmarks.serialization --repeats 7 --number 2000
+"""
+
+import argparse
+import json
+import statistics
+import timeit
+from typing import Any, Callable, Dict, List
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from factories.AzureStorageAccountClientFactory.models import Resolutions
+from photos.models import ImageResizeResponse, PresignedUrlResponse
+from photos.router import presigned_url_response_adapter
+from router import OrchestratedImage, orchestrate_response_adapter
+from url_shortener.models import ShortUrlCommonResponse
+
+_STORAGE_ACCOUNT_URL = "https://guest.blob.core.windows.net"
+_CONTAINER_NAME = "guest-shard-007"
+_FOLDER_NAME = "3fa85f64-5717-4562-b3fc-2c963f66afa6"
+
+
+def create_orchestrated_images() -> List[OrchestratedImage]:
+    return [
+        OrchestratedImage(
+            image_resize_response=ImageResizeResponse(
+                url=f"{_STORAGE_ACCOUNT_URL}/{_CONTAINER_NAME}/{_FOLDER_NAME}/{resolution.value}.jpeg",
+                resolution=resolution,
+            ),
+            short_url_response=ShortUrlCommonResponse(
+                short_id=f"ABCDEF{index}",
+                short_url=f"https://img.example.com/s/ABCDEF{index}",
+                original_url=f"{_STORAGE_ACCOUNT_URL}/{_CONTAINER_NAME}/{_FOLDER_NAME}/{resolution.value}.jpeg",
+                should_redirect=False,
+            ),
+        )
+        for index, resolution in enumerate(Resolutions)
+    ]
+
+
+def create_presigned_url_response() -> PresignedUrlResponse:
+    return PresignedUrlResponse(
+        url=f"{_STORAGE_ACCOUNT_URL}/{_CONTAINER_NAME}/{_FOLDER_NAME}/original.jpeg"
+        "?se=2024-10-19T12%3A00%3A00Z&sp=cw&sv=2024-05-04&sr=b"
+        "&sig=q8xQm2m9v%2FlJ0Hk3h7Q0bXo2kq0%2B3v4n1cYtJp6Zb5E%3D"
+    )
+
+
+def serialize_like_fastapi(
+    adapter: TypeAdapter, content: Any, dumps: Callable[[Any], bytes]
+) -> bytes:
+    prepared = adapter.dump_python(content)
+    value = adapter.validate_python(prepared)
+    return dumps(jsonable_encoder(adapter.dump_python(value, mode="json")))
+
+
+def dumps_json(content: Any) -> bytes:
+    # As Starlette's JSONResponse renders
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def dumps_orjson(content: Any) -> bytes:
+    return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--repeats",
+        type=int,
+        default=7,
+        help="Measurements per serializer; the median is reported",
+    )
+    parser.add_argument(
+        "--number",
+        type=int,
+        default=2000,
+        help="Responses serialized per measurement",
+    )
+    args = parser.parse_args()
+
+    orchestrated_images: List[OrchestratedImage] = create_orchestrated_images()
+    presigned_url_response: PresignedUrlResponse = create_presigned_url_response()
+    # A fresh model per response, so the URL is split as often as it would be
+    presigned_url: str = str(presigned_url_response.url)
+
+    payloads: Dict[str, Dict[str, Callable[[], bytes]]] = {
+        "/orchestrate": {
+            "jsonable_encoder + json (before)": lambda: dumps_json(
+                jsonable_encoder(
+                    [
+                        {
+                            "image_resize_response": image.image_resize_response,
+                            "short_url_response": image.short_url_response,
+                        }
+                        for image in orchestrated_images
+                    ]
+                )
+            ),
+            "fastapi + json": lambda: serialize_like_fastapi(
+                adapter=orchestrate_response_adapter,
+                content=orchestrated_images,
+                dumps=dumps_json,
+            ),
+            "fastapi + orjson": lambda: serialize_like_fastapi(
+                adapter=orchestrate_response_adapter,
+                content=orchestrated_images,
+                dumps=dumps_orjson,
+            ),
+            "type adapter": lambda: orchestrate_response_adapter.dump_json(
+                orchestrated_images
+            ),
+        },
+        "/photos/get-signed-url": {
+            "fastapi + json": lambda: serialize_like_fastapi(
+                adapter=presigned_url_response_adapter,
+                content=PresignedUrlResponse(url=presigned_url),
+                dumps=dumps_json,
+            ),
+            "fastapi + orjson": lambda: serialize_like_fastapi(
+                adapter=presigned_url_response_adapter,
+                content=PresignedUrlResponse(url=presigned_url),
+                dumps=dumps_orjson,
+            ),
+            "type adapter": lambda: presigned_url_response_adapter.dump_json(
+                PresignedUrlResponse(url=presigned_url)
+            ),
+        },
+    }
+
+    print(f"{'payload':>24} {'serializer':>34} {'us':>8} {'bytes':>6}")
+    for payload, serializers in payloads.items():
+        for name, serialize in serializers.items():
+            seconds: float = statistics.median(
+                timeit.repeat(serialize, repeat=args.repeats, number=args.number)
+            )
+            print(
+                f"{payload:>24} {name:>34} {seconds / args.number * 1e6:>8.1f} "
+                f"{len(serialize()):>6}"
+            )
+
+
+if __name__ == "__main__":
+    main()
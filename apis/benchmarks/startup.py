@@ -0,0 +1,155 @@
+"""
+Import-time and startup benchmark for the API process.
+
+Measures how long `import router` takes (with the slowest modules reported by
+`python -X importtime`) and the time from spawning `uvicorn router:app` until
+the first successful request to `/health/liveness`. Exits with a non-zero
+status when either measurement exceeds its budget, so it can gate changes that
+would slow down scale-out replicas.
+
+Run from the `apis` directory with the application settings in the
+environment (or `.env`):
+
+    python -m benchmarks.startup --import-budget-seconds 1.5 --first-request-budget-seconds 4
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import httpx
+
+_APIS_DIRECTORY = Path(__file__).resolve().parent.parent
+
+
+def measure_import_time() -> Tuple[float, Dict[str, float]]:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import router"],
+        cwd=_APIS_DIRECTORY,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    cumulative_seconds_by_module: Dict[str, float] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative_us, module = line.split("|")
+        if not cumulative_us.strip().isdigit():
+            continue
+        module_name: str = module.strip()
+        cumulative_seconds_by_module[module_name] = int(cumulative_us) / 1_000_000
+
+    return cumulative_seconds_by_module.get("router", 0.0), cumulative_seconds_by_module
+
+
+def get_free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_serving(
+    server: subprocess.Popen, port: int, started_at: float, timeout_seconds: float
+) -> float:
+    with httpx.Client(timeout=1) as client:
+        while time.perf_counter() - started_at < timeout_seconds:
+            if server.poll() is not None:
+                raise RuntimeError("The API process exited during startup")
+            try:
+                response = client.get(f"http://127.0.0.1:{port}/health/liveness")
+                if response.status_code == 200:
+                    return time.perf_counter() - started_at
+            except httpx.TransportError:
+                pass
+            time.sleep(0.01)
+    raise TimeoutError(f"No successful request within {timeout_seconds}s")
+
+
+def measure_time_to_first_request(timeout_seconds: float) -> float:
+    port: int = get_free_port()
+    started_at: float = time.perf_counter()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "router:app",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+        ],
+        cwd=_APIS_DIRECTORY,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        env=os.environ.copy(),
+    )
+
+    try:
+        return wait_until_serving(
+            server=server,
+            port=port,
+            started_at=started_at,
+            timeout_seconds=timeout_seconds,
+        )
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--import-budget-seconds", type=float, default=1.5)
+    parser.add_argument("--first-request-budget-seconds", type=float, default=4.0)
+    args = parser.parse_args()
+
+    import_times: List[float] = []
+    first_request_times: List[float] = []
+    slowest_modules: Dict[str, float] = {}
+
+    for _ in range(args.runs):
+        import_time, modules = measure_import_time()
+        import_times.append(import_time)
+        slowest_modules = modules
+        first_request_times.append(
+            measure_time_to_first_request(
+                timeout_seconds=args.first_request_budget_seconds * 5
+            )
+        )
+
+    print("Slowest modules (cumulative import time, last run):")
+    for module, seconds in sorted(
+        slowest_modules.items(), key=lambda item: item[1], reverse=True
+    )[: args.top]:
+        print(f"  {seconds * 1000:8.1f} ms  {module}")
+
+    import_time = statistics.median(import_times)
+    first_request_time = statistics.median(first_request_times)
+    print(
+        f"import router:          {import_time * 1000:8.1f} ms (budget {args.import_budget_seconds * 1000:.0f} ms)"
+    )
+    print(
+        f"time to first request: {first_request_time * 1000:6.1f} ms (budget {args.first_request_budget_seconds * 1000:.0f} ms)"
+    )
+
+    is_within_budget: bool = (
+        import_time <= args.import_budget_seconds
+        and first_request_time <= args.first_request_budget_seconds
+    )
+    if not is_within_budget:
+        print("Startup budget exceeded.")
+    return 0 if is_within_budget else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
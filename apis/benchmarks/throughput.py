@@ -0,0 +1,183 @@
+"""
+Throughput benchmark for the multi-worker serving mode.
+
+Starts `serve.py` once per worker count, drives it with concurrent keep-alive
+connections from several load generator processes for a fixed duration, and
+reports requests per second and latency percentiles, so the scaling from one
+worker to the container's CPU count can be compared.
+
+Run from the `apis` directory with the application settings in the
+environment (or `.env`). CPU-bound routes show the effect best, e.g. an
+authenticated route with a bearer token:
+
+    python -m benchmarks.throughput --workers 1 2 4 --path /health/liveness
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
+
+import httpx
+
+from .startup import _APIS_DIRECTORY, get_free_port, wait_until_serving
+
+
+async def _generate_load(
+    url: str, headers: Dict[str, str], connections: int, duration_seconds: float
+) -> Tuple[List[float], int]:
+    latencies: List[float] = []
+    errors: int = 0
+    deadline: float = time.perf_counter() + duration_seconds
+
+    async def connection(client: httpx.AsyncClient) -> None:
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started_at: float = time.perf_counter()
+            try:
+                response = await client.get(url, headers=headers)
+                if response.status_code >= 500:
+                    errors += 1
+                    continue
+            except httpx.TransportError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - started_at)
+
+    limits = httpx.Limits(
+        max_connections=connections, max_keepalive_connections=connections
+    )
+    async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+        await asyncio.gather(*[connection(client) for _ in range(connections)])
+
+    return latencies, errors
+
+
+def generate_load(
+    url: str, headers: Dict[str, str], connections: int, duration_seconds: float
+) -> Tuple[List[float], int]:
+    return asyncio.run(
+        _generate_load(
+            url=url,
+            headers=headers,
+            connections=connections,
+            duration_seconds=duration_seconds,
+        )
+    )
+
+
+def measure_throughput(
+    workers: int,
+    path: str,
+    headers: Dict[str, str],
+    client_processes: int,
+    connections: int,
+    duration_seconds: float,
+) -> Dict[str, float]:
+    port: int = get_free_port()
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "serve.py",
+            "--host",
+            "127.0.0.1",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+        ],
+        cwd=_APIS_DIRECTORY,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        env=os.environ.copy(),
+    )
+
+    try:
+        wait_until_serving(
+            server=server,
+            port=port,
+            started_at=time.perf_counter(),
+            timeout_seconds=60,
+        )
+        # Every worker warms up in its own lifespan; give the slower ones a
+        # moment so the first seconds do not measure a partial pool.
+        time.sleep(2)
+
+        with ProcessPoolExecutor(max_workers=client_processes) as executor:
+            results = list(
+                executor.map(
+                    generate_load,
+                    [f"http://127.0.0.1:{port}{path}"] * client_processes,
+                    [headers] * client_processes,
+                    [connections] * client_processes,
+                    [duration_seconds] * client_processes,
+                )
+            )
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+
+    latencies: List[float] = sorted(
+        latency for process_latencies, _ in results for latency in process_latencies
+    )
+    errors: int = sum(process_errors for _, process_errors in results)
+    if not latencies:
+        raise RuntimeError(f"No successful requests with {workers} worker(s)")
+
+    return {
+        "requests_per_second": len(latencies) / duration_seconds,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "errors": errors,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--path", default="/health/liveness")
+    parser.add_argument(
+        "--header",
+        action="append",
+        default=[],
+        help="Request header as 'Name: value', e.g. an Authorization header",
+    )
+    parser.add_argument("--client-processes", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--connections", type=int, default=16)
+    parser.add_argument("--duration-seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    headers: Dict[str, str] = dict(
+        (name.strip(), value.strip())
+        for name, value in (header.split(":", 1) for header in args.header)
+    )
+
+    print(
+        f"{args.client_processes} client process(es) x {args.connections} connection(s), {args.duration_seconds:.0f}s per run, GET {args.path}"
+    )
+    print("workers  requests/s   p50 ms   p99 ms  errors  speedup")
+    baseline: float | None = None
+    for workers in args.workers:
+        result: Dict[str, float] = measure_throughput(
+            workers=workers,
+            path=args.path,
+            headers=headers,
+            client_processes=args.client_processes,
+            connections=args.connections,
+            duration_seconds=args.duration_seconds,
+        )
+        baseline = baseline or result["requests_per_second"]
+        print(
+            f"{workers:7d}  {result['requests_per_second']:10.1f}  {result['p50_ms']:7.1f}  {result['p99_ms']:7.1f}  {result['errors']:6.0f}  {result['requests_per_second'] / baseline:6.2f}x"
+        )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+from functools import cache
+
+from factories.AzureStorageAccountClientFactory.client import (
+    AzureStorageAccountClientFactory,
+)
+from factories.AzureStorageAccountClientFactory.models import (
+    AzureStorageAccountClientConfig,
+    ResamplingProfile,
+)
+from factories.AzureTableClientFactory.client import AzureTableClientFactory
+from factories.AzureTableClientFactory.models import (
+    AzureNamedKeyCredential,
+    AzureTableClientFactoryConfig,
+)
+from settings import settings
+
+# Clients are shared for the lifetime of the process so that requests reuse the
+# pooled (keep-alive) connections of the underlying Azure SDK clients instead of
+# opening new ones every time.
+
+
+@cache
+def _get_storage_account_client(
+    account_name: str, account_key: str
+) -> AzureStorageAccountClientFactory:
+    return AzureStorageAccountClientFactory(
+        account_name=account_name,
+        account_key=account_key,
+        listing_cache_ttl_seconds=settings.FOLDER_LISTING_CACHE_TTL_SECONDS,
+        listing_cache_max_entries=settings.FOLDER_LISTING_CACHE_MAX_ENTRIES,
+        rendition_cache_control=settings.RENDITION_CACHE_CONTROL,
+        rendition_cache_control_by_resolution=settings.RENDITION_CACHE_CONTROL_BY_RESOLUTION,
+        resampling_profile=ResamplingProfile(settings.RESIZE_RESAMPLING_PROFILE),
+        probe_initial_bytes=settings.IMAGE_PROBE_INITIAL_BYTES,
+        probe_max_bytes=settings.IMAGE_PROBE_MAX_BYTES,
+        max_image_bytes=settings.IMAGE_MAX_BYTES,
+        max_image_pixels=settings.IMAGE_MAX_PIXELS,
+    )
+
+
+def get_storage_account_client(
+    config: AzureStorageAccountClientConfig,
+) -> AzureStorageAccountClientFactory:
+    return _get_storage_account_client(account_name=config.name, account_key=config.key)
+
+
+@cache
+def get_azure_table_client() -> AzureTableClientFactory:
+    return AzureTableClientFactory(
+        config=AzureTableClientFactoryConfig(
+            storage_account_table_endpoint=settings.AZURE_TABLE_STORAGE_ACCOUNT_URL,
+            table_name=settings.AZURE_STORAGE_ACCOUNT_TABLE_NAME,
+            credentials=AzureNamedKeyCredential(
+                name=settings.AZURE_TABLE_STORAGE_ACCOUNT_NAME,
+                key=settings.AZURE_STORAGE_ACCOUNT_TABLE_KEY,
+            ),
+        )
+    )
@@ -0,0 +1,106 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from settings import settings
+from telemetry import metrics_wrapper
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+class EventLoopMonitor:
+    """
+    Samples the event loop's scheduling delay: how much later than asked a
+    sleep every `interval_seconds` resumes, i.e. how long any callback waits
+    for a loop busy with (or blocked by) other work.
+
+    With `capture_blocking_stacks`, a watchdog thread also logs the stack of
+    the loop's thread whenever a sample is more than
+    `blocking_threshold_seconds` overdue, which points at the call that is
+    blocking it. Each stall is logged once.
+    """
+
+    def __init__(
+        self,
+        interval_seconds: float,
+        blocking_threshold_seconds: float,
+        capture_blocking_stacks: bool,
+    ) -> None:
+        self.interval_seconds: float = interval_seconds
+        self.blocking_threshold_seconds: float = blocking_threshold_seconds
+        self.capture_blocking_stacks: bool = capture_blocking_stacks
+        self._task: asyncio.Task | None = None
+        self._watchdog: threading.Thread | None = None
+        self._stop_watchdog = threading.Event()
+        self._loop_thread_id: int | None = None
+        self._last_sample_at: float = time.monotonic()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled_at: float = loop.time()
+            await asyncio.sleep(self.interval_seconds)
+            lag_seconds: float = loop.time() - scheduled_at - self.interval_seconds
+            self._last_sample_at = time.monotonic()
+            metrics_wrapper.record_event_loop_lag(lag_ms=max(lag_seconds, 0) * 1000)
+
+    def _watch(self) -> None:
+        reported_sample_at: float | None = None
+        while not self._stop_watchdog.wait(timeout=self.blocking_threshold_seconds / 2):
+            last_sample_at: float = self._last_sample_at
+            overdue_seconds: float = (
+                time.monotonic() - last_sample_at - self.interval_seconds
+            )
+            if (
+                overdue_seconds < self.blocking_threshold_seconds
+                or last_sample_at == reported_sample_at
+            ):
+                continue
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            reported_sample_at = last_sample_at
+            logger.warning(
+                f"Event loop blocked for over {overdue_seconds * 1000:.0f}ms in:\n"
+                + "".join(traceback.format_stack(f=frame))
+            )
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._last_sample_at = time.monotonic()
+        self._task = asyncio.create_task(self._run())
+
+        if self.capture_blocking_stacks:
+            self._loop_thread_id = threading.get_ident()
+            self._stop_watchdog.clear()
+            self._watchdog = threading.Thread(
+                target=self._watch, name="event-loop-watchdog", daemon=True
+            )
+            self._watchdog.start()
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+        if self._watchdog is not None:
+            self._stop_watchdog.set()
+            self._watchdog.join()
+            self._watchdog = None
+
+
+event_loop_monitor = EventLoopMonitor(
+    interval_seconds=settings.EVENT_LOOP_MONITOR_INTERVAL_SECONDS,
+    blocking_threshold_seconds=settings.EVENT_LOOP_BLOCKING_THRESHOLD_SECONDS,
+    capture_blocking_stacks=settings.EVENT_LOOP_CAPTURE_BLOCKING_STACKS,
+)
@@ -1,20 +1,49 @@
+import hashlib
 import logging
 from datetime import datetime, timedelta
+from functools import cached_property
 from io import BytesIO
+from typing import TYPE_CHECKING, Any, Dict, List
 from uuid import uuid4
 
-from azure.identity import DefaultAzureCredential
+from azure.core import MatchConditions
+from azure.core.exceptions import (
+    HttpResponseError,
+    ResourceExistsError,
+    ResourceModifiedError,
+)
 from azure.storage.blob import (
     BlobClient,
+    BlobPrefix,
     BlobSasPermissions,
     BlobServiceClient,
     ContainerClient,
+    ContentSettings,
     generate_blob_sas,
 )
-from PIL import Image
-from PIL.ImageFile import ImageFile
+from request_cost import record_storage_bytes
+from telemetry import metrics_wrapper, tracer
+from ttl_cache import TTLCache
 
-from .models import Resolutions
+from .models import (
+    BlobFile,
+    FolderContentsPage,
+    ImageProbe,
+    ImageResizeResult,
+    ResamplingProfile,
+    Resolutions,
+)
+from .probe import (
+    ImageProbeRejectedException,
+    get_blob_size,
+    probe_image_header,
+)
+from .resampling import resample_image
+
+if TYPE_CHECKING:
+    from azure.identity import DefaultAzureCredential
+    from PIL import Image
+    from PIL.ImageFile import ImageFile
 
 logger: logging.Logger = logging.getLogger(__name__)
 
@@ -30,12 +59,54 @@ class AzureStorageAccountContainerCreationFailedException(Exception):
 
 
 class AzureStorageAccountClientFactory:
-    def __init__(self, account_name: str, account_key: str) -> None:
+    def __init__(
+        self,
+        account_name: str,
+        account_key: str,
+        listing_cache_ttl_seconds: float = 10,
+        listing_cache_max_entries: int = 1000,
+        rendition_cache_control: str = "public, max-age=31536000, immutable",
+        rendition_cache_control_by_resolution: Dict[str, str] | None = None,
+        resampling_profile: ResamplingProfile = ResamplingProfile.balanced,
+        probe_initial_bytes: int = 4096,
+        probe_max_bytes: int = 262144,
+        max_image_bytes: int = 104857600,
+        max_image_pixels: int = 100_000_000,
+    ) -> None:
         self.account_name: str = account_name
         self.account_key: str = account_key
-        self.credential = DefaultAzureCredential()
-        self.blob_service_client = BlobServiceClient(
-            account_url=f"https://{account_name}.blob.core.windows.net",
+        self.resampling_profile: ResamplingProfile = resampling_profile
+        # Originals are probed with ranged reads starting at `probe_initial_bytes`
+        # and growing (for large EXIF or ICC segments) up to `probe_max_bytes`.
+        self.probe_initial_bytes: int = probe_initial_bytes
+        self.probe_max_bytes: int = probe_max_bytes
+        self.max_image_bytes: int = max_image_bytes
+        self.max_image_pixels: int = max_image_pixels
+        # Rendition paths are unique per upload, so they never change once
+        # written and can be cached for as long as the policy allows.
+        self.rendition_cache_control: str = rendition_cache_control
+        self.rendition_cache_control_by_resolution: Dict[str, str] = (
+            rendition_cache_control_by_resolution or {}
+        )
+        # Folder listing pages by (container, prefix, page size, token). Entries
+        # of a container are dropped whenever this factory writes to it.
+        self.listing_cache: TTLCache[FolderContentsPage] = TTLCache(
+            ttl_seconds=listing_cache_ttl_seconds,
+            max_entries=listing_cache_max_entries,
+        )
+
+    # azure.identity is slow to import, so the credential and the service client
+    # are only created once the factory actually talks to the storage account.
+    @cached_property
+    def credential(self) -> "DefaultAzureCredential":
+        from azure.identity import DefaultAzureCredential
+
+        return DefaultAzureCredential()
+
+    @cached_property
+    def blob_service_client(self) -> BlobServiceClient:
+        return BlobServiceClient(
+            account_url=f"https://{self.account_name}.blob.core.windows.net",
             credential=self.credential,
         )
 
@@ -44,8 +115,11 @@ class AzureStorageAccountClientFactory:
         container_name: str,
         blob_name: str,
         expiry_hours: int = 1,
+        ensure_container: bool = True,
     ) -> str:
-        if not self._container_exists(container_name=container_name):
+        if ensure_container and not self._container_exists(
+            container_name=container_name
+        ):
             self._create_container(container_name=container_name)
             self._make_container_public(container_name=container_name)
 
@@ -89,41 +163,329 @@ class AzureStorageAccountClientFactory:
         )
         return f"https://{self.account_name}.blob.core.windows.net/{container_name}/{blob_name}?{sas_token}"
 
+    def probe_image(
+        self, container_name: str, folder_name: str, blob_name: str
+    ) -> ImageProbe:
+        """
+        Read only the start of the original to learn its format and size, and
+        reject it (`ImageProbeRejectedException`) if it is corrupt, does not
+        match its extension or is too large, before anything downloads it whole.
+        The probe carries the blob's ETag, so that whatever downloads it later
+        gets the blob that was probed.
+        """
+        blob_client: BlobClient = self.blob_service_client.get_blob_client(
+            container=container_name, blob=f"{folder_name}/{blob_name}"
+        )
+
+        length: int = self.probe_initial_bytes
+        etag: str | None = None
+        while True:
+            try:
+                with metrics_wrapper.measure_storage_round_trip(
+                    service="blob", operation="download_blob_range"
+                ):
+                    downloader = blob_client.download_blob(
+                        offset=0,
+                        length=length,
+                        etag=etag,
+                        match_condition=MatchConditions.IfNotModified if etag else None,
+                    )
+                    header: bytes = downloader.readall()
+            except ResourceModifiedError:
+                raise ImageProbeRejectedException(
+                    name=blob_name,
+                    reason="modified",
+                    detail=f"{blob_name} changed while it was being probed",
+                )
+            except HttpResponseError as e:
+                # Ranged reads of an empty blob fail with 416 Range Not Satisfiable
+                if e.status_code != 416:
+                    raise
+                raise ImageProbeRejectedException(
+                    name=blob_name, reason="corrupt", detail=f"{blob_name} is empty"
+                )
+            etag = downloader.properties.etag
+            blob_size: int = get_blob_size(
+                content_range=downloader.properties.content_range,
+                downloaded_size=downloader.properties.size,
+            )
+            record_storage_bytes(direction="downloaded", amount=len(header))
+
+            probe: ImageProbe | None = probe_image_header(
+                name=blob_name,
+                header=header,
+                blob_size=blob_size,
+                max_bytes=self.max_image_bytes,
+                max_pixels=self.max_image_pixels,
+                is_final=len(header) >= blob_size or length >= self.probe_max_bytes,
+            )
+            if probe is not None:
+                return probe.model_copy(update={"etag": etag})
+            length = min(length * 4, self.probe_max_bytes)
+
     def resize_image(
         self,
         container_name: str,
         folder_name: str,
         blob_name: str,
         resolution: Resolutions,
-    ) -> None:
-        logger.info("Resizing photo: %s", resolution.value)
+        etag: str | None = None,
+    ) -> ImageResizeResult:
+        return self.resize_image_to_resolutions(
+            container_name=container_name,
+            folder_name=folder_name,
+            blob_name=blob_name,
+            resolutions=[resolution],
+            etag=etag,
+        )[0]
+
+    def resize_image_to_resolutions(
+        self,
+        container_name: str,
+        folder_name: str,
+        blob_name: str,
+        resolutions: List[Resolutions],
+        etag: str | None = None,
+    ) -> List[ImageResizeResult]:
+        """
+        Download and decode the original once, then resize, encode and upload
+        a rendition for each resolution. With the `etag` of a probe, the
+        download fails (`ResourceModifiedError`) if the original was replaced
+        since. Originals with more than `max_image_pixels` are rejected before
+        they are decoded.
+        """
+        from PIL import Image
+
+        # Download and decode are shared by the renditions, so their stage
+        # metrics are labelled with all of the resolutions.
+        resolution_values: str = ",".join(
+            resolution.value for resolution in resolutions
+        )
+        logger.info("Resizing photo: %s", resolution_values)
+
+        original_image_path: str = f"{folder_name}/{blob_name}"
+        shared_stage_durations_ms: Dict[str, float] = {}
+
+        with tracer.start_as_current_span(name="resize_image") as span:
+            span.set_attributes(
+                {
+                    "container_name": container_name,
+                    "blob_name": original_image_path,
+                    "resolution": resolution_values,
+                    "resampling_profile": self.resampling_profile.value,
+                }
+            )
+
+            with metrics_wrapper.measure_image_pipeline_stage(
+                stage="download",
+                resolution=resolution_values,
+                durations_ms=shared_stage_durations_ms,
+            ):
+                original_blob_client: BlobClient = (
+                    self.blob_service_client.get_blob_client(
+                        container=container_name, blob=original_image_path
+                    )
+                )
+                with metrics_wrapper.measure_storage_round_trip(
+                    service="blob", operation="download_blob"
+                ):
+                    original_blob: bytes = original_blob_client.download_blob(
+                        etag=etag,
+                        match_condition=MatchConditions.IfNotModified if etag else None,
+                    ).readall()
+            metrics_wrapper.increment_image_pipeline_bytes_downloaded(
+                amount=len(original_blob)
+            )
+
+            with metrics_wrapper.measure_image_pipeline_stage(
+                stage="decode",
+                resolution=resolution_values,
+                durations_ms=shared_stage_durations_ms,
+            ):
+                image: "ImageFile" = Image.open(BytesIO(original_blob))
+                if image.width * image.height > self.max_image_pixels:
+                    raise ImageProbeRejectedException(
+                        name=blob_name,
+                        reason="too_many_pixels",
+                        detail=f"{blob_name} has more than the {self.max_image_pixels} pixels allowed",
+                    )
+                image.load()
+
+            original: Dict[str, Any] = {
+                "original_format": image.format,
+                "original_width": image.width,
+                "original_height": image.height,
+                "original_bytes": len(original_blob),
+                "original_sha256": hashlib.sha256(original_blob).hexdigest(),
+            }
+            results: List[ImageResizeResult] = [
+                ImageResizeResult(
+                    resolution=resolution,
+                    **original,
+                    **self._create_rendition(
+                        container_name=container_name,
+                        folder_name=folder_name,
+                        blob_name=blob_name,
+                        image=image,
+                        image_format=image.format,
+                        resolution=resolution,
+                        stage_durations_ms=dict(shared_stage_durations_ms),
+                    ),
+                )
+                for resolution in resolutions
+            ]
+
+        logger.info(f"Image processing complete for blob: {original_image_path}")
+        return results
+
+    def _create_rendition(
+        self,
+        container_name: str,
+        folder_name: str,
+        blob_name: str,
+        image: "Image.Image",
+        image_format: str,
+        resolution: Resolutions,
+        stage_durations_ms: Dict[str, float],
+    ) -> Dict[str, Any]:
+        from PIL import Image
 
         # Resized image properties
         original_blob_extension: str = blob_name.split(".")[-1]
         resized_blob_name: str = f"{resolution.value}.{original_blob_extension}"
         resized_blob_path: str = f"{folder_name}/{resized_blob_name}"
 
-        # Original image properties
-        original_image_path: str = f"{folder_name}/{blob_name}"
+        with metrics_wrapper.measure_image_pipeline_stage(
+            stage="resize",
+            resolution=resolution.value,
+            durations_ms=stage_durations_ms,
+        ):
+            resized_image: Image.Image = resample_image(
+                image=image,
+                size=resolution.get_dimension(),
+                profile=self.resampling_profile,
+            )
+
+        with metrics_wrapper.measure_image_pipeline_stage(
+            stage="encode",
+            resolution=resolution.value,
+            durations_ms=stage_durations_ms,
+        ):
+            output = BytesIO()
+            # Saved in the format of the original rather than the one its
+            # extension names, which Pillow does not know for e.g. .jpg
+            resized_image.save(output, format=image_format)
+            output.seek(0)
+            content_settings: ContentSettings = self.get_rendition_content_settings(
+                resolution=resolution,
+                image_format=image_format,
+                data=output.getbuffer(),
+            )
 
-        original_blob_client: BlobClient = self.blob_service_client.get_blob_client(
-            container=container_name, blob=original_image_path
+        with metrics_wrapper.measure_image_pipeline_stage(
+            stage="upload",
+            resolution=resolution.value,
+            durations_ms=stage_durations_ms,
+        ):
+            resized_blob_client: BlobClient = self.blob_service_client.get_blob_client(
+                container=container_name, blob=resized_blob_path
+            )
+            with metrics_wrapper.measure_storage_round_trip(
+                service="blob", operation="upload_blob"
+            ):
+                resized_blob_client.upload_blob(
+                    data=output, overwrite=True, content_settings=content_settings
+                )
+            self.invalidate_listing_cache(container_name=container_name)
+        metrics_wrapper.increment_image_pipeline_bytes_uploaded(
+            amount=output.getbuffer().nbytes
         )
-        original_blob: bytes = original_blob_client.download_blob().readall()
-        image: ImageFile = Image.open(BytesIO(original_blob))
 
-        resized_image: Image.Image = image.resize(size=resolution.get_dimension())
+        return {
+            "width": resized_image.width,
+            "height": resized_image.height,
+            "bytes": output.getbuffer().nbytes,
+            "stage_durations_ms": stage_durations_ms,
+        }
 
-        output = BytesIO()
-        resized_image.save(output, format=original_blob_extension)
-        output.seek(0)
+    def get_rendition_content_settings(
+        self, resolution: Resolutions, image_format: str, data: memoryview
+    ) -> ContentSettings:
+        from PIL import Image
 
-        resized_blob_client: BlobClient = self.blob_service_client.get_blob_client(
-            container=container_name, blob=resized_blob_path
+        return ContentSettings(
+            content_type=Image.MIME.get(image_format, "application/octet-stream"),
+            cache_control=self.rendition_cache_control_by_resolution.get(
+                resolution.value, self.rendition_cache_control
+            ),
+            content_md5=bytearray(hashlib.md5(data).digest()),
         )
-        resized_blob_client.upload_blob(data=output, overwrite=True)
 
-        logger.info(f"Image processing complete for blob: {original_image_path}")
+    def list_folder_contents(
+        self,
+        container_name: str,
+        folder_name: str | None = None,
+        page_size: int = 100,
+        continuation_token: str | None = None,
+    ) -> FolderContentsPage:
+        """
+        List one page of the folders and blobs directly under `folder_name`
+        (or the container root), using a prefix and "/" delimiter listing.
+        """
+        prefix: str = f"{folder_name.strip('/')}/" if folder_name else ""
+        cache_key = (container_name, prefix, page_size, continuation_token)
+        cached_page: FolderContentsPage | None = self.listing_cache.get(cache_key)
+        if cached_page is not None:
+            return cached_page
+
+        pages = (
+            self.blob_service_client.get_container_client(container=container_name)
+            .walk_blobs(name_starts_with=prefix or None, results_per_page=page_size)
+            .by_page(continuation_token=continuation_token)
+        )
+        page = FolderContentsPage()
+        with metrics_wrapper.measure_storage_round_trip(
+            service="blob", operation="list_blob_hierarchy_segment"
+        ):
+            for item in next(pages, []):
+                name: str = item.name[len(prefix) :]
+                if isinstance(item, BlobPrefix):
+                    page.folders.append(name.rstrip("/"))
+                else:
+                    page.files.append(
+                        BlobFile(
+                            name=name,
+                            size=item.size,
+                            content_type=item.content_settings.content_type,
+                            last_modified=item.last_modified,
+                        )
+                    )
+        page.continuation_token = pages.continuation_token or None
+
+        self.listing_cache.set(cache_key, page)
+        return page
+
+    def invalidate_listing_cache(self, container_name: str) -> None:
+        self.listing_cache.delete_where(lambda key: key[0] == container_name)
+
+    def provision_container(
+        self, container_name: str, public_access: str | None = None
+    ) -> bool:
+        """
+        Create the container unless it already exists, in a single call.
+        Returns whether it was created.
+        """
+        try:
+            with metrics_wrapper.measure_storage_round_trip(
+                service="blob", operation="create_container"
+            ):
+                self.blob_service_client.create_container(
+                    name=container_name, public_access=public_access
+                )
+        except ResourceExistsError:
+            return False
+        logger.info(f"Container '{container_name}' created successfully.")
+        return True
 
     def delete_container(self, container_name: str) -> None:
         logger.info(f"Deleting container '{container_name}'")
@@ -131,11 +493,25 @@ class AzureStorageAccountClientFactory:
             self.blob_service_client.get_container_client(container=container_name)
         )
         try:
-            container_client.delete_container()
+            with metrics_wrapper.measure_storage_round_trip(
+                service="blob", operation="delete_container"
+            ):
+                container_client.delete_container()
+            self.invalidate_listing_cache(container_name=container_name)
             logger.info(f"Container '{container_name}' deleted successfully.")
         except Exception as e:
             logger.error(f"Failed to delete container '{container_name}': {e}")
 
+    def delete_blob(self, container_name: str, blob_name: str) -> None:
+        logger.info(f"Deleting blob '{blob_name}' in container '{container_name}'")
+        with metrics_wrapper.measure_storage_round_trip(
+            service="blob", operation="delete_blob"
+        ):
+            self.blob_service_client.get_blob_client(
+                container=container_name, blob=blob_name
+            ).delete_blob()
+        self.invalidate_listing_cache(container_name=container_name)
+
     def _create_container(self, container_name: str) -> None:
         logger.info(f"Creating container '{container_name}'")
         container_client: ContainerClient = (
@@ -143,22 +519,33 @@ class AzureStorageAccountClientFactory:
         )
         if not self._container_exists(container_name=container_client):
             try:
-                container_client.create_container()
+                with metrics_wrapper.measure_storage_round_trip(
+                    service="blob", operation="create_container"
+                ):
+                    container_client.create_container()
                 logger.info(f"Container '{container_name}' created successfully.")
             except AzureStorageAccountContainerCreationFailedException as e:
                 logger.error(f"Failed to create container '{container_name}': {e}")
 
     def _make_container_public(self, container_name: str) -> None:
         logger.info(f"Making container '{container_name}' public.")
-        self.blob_service_client.get_container_client(
-            container=container_name
-        ).set_container_access_policy(public_access="container", signed_identifiers={})
+        with metrics_wrapper.measure_storage_round_trip(
+            service="blob", operation="set_container_access_policy"
+        ):
+            self.blob_service_client.get_container_client(
+                container=container_name
+            ).set_container_access_policy(
+                public_access="container", signed_identifiers={}
+            )
 
     def _container_exists(self, container_name: str) -> bool:
         try:
-            self.blob_service_client.get_container_client(
-                container=container_name
-            ).get_container_properties()
+            with metrics_wrapper.measure_storage_round_trip(
+                service="blob", operation="get_container_properties"
+            ):
+                self.blob_service_client.get_container_client(
+                    container=container_name
+                ).get_container_properties()
             logger.info(f"Container '{container_name}' exists.")
             return True
         except Exception:
@@ -1,7 +1,8 @@
+from datetime import datetime
 from enum import Enum
-from typing import Annotated
+from typing import Annotated, Dict, List
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, computed_field
 
 
 class AzureStorageAccountClientConfig(BaseModel):
@@ -20,3 +21,69 @@ class Resolutions(str, Enum):
 
     def get_dimension(self) -> tuple:
         return RESOLUTIONS[self.value]
+
+
+class ResamplingProfile(str, Enum):
+    fast = "fast"
+    balanced = "balanced"
+    quality = "quality"
+
+
+class BlobFile(BaseModel):
+    name: Annotated[
+        str, Field(description="The blob name, relative to the listed prefix")
+    ]
+    size: Annotated[int, Field(description="The blob size in bytes")]
+    content_type: Annotated[str | None, Field(description="The blob content type")] = (
+        None
+    )
+    last_modified: Annotated[
+        datetime | None, Field(description="When the blob was last modified")
+    ] = None
+
+
+class FolderContentsPage(BaseModel):
+    folders: Annotated[
+        List[str],
+        Field(description="The folder names directly under the listed prefix"),
+    ] = []
+    files: Annotated[
+        List[BlobFile], Field(description="The blobs directly under the listed prefix")
+    ] = []
+    continuation_token: Annotated[
+        str | None, Field(description="The token for the next page, if any")
+    ] = None
+
+
+class ImageProbe(BaseModel):
+    format: Annotated[str, Field(description="The format detected from the header")]
+    mode: Annotated[str, Field(description="The Pillow mode the image decodes to")]
+    width: Annotated[int, Field(description="The width in pixels")]
+    height: Annotated[int, Field(description="The height in pixels")]
+    bands: Annotated[int, Field(description="The number of bands in the mode")]
+    bytes: Annotated[int, Field(description="The blob size in bytes")]
+    etag: Annotated[str | None, Field(description="The ETag of the probed blob")] = None
+
+    @computed_field
+    @property
+    def decoded_bytes(self) -> int:
+        return self.width * self.height * self.bands
+
+
+class ImageResizeResult(BaseModel):
+    original_format: Annotated[
+        str | None, Field(description="The format Pillow detected for the original")
+    ]
+    original_width: Annotated[int, Field(description="The original width in pixels")]
+    original_height: Annotated[int, Field(description="The original height in pixels")]
+    original_bytes: Annotated[int, Field(description="The original size in bytes")]
+    original_sha256: Annotated[
+        str, Field(description="The SHA-256 hex digest of the original")
+    ]
+    resolution: Annotated[Resolutions, Field(description="The rendition resolution")]
+    width: Annotated[int, Field(description="The rendition width in pixels")]
+    height: Annotated[int, Field(description="The rendition height in pixels")]
+    bytes: Annotated[int, Field(description="The rendition size in bytes")]
+    stage_durations_ms: Annotated[
+        Dict[str, float], Field(description="The duration of each pipeline stage")
+    ] = {}
@@ -0,0 +1,124 @@
+from io import BytesIO
+from typing import Dict
+
+from .models import ImageProbe
+
+IMAGE_FORMATS_BY_EXTENSION: Dict[str, str] = {
+    "png": "PNG",
+    "jpeg": "JPEG",
+    "jpg": "JPEG",
+}
+
+_SIGNATURES: Dict[bytes, str] = {
+    b"\x89PNG\r\n\x1a\n": "PNG",
+    b"\xff\xd8\xff": "JPEG",
+}
+
+
+class ImageProbeRejectedException(Exception):
+    """
+    The original is not an image that may be resized. `reason` is a short
+    code for metrics, `detail` is returned to the caller.
+    """
+
+    def __init__(self, name: str, reason: str, detail: str) -> None:
+        super().__init__(detail)
+        self.name: str = name
+        self.reason: str = reason
+        self.detail: str = detail
+
+
+def get_blob_size(content_range: str | None, downloaded_size: int) -> int:
+    """
+    The size of the whole blob from the `Content-Range` of a ranged download,
+    e.g. `bytes 0-4095/123456`; the download's own size is only the range's.
+    """
+    if content_range is None:
+        return downloaded_size
+    total: str = content_range.rpartition("/")[2]
+    return int(total) if total.isdigit() else downloaded_size
+
+
+def probe_image_header(
+    name: str,
+    header: bytes,
+    blob_size: int,
+    max_bytes: int,
+    max_pixels: int,
+    is_final: bool,
+) -> ImageProbe | None:
+    """
+    Parse the format, mode and dimensions from the first bytes of an image
+    without decoding it. Returns None when more of the header is needed,
+    unless `is_final`, in which case a header that cannot be parsed is
+    rejected as corrupt.
+    """
+    from PIL import Image
+
+    if blob_size > max_bytes:
+        raise ImageProbeRejectedException(
+            name=name,
+            reason="too_large",
+            detail=f"{name} is {blob_size} bytes, more than the {max_bytes} allowed",
+        )
+
+    extension: str = name.split(".")[-1].lower()
+    expected_format: str | None = IMAGE_FORMATS_BY_EXTENSION.get(extension)
+    if expected_format is None:
+        raise ImageProbeRejectedException(
+            name=name,
+            reason="unsupported_extension",
+            detail=f"{name} does not have a .png, .jpeg or .jpg extension",
+        )
+
+    detected_format: str | None = next(
+        (
+            image_format
+            for signature, image_format in _SIGNATURES.items()
+            if header.startswith(signature)
+        ),
+        None,
+    )
+    if detected_format is None:
+        raise ImageProbeRejectedException(
+            name=name, reason="corrupt", detail=f"{name} is not a PNG or JPEG image"
+        )
+    if detected_format != expected_format:
+        raise ImageProbeRejectedException(
+            name=name,
+            reason="mislabeled",
+            detail=f"{name} is a {detected_format} image with a .{extension} extension",
+        )
+
+    too_many_pixels = ImageProbeRejectedException(
+        name=name,
+        reason="too_many_pixels",
+        detail=f"{name} has more than the {max_pixels} pixels allowed",
+    )
+    try:
+        image = Image.open(BytesIO(header), formats=[detected_format])
+    except Image.DecompressionBombError:
+        raise too_many_pixels
+    except (OSError, SyntaxError, ValueError):
+        if not is_final:
+            return None
+        raise ImageProbeRejectedException(
+            name=name, reason="corrupt", detail=f"{name} has a corrupt header"
+        )
+
+    width, height = image.size
+    if width <= 0 or height <= 0:
+        raise ImageProbeRejectedException(
+            name=name, reason="corrupt", detail=f"{name} has no pixels"
+        )
+    if width * height > max_pixels:
+        raise too_many_pixels
+
+    return ImageProbe(
+        format=detected_format,
+        mode=image.mode,
+        width=width,
+        height=height,
+        bands=len(image.getbands()),
+        bytes=blob_size,
+    )
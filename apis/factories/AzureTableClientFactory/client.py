@@ -1,7 +1,15 @@
 import logging
+from functools import cached_property
 from typing import List
 
-from azure.data.tables import TableClient, TableServiceClient
+from azure.core import MatchConditions
+from azure.core.exceptions import (
+    ResourceExistsError,
+    ResourceModifiedError,
+    ResourceNotFoundError,
+)
+from azure.data.tables import TableClient, TableEntity, TableServiceClient, UpdateMode
+from telemetry import metrics_wrapper
 
 from .models import (
     AzureTableClientFactoryConfig,
@@ -16,9 +24,9 @@ logger: logging.Logger = logging.getLogger(__name__)
 class AzureTableClientFactory:
     def __init__(self, config: AzureTableClientFactoryConfig) -> None:
         self.config = config
-        self.client: TableClient = self._create_client()
 
-    def _create_client(self) -> TableClient:
+    @cached_property
+    def client(self) -> TableClient:
         table_service: TableServiceClient = TableServiceClient(
             endpoint=self.config.storage_account_table_endpoint,
             credential=self.config.credentials,
@@ -28,7 +36,10 @@ class AzureTableClientFactory:
     def insert_entity(self, entity: ShortUrlTableEntity) -> None:
         try:
             logger.info(f"Inserting entity: {entity.__str__()}")
-            self.client.create_entity(entity=entity)
+            with metrics_wrapper.measure_storage_round_trip(
+                service="table", operation="create_entity"
+            ):
+                self.client.create_entity(entity=entity)
         except Exception as e:
             logger.error(f"Error inserting entity: {e}")
 
@@ -37,25 +48,108 @@ class AzureTableClientFactory:
             logger.info(
                 f"Querying entities with filter: {query_filter.construct_filter()}"
             )
-            entities: List[ShortUrlTableEntity] = self.client.query_entities(
-                query_filter=query_filter.construct_filter()
-            )
+            with metrics_wrapper.measure_storage_round_trip(
+                service="table", operation="query_entities"
+            ):
+                entities: List[ShortUrlTableEntity] = self.client.query_entities(
+                    query_filter=query_filter.construct_filter()
+                )
+                short_url_table_entity = next(entities, None)
 
         except Exception as e:
             logger.error(f"Error querying entities: {e}")
-
-        short_url_table_entity = next(entities, None)
+            short_url_table_entity = None
 
         if short_url_table_entity:
             return ShortUrlTableEntity(**short_url_table_entity)
 
         return None
 
+    def upsert_entity(self, entity: TableEntity) -> None:
+        """
+        Insert the entity, or merge its properties into the existing one.
+        """
+        logger.info(f"Upserting entity: {entity['PartitionKey']}/{entity['RowKey']}")
+        with metrics_wrapper.measure_storage_round_trip(
+            service="table", operation="upsert_entity"
+        ):
+            self.client.upsert_entity(entity=entity, mode=UpdateMode.MERGE)
+
+    def upsert_entities(self, entities: List[TableEntity]) -> None:
+        """
+        Upsert (merge) entities of one partition in transactions of up to 100,
+        the most a single Table Storage transaction allows.
+        """
+        for start in range(0, len(entities), 100):
+            with metrics_wrapper.measure_storage_round_trip(
+                service="table", operation="submit_transaction"
+            ):
+                self.client.submit_transaction(
+                    operations=[
+                        ("upsert", entity, {"mode": UpdateMode.MERGE})
+                        for entity in entities[start : start + 100]
+                    ]
+                )
+
+    def get_entity(self, partition_key: str, row_key: str) -> TableEntity | None:
+        try:
+            with metrics_wrapper.measure_storage_round_trip(
+                service="table", operation="get_entity"
+            ):
+                return self.client.get_entity(
+                    partition_key=partition_key, row_key=row_key
+                )
+        except ResourceNotFoundError:
+            return None
+
+    def create_entity_if_absent(self, entity: TableEntity) -> bool:
+        try:
+            with metrics_wrapper.measure_storage_round_trip(
+                service="table", operation="create_entity"
+            ):
+                self.client.create_entity(entity=entity)
+        except ResourceExistsError:
+            return False
+        return True
+
+    def replace_entity_if_unchanged(self, entity: TableEntity) -> bool:
+        """
+        Replace the entity only if it has not changed since it was read, using
+        the ETag in its metadata.
+        """
+        try:
+            with metrics_wrapper.measure_storage_round_trip(
+                service="table", operation="update_entity"
+            ):
+                self.client.update_entity(
+                    entity=entity,
+                    mode=UpdateMode.REPLACE,
+                    etag=entity.metadata["etag"],
+                    match_condition=MatchConditions.IfNotModified,
+                )
+        except ResourceModifiedError:
+            return False
+        return True
+
+    def list_partition(self, partition_key: str) -> List[TableEntity]:
+        with metrics_wrapper.measure_storage_round_trip(
+            service="table", operation="query_entities"
+        ):
+            return list(
+                self.client.query_entities(
+                    query_filter="PartitionKey eq @partition_key",
+                    parameters={"partition_key": partition_key},
+                )
+            )
+
     def delete_entity(self, entity: DeleteShortUrlTableEntityRequest) -> None:
         try:
             logger.info(f"Deleting entity: {entity.model_dump()}")
-            self.client.delete_entity(
-                partition_key=entity.partition_key, row_key=entity.row_key
-            )
+            with metrics_wrapper.measure_storage_round_trip(
+                service="table", operation="delete_entity"
+            ):
+                self.client.delete_entity(
+                    partition_key=entity.partition_key, row_key=entity.row_key
+                )
         except Exception as e:
             logger.error(f"Error deleting entity: {e}")
@@ -1,4 +1,4 @@
-from typing import Annotated, NewType
+from typing import Annotated, Any, NewType
 
 from azure.core.credentials import AzureNamedKeyCredential
 from azure.data.tables import TableEntity
@@ -51,3 +51,45 @@ class QueryFilter(BaseModel):
 class ShortUrlTableEntity(TableEntity):
     def __init__(self, PartitionKey: str, RowKey: str, url: str, **kwargs) -> None:
         super().__init__(PartitionKey=PartitionKey, RowKey=RowKey, url=url, **kwargs)
+
+
+class ImageMetadataTableEntity(TableEntity):
+    """
+    Metadata of an original image and its renditions, one entity per upload
+    folder, partitioned by container so a container's gallery is one query.
+    Rendition properties are prefixed with `rendition_<resolution>_` so each
+    resize task can merge its own properties concurrently.
+    """
+
+    def __init__(
+        self, container_name: str, folder_name: str, **properties: Any
+    ) -> None:
+        super().__init__(
+            PartitionKey=self.get_partition_key(container_name=container_name),
+            RowKey=folder_name,
+            container_name=container_name,
+            folder_name=folder_name,
+            **properties,
+        )
+
+    @staticmethod
+    def get_partition_key(container_name: str) -> str:
+        return f"image-metadata-{container_name}"
+
+
+class ResizeBatchTableEntity(TableEntity):
+    """
+    A row of a resize batch: the "batch" row describes the batch and there is
+    one row per original, keyed by its index, holding that original's status.
+    """
+
+    def __init__(self, batch_id: str, row_key: str, **properties: Any) -> None:
+        super().__init__(
+            PartitionKey=self.get_partition_key(batch_id=batch_id),
+            RowKey=row_key,
+            **properties,
+        )
+
+    @staticmethod
+    def get_partition_key(batch_id: str) -> str:
+        return f"resize-batch-{batch_id}"
@@ -1,6 +1,11 @@
+import asyncio
 import logging
-from typing import Annotated, Dict, List
+import time
+from datetime import datetime, timezone
+from typing import Annotated, Awaitable, Callable, Dict, List
+from uuid import uuid4
 
+from clients import get_azure_table_client, get_storage_account_client
 from factories.AzureStorageAccountClientFactory.client import (
     AzureStorageAccountClientFactory,
 )
@@ -9,8 +14,6 @@ from factories.AzureStorageAccountClientFactory.models import (
 )
 from factories.AzureTableClientFactory.client import AzureTableClientFactory
 from factories.AzureTableClientFactory.models import (
-    AzureNamedKeyCredential,
-    AzureTableClientFactoryConfig,
     DeleteShortUrlTableEntityRequest,
     QueryFilter,
     ShortUrlTableEntity,
@@ -22,17 +25,23 @@ from settings import settings
 
 logger: logging.Logger = logging.getLogger(__name__)
 
-
-class PresignedUrls(BaseModel):
-    container_name: Annotated[str, Field(description="The name of the container")]
-    blob_name: Annotated[str, Field(description="The name of the blob")]
-    url: Annotated[str, Field(description="The presigned URL")]
+_READINESS_CONTAINER_NAME = "success"
+_READINESS_BLOB_NAME = "original.json"
 
 
 class SuccessFileContent(BaseModel):
     success: bool = True
 
 
+class ReadinessCheckResult(BaseModel):
+    name: Annotated[str, Field(description="The name of the dependency check")]
+    is_healthy: Annotated[bool, Field(description="Whether the check passed")]
+    latency_ms: Annotated[
+        float, Field(description="How long the check took in milliseconds")
+    ]
+    checked_at: Annotated[datetime, Field(description="When the check finished (UTC)")]
+
+
 registered_users_storage_account = AzureStorageAccountClientConfig(
     name=settings.AZURE_REGISTERED_STORAGE_ACCOUNT_NAME,
     key=settings.AZURE_REGISTERED_STORAGE_ACCOUNT_KEY,
@@ -45,64 +54,9 @@ guest_users_storage_account = AzureStorageAccountClientConfig(
     url=settings.AZURE_GUEST_STORAGE_ACCOUNT_URL,
 )
 
-registered_users_storage_account_client = AzureStorageAccountClientFactory(
-    account_name=registered_users_storage_account.name,
-    account_key=registered_users_storage_account.key,
-)
-
-guest_users_storage_account_client = AzureStorageAccountClientFactory(
-    account_name=guest_users_storage_account.name,
-    account_key=guest_users_storage_account.key,
-)
-
-azure_table_client = AzureTableClientFactory(
-    config=AzureTableClientFactoryConfig(
-        storage_account_table_endpoint=settings.AZURE_TABLE_STORAGE_ACCOUNT_URL,
-        table_name=settings.AZURE_STORAGE_ACCOUNT_TABLE_NAME,
-        credentials=AzureNamedKeyCredential(
-            name=settings.AZURE_TABLE_STORAGE_ACCOUNT_NAME,
-            key=settings.AZURE_STORAGE_ACCOUNT_TABLE_KEY,
-        ),
-    )
-)
-
-
-async def check_is_possible_to_generate_presigned_url(
-    container_name: str,
-    blob_name: str,
-    expiry_hours: int = 1,
-) -> List[PresignedUrls]:
-    guest_users_url = guest_users_storage_account_client.generate_post_signed_url(
-        container_name=container_name,
-        blob_name=blob_name,
-        expiry_hours=expiry_hours,
-    )
-
-    logger.info(f"Guest users URL: {guest_users_url}")
-
-    registered_users_url = (
-        registered_users_storage_account_client.generate_post_signed_url(
-            container_name=container_name,
-            blob_name=blob_name,
-            expiry_hours=expiry_hours,
-        )
-    )
-
-    logger.info(f"Registered users URL: {registered_users_url}")
-
-    presigned_urls: List[PresignedUrls] = [
-        PresignedUrls(
-            container_name=container_name, blob_name=blob_name, url=guest_users_url
-        ),
-        PresignedUrls(
-            container_name=container_name, blob_name=blob_name, url=registered_users_url
-        ),
-    ]
-
-    return presigned_urls
-
 
 async def check_if_possible_to_write_to_storage_account_using_presigned_url(
+    http_client: AsyncClient,
     presigned_url: PresignedUrlResponse,
 ) -> bool:
     headers: Dict[str, str] = {
@@ -111,144 +65,214 @@ async def check_if_possible_to_write_to_storage_account_using_presigned_url(
     }
 
     logger.info(
-        f"Attempting to write to storage account using URL: {presigned_url.url}"
+        f"Attempting to write to storage account using URL: {presigned_url.direct_url}"
+    )
+    response: Response = await http_client.put(
+        url=str(presigned_url.url),
+        content=SuccessFileContent().model_dump_json(),
+        headers=headers,
     )
-    async with AsyncClient(headers=headers) as client:
-        response: Response = await client.put(
-            url=str(presigned_url.url), data=SuccessFileContent().model_dump_json()
-        )
-
-        if response.status_code == 201:
-            return True
 
-    return False
+    return response.status_code == 201
 
 
 async def check_if_possible_to_read_blob_contents_from_storage_account(
+    http_client: AsyncClient,
     url: HttpUrl,
 ) -> bool:
-    async with AsyncClient() as client:
-        logger.info(f"Attempting to read from storage account using URL: {url}")
-        response: Response = await client.get(url=url)
-
-        if response.status_code == 200:
-            data: bytes = response.content
-            is_data_valid: SuccessFileContent = SuccessFileContent.model_validate_json(
-                json_data=data
-            )
-            logger.warning(f"Data is valid: {is_data_valid}")
-            return is_data_valid
-
-    return False
-
-
-async def check_if_possible_to_insert_to_storage_account_table(
-    entity: ShortUrlTableEntity,
-) -> bool:
-    try:
-        azure_table_client.insert_entity(entity=entity)
-    except Exception:
-        return False
-    return True
-
-
-async def check_if_possible_to_query_from_storage_account_table(value: str) -> bool:
-    query_filter = QueryFilter(value=value)
-    short_url_table_entity: ShortUrlTableEntity = azure_table_client.query_entities(
-        query_filter=query_filter
-    )
-
-    if not short_url_table_entity:
-        return False
-
-    return True
+    logger.info(f"Attempting to read from storage account using URL: {url}")
+    response: Response = await http_client.get(url=str(url))
 
+    if response.status_code == 200:
+        is_data_valid: SuccessFileContent = SuccessFileContent.model_validate_json(
+            json_data=response.content
+        )
+        return is_data_valid.success
 
-async def check_if_possible_to_delete_from_storage_account_table(
-    entity: DeleteShortUrlTableEntityRequest,
-) -> bool:
-    try:
-        azure_table_client.delete_entity(entity=entity)
-    except Exception:
-        return False
-    return True
+    return False
 
 
 async def orchestrate_storage_account_checks(
+    http_client: AsyncClient,
+    client: AzureStorageAccountClientFactory,
     container_name: str,
     blob_name: str,
 ) -> bool:
-    presigned_urls: List[
-        PresignedUrls
-    ] = await check_is_possible_to_generate_presigned_url(
-        container_name=container_name, blob_name=blob_name
+    """
+    Generate a presigned URL, upload through it, read the blob back through
+    its direct URL and delete it again. The probe container is kept between
+    runs so that every check does not create, publish and delete a container.
+    """
+    presigned_url = PresignedUrlResponse(
+        url=await asyncio.to_thread(
+            client.generate_post_signed_url,
+            container_name=container_name,
+            blob_name=blob_name,
+        )
     )
 
-    for presigned_url in presigned_urls:
-        presigned_url_response = PresignedUrlResponse(url=presigned_url.url)
-        is_possible_to_write = (
-            await check_if_possible_to_write_to_storage_account_using_presigned_url(
-                presigned_url=presigned_url_response
-            )
+    is_possible_to_write = (
+        await check_if_possible_to_write_to_storage_account_using_presigned_url(
+            http_client=http_client, presigned_url=presigned_url
         )
+    )
 
-        if not is_possible_to_write:
-            logger.error(
-                f"Failed to write to storage account using presigned URL: {presigned_url_response.direct_url}"
-            )
-            return False
+    if not is_possible_to_write:
+        logger.error(
+            f"Failed to write to storage account using presigned URL: {presigned_url.direct_url}"
+        )
+        return False
 
-        is_possible_to_read = (
-            await check_if_possible_to_read_blob_contents_from_storage_account(
-                url=presigned_url_response.direct_url
-            )
+    is_possible_to_read = (
+        await check_if_possible_to_read_blob_contents_from_storage_account(
+            http_client=http_client, url=presigned_url.direct_url
         )
+    )
 
-        if not is_possible_to_read:
-            logger.error(
-                f"Failed to read from storage account using presigned URL: {presigned_url_response.direct_url}"
-            )
-            return False
+    await asyncio.to_thread(
+        client.delete_blob,
+        container_name=container_name,
+        blob_name=f"{presigned_url.folder_name}/{presigned_url.blob_name}",
+    )
 
-    if all([is_possible_to_write, is_possible_to_read]):
-        registered_users_storage_account_client.delete_container(
-            container_name=container_name
-        )
-        guest_users_storage_account_client.delete_container(
-            container_name=container_name
+    if not is_possible_to_read:
+        logger.error(
+            f"Failed to read from storage account using presigned URL: {presigned_url.direct_url}"
         )
+        return False
 
     return True
 
 
-async def orchestrate_table_storage_checks(
-    insert_entity: ShortUrlTableEntity,
-    delete_entity: DeleteShortUrlTableEntityRequest,
-) -> bool:
-    is_possible_to_insert = await check_if_possible_to_insert_to_storage_account_table(
-        entity=insert_entity
-    )
-
-    if not is_possible_to_insert:
-        logger.error("Failed to insert entity into table storage.")
-        return False
+def orchestrate_table_storage_checks() -> bool:
+    azure_table_client: AzureTableClientFactory = get_azure_table_client()
+    common_uuid = str(uuid4())
 
-    is_possible_to_query = await check_if_possible_to_query_from_storage_account_table(
-        value=delete_entity.partition_key
+    azure_table_client.insert_entity(
+        entity=ShortUrlTableEntity(
+            PartitionKey=common_uuid, RowKey=common_uuid, url="https://test.test"
+        )
     )
 
-    if not is_possible_to_query:
+    if not azure_table_client.query_entities(
+        query_filter=QueryFilter(value=common_uuid)
+    ):
         logger.error("Failed to query entity from table storage.")
         return False
 
-    is_possible_to_delete = (
-        await check_if_possible_to_delete_from_storage_account_table(
-            entity=delete_entity
+    azure_table_client.delete_entity(
+        entity=DeleteShortUrlTableEntityRequest(
+            partition_key=common_uuid, row_key=common_uuid
         )
     )
 
-    if not is_possible_to_delete:
-        logger.error("Failed to delete entity from table storage.")
-        return False
-
     return True
+
+
+class ReadinessMonitor:
+    """
+    Runs the dependency checks concurrently on a fixed interval in the
+    background and keeps the latest results, so that the readiness endpoint
+    only has to read them.
+    """
+
+    def __init__(self, interval_seconds: float, timeout_seconds: float) -> None:
+        self.interval_seconds: float = interval_seconds
+        self.timeout_seconds: float = timeout_seconds
+        self.results: List[ReadinessCheckResult] = []
+        self._task: asyncio.Task | None = None
+        self._http_client: AsyncClient | None = None
+
+    @property
+    def is_ready(self) -> bool:
+        if not self.results:
+            return False
+        return all(result.is_healthy for result in self.results) and (
+            self.age_seconds <= self.interval_seconds * 3
+        )
+
+    @property
+    def age_seconds(self) -> float:
+        if not self.results:
+            return float("inf")
+        oldest_check: datetime = min(result.checked_at for result in self.results)
+        return (datetime.now(timezone.utc) - oldest_check).total_seconds()
+
+    async def refresh(self) -> List[ReadinessCheckResult]:
+        checks: Dict[str, Callable[[], Awaitable[bool]]] = {
+            "guest_storage_account": lambda: orchestrate_storage_account_checks(
+                http_client=self._http_client,
+                client=get_storage_account_client(config=guest_users_storage_account),
+                container_name=_READINESS_CONTAINER_NAME,
+                blob_name=_READINESS_BLOB_NAME,
+            ),
+            "registered_storage_account": lambda: orchestrate_storage_account_checks(
+                http_client=self._http_client,
+                client=get_storage_account_client(
+                    config=registered_users_storage_account
+                ),
+                container_name=_READINESS_CONTAINER_NAME,
+                blob_name=_READINESS_BLOB_NAME,
+            ),
+            "storage_account_table": lambda: asyncio.to_thread(
+                orchestrate_table_storage_checks
+            ),
+        }
+
+        self.results = list(
+            await asyncio.gather(
+                *[
+                    self._run_check(name=name, check=check)
+                    for name, check in checks.items()
+                ]
+            )
+        )
+        return self.results
+
+    async def _run_check(
+        self, name: str, check: Callable[[], Awaitable[bool]]
+    ) -> ReadinessCheckResult:
+        started_at: float = time.perf_counter()
+        try:
+            is_healthy: bool = await asyncio.wait_for(
+                check(), timeout=self.timeout_seconds
+            )
+        except Exception as e:
+            logger.error(f"Readiness check '{name}' failed: {e!r}")
+            is_healthy = False
+
+        return ReadinessCheckResult(
+            name=name,
+            is_healthy=is_healthy,
+            latency_ms=(time.perf_counter() - started_at) * 1000,
+            checked_at=datetime.now(timezone.utc),
+        )
+
+    async def _run(self) -> None:
+        while True:
+            await self.refresh()
+            await asyncio.sleep(self.interval_seconds)
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._http_client = AsyncClient(timeout=self.timeout_seconds)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+        await self._http_client.aclose()
+        self._http_client = None
+
+
+readiness_monitor = ReadinessMonitor(
+    interval_seconds=settings.READINESS_CHECK_INTERVAL_SECONDS,
+    timeout_seconds=settings.READINESS_CHECK_TIMEOUT_SECONDS,
+)
@@ -1,14 +1,9 @@
-from uuid import uuid4
+from typing import Annotated, List
 
 from fastapi import APIRouter, Response, status
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
-from .readiness import (
-    DeleteShortUrlTableEntityRequest,
-    ShortUrlTableEntity,
-    orchestrate_storage_account_checks,
-    orchestrate_table_storage_checks,
-)
+from .readiness import ReadinessCheckResult, readiness_monitor
 
 health_router = APIRouter()
 
@@ -17,6 +12,17 @@ class HealthCheckResponse(BaseModel):
     status: int
 
 
+class ReadinessCheckResponse(HealthCheckResponse):
+    age_seconds: Annotated[
+        float | None,
+        Field(description="Seconds since the oldest cached check finished"),
+    ] = None
+    checks: Annotated[
+        List[ReadinessCheckResult],
+        Field(description="The latest result of each dependency check"),
+    ] = []
+
+
 @health_router.get(
     path="/liveness",
     summary="Liveness probe",
@@ -30,18 +36,20 @@ _READINESS_DESCRIPTION = """
 
 This endpoint checks if the service is ready to accept requests. It does so by checking if it is possible to interact with the storage accounts.
 
-1. It checks if it is possible to interact with the storage account by checking if it is possible,
+1. It checks if it is possible to interact with each storage account by checking if it is possible,
     1. to generate a presigned URL for a blob
     2. to upload a file to storage account using the presigned URL
     3. to read the contents of the blob using the direct URL of the blob
     4. ensured the contents of the blob are the same as the uploaded file
-    5. to delete the container
+    5. to delete the blob
 2. It checks if it is possible to interact with the storage account table by 
     1. inserting an entity to the table
     2. querying for the inserted entity
     3. deleting an entity.
 
-If all checks pass, the service is considered ready and returns a 200 status code. Otherwise, it returns a 503 status code.
+The checks run concurrently in a background task every `READINESS_CHECK_INTERVAL_SECONDS` seconds and this endpoint returns the latest cached results, including the latency of every check and the age of the results.
+
+If all checks pass and the results are not stale, the service is considered ready and returns a 200 status code. Otherwise, it returns a 503 status code.
 
 """
 
@@ -51,36 +59,16 @@ If all checks pass, the service is considered ready and returns a 200 status cod
     summary="Readiness probe",
     description=_READINESS_DESCRIPTION,
 )
-async def readiness(response: Response) -> HealthCheckResponse:
-    is_possible_to_interact_with_storage_accounts: bool = (
-        await orchestrate_storage_account_checks(
-            container_name="success", blob_name="original.json"
-        )
-    )
-
-    common_uuid = str(uuid4())
-
-    entity_to_insert = ShortUrlTableEntity(
-        PartitionKey=common_uuid, RowKey=common_uuid, url="https://test.test"
-    )
-
-    delete_to_entity = DeleteShortUrlTableEntityRequest(
-        partition_key=common_uuid, row_key=common_uuid
-    )
-
-    is_possible_to_interact_with_storage_account_table: bool = (
-        await orchestrate_table_storage_checks(
-            insert_entity=entity_to_insert, delete_entity=delete_to_entity
-        )
-    )
-
-    if all(
-        [
-            is_possible_to_interact_with_storage_accounts,
-            is_possible_to_interact_with_storage_account_table,
-        ]
-    ):
+async def readiness(response: Response) -> ReadinessCheckResponse:
+    if readiness_monitor.is_ready:
         response.status_code = status.HTTP_200_OK
-        return HealthCheckResponse(status=status.HTTP_200_OK)
-    response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
-    return HealthCheckResponse(status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    else:
+        response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+
+    return ReadinessCheckResponse(
+        status=response.status_code,
+        age_seconds=(
+            readiness_monitor.age_seconds if readiness_monitor.results else None
+        ),
+        checks=readiness_monitor.results,
+    )
@@ -0,0 +1,54 @@
+from threading import Lock
+from typing import Dict, Hashable, List, Tuple
+
+
+class SpaceSavingCounter:
+    """
+    Approximate top-K tracker (Metwally et al. space-saving algorithm).
+
+    At most `capacity` keys are held in memory. When a new key arrives and the
+    tracker is full, the key with the smallest count is evicted and the new key
+    inherits its count, so any key with a true frequency above N / capacity is
+    guaranteed to be tracked.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.capacity: int = capacity
+        self._counts: Dict[Hashable, int] = {}
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def add(self, key: Hashable, amount: int = 1) -> None:
+        with self._lock:
+            if key in self._counts:
+                self._counts[key] += amount
+                return
+
+            if len(self._counts) < self.capacity:
+                self._counts[key] = amount
+                return
+
+            evicted_key: Hashable = min(self._counts, key=self._counts.__getitem__)
+            evicted_count: int = self._counts.pop(evicted_key)
+
+            self._counts[key] = evicted_count + amount
+
+    def top(self, n: int) -> List[Tuple[Hashable, int]]:
+        with self._lock:
+            return self._top(n=n)
+
+    def drain(self, n: int) -> List[Tuple[Hashable, int]]:
+        """
+        Return the top `n` keys and reset the tracker for the next window.
+        """
+        with self._lock:
+            top_n = self._top(n=n)
+            self._counts = {}
+        return top_n
+
+    def _top(self, n: int) -> List[Tuple[Hashable, int]]:
+        return sorted(self._counts.items(), key=lambda item: item[1], reverse=True)[:n]
@@ -0,0 +1,65 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Generic, Hashable, Tuple, TypeVar
+
+from ttl_cache import TTLCache
+
+V = TypeVar("V")
+
+
+class IdempotencyStore(Generic[V]):
+    """
+    Runs an operation at most once per key within `ttl_seconds`.
+
+    Results are kept in a `TTLCache`; callers that arrive while the first call
+    for a key is still running wait for its result instead of starting their
+    own. Failed calls are not cached, so the next call for the key runs again.
+    The store is per process.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int) -> None:
+        self.results: TTLCache[V] = TTLCache(
+            ttl_seconds=ttl_seconds, max_entries=max_entries
+        )
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+
+    async def run(
+        self, key: Hashable, operation: Callable[[], Awaitable[V]]
+    ) -> Tuple[V, bool]:
+        """
+        Return the result for `key` and whether it was replayed rather than
+        produced by this call.
+        """
+        while True:
+            result: V | None = self.results.get(key)
+            if result is not None:
+                return result, True
+
+            in_flight: asyncio.Future | None = self._in_flight.get(key)
+            if in_flight is None:
+                break
+            try:
+                return await asyncio.shield(in_flight), True
+            except asyncio.CancelledError:
+                if not in_flight.cancelled():
+                    raise
+                # The first call was cancelled (e.g. its client went away), so
+                # one of the waiting calls takes over.
+
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await operation()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved in case nobody is waiting.
+            future.exception()
+            raise
+        else:
+            self.results.set(key, result)
+            future.set_result(result)
+            return result, False
+        finally:
+            del self._in_flight[key]
@@ -0,0 +1,53 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Iterator
+
+from settings import settings
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+class MemoryBudget:
+    """
+    Bounds the memory used concurrently by worker threads. Reservations are
+    granted in arrival order once they fit in what is left of the budget, so
+    large ones are not starved by a stream of small ones. One larger than the
+    whole budget waits until nothing else is reserved and then runs alone.
+    """
+
+    def __init__(self, capacity_bytes: int) -> None:
+        self.capacity_bytes: int = capacity_bytes
+        self.reserved_bytes: int = 0
+        self._condition = threading.Condition()
+        self._waiting: Deque[object] = deque()
+
+    @contextmanager
+    def reserve(self, amount: int) -> Iterator[None]:
+        amount = min(amount, self.capacity_bytes)
+        started_at: float = time.perf_counter()
+        ticket = object()
+        with self._condition:
+            self._waiting.append(ticket)
+            self._condition.wait_for(
+                lambda: self._waiting[0] is ticket
+                and self.reserved_bytes + amount <= self.capacity_bytes
+            )
+            self._waiting.popleft()
+            self.reserved_bytes += amount
+            self._condition.notify_all()
+
+        waited_seconds: float = time.perf_counter() - started_at
+        if waited_seconds > 1:
+            logger.info(f"Waited {waited_seconds:.1f}s to reserve {amount} bytes")
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.reserved_bytes -= amount
+                self._condition.notify_all()
+
+
+resize_memory_budget = MemoryBudget(capacity_bytes=settings.RESIZE_MEMORY_BUDGET_BYTES)
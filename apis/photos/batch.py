@@ -0,0 +1,182 @@
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+from uuid import uuid4
+
+from azure.core.exceptions import ResourceModifiedError, ResourceNotFoundError
+from factories.AzureStorageAccountClientFactory.client import (
+    AzureStorageAccountClientFactory,
+)
+from factories.AzureStorageAccountClientFactory.models import ImageProbe
+from factories.AzureStorageAccountClientFactory.probe import (
+    ImageProbeRejectedException,
+)
+from factories.AzureTableClientFactory.client import AzureTableClientFactory
+from factories.AzureTableClientFactory.models import ResizeBatchTableEntity
+from request_cost import record_resize_tasks
+from telemetry import metrics_wrapper
+
+from .metadata import resize_executor, resize_original_and_record_metadata
+from .models import (
+    ImageResizeRequest,
+    ResizeBatchOriginal,
+    ResizeBatchResponse,
+    ResizeBatchStatus,
+)
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+_BATCH_ROW_KEY = "batch"
+
+
+def group_by_original(items: List[ImageResizeRequest]) -> List[ResizeBatchOriginal]:
+    originals: Dict[Tuple[str, str, str], ResizeBatchOriginal] = {}
+    for item in items:
+        original: ResizeBatchOriginal = originals.setdefault(
+            (item.container_name, item.folder_name, item.name),
+            ResizeBatchOriginal(
+                container_name=item.container_name,
+                folder_name=item.folder_name,
+                name=item.name,
+                resolutions=[],
+            ),
+        )
+        if item.resolution not in original.resolutions:
+            original.resolutions.append(item.resolution)
+    return list(originals.values())
+
+
+def _get_row_key(index: int) -> str:
+    return f"{index:05d}"
+
+
+def start_resize_batch(
+    client: AzureStorageAccountClientFactory,
+    table_client: AzureTableClientFactory,
+    owner: str,
+    originals: List[ResizeBatchOriginal],
+) -> ResizeBatchResponse:
+    """
+    Record the batch and queue one task per original on the batch pool.
+    """
+    batch_id: str = str(uuid4())
+    table_client.upsert_entities(
+        entities=[
+            ResizeBatchTableEntity(
+                batch_id=batch_id,
+                row_key=_BATCH_ROW_KEY,
+                owner=owner,
+                created_at=datetime.now(timezone.utc),
+            )
+        ]
+        + [
+            ResizeBatchTableEntity(
+                batch_id=batch_id,
+                row_key=_get_row_key(index=index),
+                container_name=original.container_name,
+                folder_name=original.folder_name,
+                name=original.name,
+                resolutions=",".join(
+                    resolution.value for resolution in original.resolutions
+                ),
+                status=original.status.value,
+            )
+            for index, original in enumerate(originals)
+        ]
+    )
+
+    for index, original in enumerate(originals):
+        resize_executor.submit(
+            metrics_wrapper.track_background_task_queue_wait(
+                task_name="resize_batch_original", func=run_resize_batch_original
+            ),
+            client=client,
+            table_client=table_client,
+            batch_id=batch_id,
+            index=index,
+            original=original,
+        )
+    record_resize_tasks(count=len(originals))
+
+    return ResizeBatchResponse(batch_id=batch_id, originals=originals)
+
+
+def run_resize_batch_original(
+    client: AzureStorageAccountClientFactory,
+    table_client: AzureTableClientFactory,
+    batch_id: str,
+    index: int,
+    original: ResizeBatchOriginal,
+) -> None:
+    def set_status(status: ResizeBatchStatus, error: str | None = None) -> None:
+        try:
+            table_client.upsert_entity(
+                entity=ResizeBatchTableEntity(
+                    batch_id=batch_id,
+                    row_key=_get_row_key(index=index),
+                    status=status.value,
+                    error=error,
+                )
+            )
+        except Exception as e:
+            logger.error(f"Failed to record status of resize batch '{batch_id}': {e}")
+
+    set_status(status=ResizeBatchStatus.running)
+    try:
+        probe: ImageProbe = client.probe_image(
+            container_name=original.container_name,
+            folder_name=original.folder_name,
+            blob_name=original.name,
+        )
+        resize_original_and_record_metadata(
+            client=client,
+            table_client=table_client,
+            container_name=original.container_name,
+            folder_name=original.folder_name,
+            blob_name=original.name,
+            resolutions=original.resolutions,
+            probe=probe,
+        )
+    except ImageProbeRejectedException as e:
+        metrics_wrapper.increment_image_probe_rejection(reason=e.reason)
+        set_status(status=ResizeBatchStatus.failed, error=e.detail)
+    except ResourceNotFoundError:
+        set_status(status=ResizeBatchStatus.failed, error="Image not found")
+    except ResourceModifiedError:
+        set_status(
+            status=ResizeBatchStatus.failed, error="Image changed after it was probed"
+        )
+    except Exception as e:
+        logger.error(
+            f"Resize batch '{batch_id}' failed to resize '{original.folder_name}/{original.name}': {e}"
+        )
+        set_status(status=ResizeBatchStatus.failed, error="Resize failed")
+    else:
+        set_status(status=ResizeBatchStatus.succeeded)
+
+
+def get_resize_batch(
+    table_client: AzureTableClientFactory, batch_id: str, owner: str
+) -> ResizeBatchResponse | None:
+    entities = table_client.list_partition(
+        partition_key=ResizeBatchTableEntity.get_partition_key(batch_id=batch_id)
+    )
+    rows = {entity["RowKey"]: entity for entity in entities}
+    batch = rows.pop(_BATCH_ROW_KEY, None)
+    if batch is None or batch["owner"] != owner:
+        return None
+
+    return ResizeBatchResponse(
+        batch_id=batch_id,
+        originals=[
+            ResizeBatchOriginal(
+                container_name=entity["container_name"],
+                folder_name=entity["folder_name"],
+                name=entity["name"],
+                resolutions=entity["resolutions"].split(","),
+                status=entity["status"],
+                error=entity.get("error"),
+            )
+            for _, entity in sorted(rows.items())
+        ],
+    )
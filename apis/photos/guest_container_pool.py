@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import random
+from threading import Lock
+from typing import List, Set
+
+from clients import get_storage_account_client
+from factories.AzureStorageAccountClientFactory.client import (
+    AzureStorageAccountClientFactory,
+)
+from factories.AzureStorageAccountClientFactory.models import (
+    AzureStorageAccountClientConfig,
+)
+from settings import settings
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+class GuestContainerPool:
+    """
+    A fixed set of sharded containers that all guest uploads go into, each
+    upload isolated in its own folder UUID.
+
+    A background task creates missing shards on an interval, so issuing a
+    guest upload URL needs no container calls. Shards allow anonymous reads
+    of blobs but not listing, so a guest can only find images by their path.
+    """
+
+    def __init__(
+        self,
+        config: AzureStorageAccountClientConfig,
+        name_prefix: str,
+        size: int,
+        interval_seconds: float,
+    ) -> None:
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self.config: AzureStorageAccountClientConfig = config
+        self.container_names: List[str] = [
+            f"{name_prefix}{index:03d}" for index in range(size)
+        ]
+        self.interval_seconds: float = interval_seconds
+        self.provisioned_container_names: Set[str] = set()
+        self._lock = Lock()
+        self._task: asyncio.Task | None = None
+
+    @property
+    def client(self) -> AzureStorageAccountClientFactory:
+        return get_storage_account_client(config=self.config)
+
+    def get_container_name(self) -> str:
+        """
+        Pick a shard for a new upload. Shards are normally provisioned in the
+        background already; one that is not (e.g. right after startup) is
+        provisioned here first.
+        """
+        container_name: str = random.choice(self.container_names)
+        if container_name not in self.provisioned_container_names:
+            self.provision(container_name=container_name)
+        return container_name
+
+    def provision(self, container_name: str) -> None:
+        if self.client.provision_container(
+            container_name=container_name, public_access="blob"
+        ):
+            logger.info(f"Provisioned guest container '{container_name}'")
+        with self._lock:
+            self.provisioned_container_names.add(container_name)
+
+    def provision_all(self) -> None:
+        for container_name in self.container_names:
+            try:
+                self.provision(container_name=container_name)
+            except Exception as e:
+                logger.error(
+                    f"Failed to provision guest container '{container_name}': {e}"
+                )
+                with self._lock:
+                    self.provisioned_container_names.discard(container_name)
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.to_thread(self.provision_all)
+            await asyncio.sleep(self.interval_seconds)
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+
+guest_container_pool = GuestContainerPool(
+    config=AzureStorageAccountClientConfig(
+        name=settings.AZURE_GUEST_STORAGE_ACCOUNT_NAME,
+        key=settings.AZURE_GUEST_STORAGE_ACCOUNT_KEY,
+        url=settings.AZURE_GUEST_STORAGE_ACCOUNT_URL,
+    ),
+    name_prefix=settings.GUEST_CONTAINER_POOL_NAME_PREFIX,
+    size=settings.GUEST_CONTAINER_POOL_SIZE,
+    interval_seconds=settings.GUEST_CONTAINER_POOL_PROVISION_INTERVAL_SECONDS,
+)
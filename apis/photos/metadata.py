@@ -0,0 +1,189 @@
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from factories.AzureStorageAccountClientFactory.client import (
+    AzureStorageAccountClientFactory,
+)
+from factories.AzureStorageAccountClientFactory.models import (
+    ImageProbe,
+    ImageResizeResult,
+    Resolutions,
+)
+from factories.AzureTableClientFactory.client import AzureTableClientFactory
+from factories.AzureTableClientFactory.models import ImageMetadataTableEntity
+from memory_budget import resize_memory_budget
+from settings import settings
+
+from .models import ImageMetadata, RenditionMetadata
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+# Resizes run on their own bounded pool rather than as background tasks: they
+# may wait for room in the memory budget, and waiting in the request thread
+# pool would hold the threads that run sync routes and dependencies.
+resize_executor = ThreadPoolExecutor(
+    max_workers=settings.RESIZE_MAX_WORKERS, thread_name_prefix="resize"
+)
+
+
+def resize_image_and_record_metadata(
+    client: AzureStorageAccountClientFactory,
+    table_client: AzureTableClientFactory,
+    container_name: str,
+    folder_name: str,
+    blob_name: str,
+    resolutions: List[Resolutions],
+    probe: ImageProbe,
+) -> None:
+    """
+    Resize the image to every resolution in one task, so the original is
+    downloaded, decoded and counted against the memory budget once, then
+    merge its metadata and the renditions into the image's metadata entity.
+    The resize waits for room in the memory budget for the decoded original.
+    """
+    try:
+        resize_original_and_record_metadata(
+            client=client,
+            table_client=table_client,
+            container_name=container_name,
+            folder_name=folder_name,
+            blob_name=blob_name,
+            resolutions=resolutions,
+            probe=probe,
+        )
+    except Exception as e:
+        resolution_values: str = ", ".join(
+            resolution.value for resolution in resolutions
+        )
+        logger.error(
+            f"Failed to resize '{container_name}/{folder_name}/{blob_name}' to {resolution_values}: {e}"
+        )
+
+
+def resize_original_and_record_metadata(
+    client: AzureStorageAccountClientFactory,
+    table_client: AzureTableClientFactory,
+    container_name: str,
+    folder_name: str,
+    blob_name: str,
+    resolutions: List[Resolutions],
+    probe: ImageProbe,
+) -> List[ImageResizeResult]:
+    """
+    Resize the original to each resolution, downloading and decoding it once,
+    and merge the renditions into the image's metadata entity. Only the
+    original that was probed is resized.
+    """
+    with resize_memory_budget.reserve(amount=probe.decoded_bytes):
+        results: List[ImageResizeResult] = client.resize_image_to_resolutions(
+            container_name=container_name,
+            folder_name=folder_name,
+            blob_name=blob_name,
+            resolutions=resolutions,
+            etag=probe.etag,
+        )
+
+    rendition_properties: Dict[str, Any] = {}
+    for result in results:
+        rendition_prefix: str = f"rendition_{result.resolution.value}"
+        rendition_properties.update(
+            {
+                f"{rendition_prefix}_width": result.width,
+                f"{rendition_prefix}_height": result.height,
+                f"{rendition_prefix}_bytes": result.bytes,
+                f"{rendition_prefix}_stage_durations_ms": json.dumps(
+                    result.stage_durations_ms
+                ),
+            }
+        )
+    entity = ImageMetadataTableEntity(
+        container_name=container_name,
+        folder_name=folder_name,
+        blob_name=blob_name,
+        format=results[0].original_format,
+        width=results[0].original_width,
+        height=results[0].original_height,
+        bytes=results[0].original_bytes,
+        sha256=results[0].original_sha256,
+        **rendition_properties,
+    )
+
+    try:
+        table_client.upsert_entity(entity=entity)
+    except Exception as e:
+        logger.error(
+            f"Failed to record metadata for '{container_name}/{folder_name}': {e}"
+        )
+    return results
+
+
+def to_image_metadata(
+    entity: Dict[str, Any], storage_account_url: str
+) -> ImageMetadata:
+    folder_url: str = (
+        f"{storage_account_url}/{entity['container_name']}/{entity['folder_name']}"
+    )
+    extension: str = entity["blob_name"].split(".")[-1]
+
+    renditions: Dict[Resolutions, RenditionMetadata] = {}
+    for resolution in Resolutions:
+        rendition_prefix: str = f"rendition_{resolution.value}"
+        if f"{rendition_prefix}_width" not in entity:
+            continue
+        renditions[resolution] = RenditionMetadata(
+            url=f"{folder_url}/{resolution.value}.{extension}",
+            width=entity[f"{rendition_prefix}_width"],
+            height=entity[f"{rendition_prefix}_height"],
+            bytes=entity[f"{rendition_prefix}_bytes"],
+            stage_durations_ms=json.loads(
+                entity.get(f"{rendition_prefix}_stage_durations_ms") or "{}"
+            ),
+        )
+
+    return ImageMetadata(
+        container_name=entity["container_name"],
+        folder_name=entity["folder_name"],
+        blob_name=entity["blob_name"],
+        url=f"{folder_url}/{entity['blob_name']}",
+        format=entity.get("format"),
+        width=entity["width"],
+        height=entity["height"],
+        bytes=entity["bytes"],
+        sha256=entity["sha256"],
+        renditions=renditions,
+    )
+
+
+def get_image_metadata(
+    table_client: AzureTableClientFactory,
+    storage_account_url: str,
+    container_name: str,
+    folder_name: str,
+) -> ImageMetadata | None:
+    entity = table_client.get_entity(
+        partition_key=ImageMetadataTableEntity.get_partition_key(
+            container_name=container_name
+        ),
+        row_key=folder_name,
+    )
+    if entity is None:
+        return None
+    return to_image_metadata(entity=entity, storage_account_url=storage_account_url)
+
+
+def list_image_metadata(
+    table_client: AzureTableClientFactory,
+    storage_account_url: str,
+    container_name: str,
+) -> List[ImageMetadata]:
+    entities = table_client.list_partition(
+        partition_key=ImageMetadataTableEntity.get_partition_key(
+            container_name=container_name
+        )
+    )
+    return [
+        to_image_metadata(entity=entity, storage_account_url=storage_account_url)
+        for entity in entities
+    ]
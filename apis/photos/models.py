@@ -1,7 +1,10 @@
-from typing import Annotated
+from datetime import datetime
+from enum import Enum
+from functools import cached_property
+from typing import Annotated, Dict, List
 
 from factories.AzureStorageAccountClientFactory.models import Resolutions
-from pydantic import UUID4, BaseModel, Field, HttpUrl, computed_field
+from pydantic import BaseModel, Field, HttpUrl, computed_field
 
 
 class PhotoDetails(BaseModel):
@@ -33,30 +36,36 @@ class PresignedUrlResponse(BaseModel):
         HttpUrl, Field(description="The presigned URL for uploading the photo")
     ]
 
-    @computed_field
+    # The URL is split once, on first use, and the computed fields below are
+    # returned as the strings they are rather than re-validated as URLs.
+    @cached_property
+    def _url_segments(self) -> List[str]:
+        return str(self.url).partition("?")[0].split("/")
+
+    @computed_field(json_schema_extra={"format": "uri"})
     @property
-    def storage_account_url(self) -> HttpUrl:
-        return "/".join(str(self.url).split("/")[:3])
+    def storage_account_url(self) -> str:
+        return "/".join(self._url_segments[:3])
 
     @computed_field
     @property
-    def container_id(self) -> UUID4:
-        return str(self.url).split("/")[3]
+    def container_id(self) -> str:
+        return self._url_segments[3]
 
-    @computed_field
+    @computed_field(json_schema_extra={"format": "uuid4"})
     @property
-    def folder_name(self) -> UUID4:
-        return str(self.url).split("/")[4]
+    def folder_name(self) -> str:
+        return self._url_segments[4]
 
     @computed_field
     @property
     def blob_name(self) -> str:
-        return str(self.url).split("/")[5].split("?")[0]
+        return self._url_segments[5]
 
-    @computed_field
+    @computed_field(json_schema_extra={"format": "uri"})
     @property
-    def direct_url(self) -> HttpUrl:
-        return f"{self.storage_account_url}/{self.container_id}/{self.folder_name}/{self.blob_name}"
+    def direct_url(self) -> str:
+        return "/".join(self._url_segments[:6])
 
 
 class ImageResizeRequest(PhotoDetails):
@@ -72,3 +81,129 @@ class ImageResizeResponse(BaseModel):
     resolution: Annotated[
         Resolutions, Field(description="The resolution to resize the image to")
     ]
+
+
+class ImageFile(BaseModel):
+    name: Annotated[str, Field(description="The file name within the folder")]
+    url: Annotated[HttpUrl, Field(description="The direct URL to the file")]
+    size: Annotated[int, Field(description="The file size in bytes")]
+    content_type: Annotated[str | None, Field(description="The file content type")] = (
+        None
+    )
+    last_modified: Annotated[
+        datetime | None, Field(description="When the file was last modified")
+    ] = None
+
+
+class FolderContentsResponse(BaseModel):
+    container_name: Annotated[str, Field(description="The container ID")]
+    folder_name: Annotated[
+        str | None, Field(description="The listed folder, or None for the container")
+    ] = None
+    folders: Annotated[
+        List[str], Field(description="The folders directly under the listed folder")
+    ] = []
+    image_files: Annotated[
+        List[ImageFile], Field(description="The files directly under the listed folder")
+    ] = []
+    continuation_token: Annotated[
+        str | None,
+        Field(description="Pass as `continuation_token` to get the next page"),
+    ] = None
+
+
+class RenditionMetadata(BaseModel):
+    url: Annotated[HttpUrl, Field(description="The direct URL to the rendition")]
+    width: Annotated[int, Field(description="The width in pixels")]
+    height: Annotated[int, Field(description="The height in pixels")]
+    bytes: Annotated[int, Field(description="The size in bytes")]
+    stage_durations_ms: Annotated[
+        Dict[str, float],
+        Field(description="How long each pipeline stage took for this rendition"),
+    ] = {}
+
+
+class ImageMetadata(BaseModel):
+    container_name: Annotated[str, Field(description="The container ID")]
+    folder_name: Annotated[str, Field(description="The folder name")]
+    blob_name: Annotated[str, Field(description="The original blob name")]
+    url: Annotated[HttpUrl, Field(description="The direct URL to the original")]
+    format: Annotated[str | None, Field(description="The original image format")]
+    width: Annotated[int, Field(description="The original width in pixels")]
+    height: Annotated[int, Field(description="The original height in pixels")]
+    bytes: Annotated[int, Field(description="The original size in bytes")]
+    sha256: Annotated[str, Field(description="The SHA-256 hex digest of the original")]
+    renditions: Annotated[
+        Dict[Resolutions, RenditionMetadata],
+        Field(description="The renditions created so far, by resolution"),
+    ] = {}
+
+
+class ImageMetadataListResponse(BaseModel):
+    container_name: Annotated[str, Field(description="The container ID")]
+    images: Annotated[
+        List[ImageMetadata], Field(description="The metadata of every image")
+    ] = []
+
+
+class ImageResizeBatchRequest(BaseModel):
+    items: Annotated[
+        List[ImageResizeRequest],
+        Field(description="The blob and resolution pairs to resize", min_length=1),
+    ]
+
+
+class ResizeBatchStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+
+
+class ResizeBatchOriginal(BaseModel):
+    container_name: Annotated[str, Field(description="The container ID")]
+    folder_name: Annotated[str, Field(description="The folder name")]
+    name: Annotated[str, Field(description="The original blob name")]
+    resolutions: Annotated[
+        List[Resolutions], Field(description="The resolutions to resize it to")
+    ]
+    status: Annotated[
+        ResizeBatchStatus, Field(description="The status of this original")
+    ] = ResizeBatchStatus.queued
+    error: Annotated[str | None, Field(description="Why resizing it failed")] = None
+
+
+class ResizeBatchResponse(BaseModel):
+    batch_id: Annotated[str, Field(description="The handle to poll the batch with")]
+    originals: Annotated[
+        List[ResizeBatchOriginal],
+        Field(description="The originals in the batch, each fetched once"),
+    ]
+
+    @computed_field
+    @property
+    def status_counts(self) -> Dict[ResizeBatchStatus, int]:
+        return {
+            status: sum(original.status == status for original in self.originals)
+            for status in ResizeBatchStatus
+        }
+
+    @computed_field
+    @property
+    def total_renditions(self) -> int:
+        return sum(len(original.resolutions) for original in self.originals)
+
+    @computed_field
+    @property
+    def completed_renditions(self) -> int:
+        return sum(
+            len(original.resolutions)
+            for original in self.originals
+            if original.status
+            in (ResizeBatchStatus.succeeded, ResizeBatchStatus.failed)
+        )
+
+    @computed_field
+    @property
+    def is_completed(self) -> bool:
+        return self.completed_renditions == self.total_renditions
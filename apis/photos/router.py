@@ -1,22 +1,58 @@
+import asyncio
 import logging
-from typing import Annotated
-from uuid import UUID
+from typing import Annotated, List
+from urllib.parse import quote
 
+from auth import Principal, get_principal
+from azure.core.exceptions import ResourceNotFoundError
+from clients import get_azure_table_client, get_storage_account_client
 from factories.AzureStorageAccountClientFactory.client import (
     AzureStorageAccountClientFactory,
 )
 from factories.AzureStorageAccountClientFactory.models import (
     AzureStorageAccountClientConfig,
+    FolderContentsPage,
+    ImageProbe,
 )
-from fastapi import APIRouter, BackgroundTasks, Body, Header, Request
+from factories.AzureStorageAccountClientFactory.probe import (
+    ImageProbeRejectedException,
+)
+from fastapi import (
+    APIRouter,
+    Body,
+    Depends,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+)
+from pydantic import TypeAdapter
+from rate_limiting import rate_limiter
+from request_cost import record_resize_tasks
+from serialization import dump_json_response
 from settings import settings
 from telemetry import metrics_wrapper
 
+from .batch import get_resize_batch, group_by_original, start_resize_batch
+from .guest_container_pool import guest_container_pool
+from .metadata import (
+    get_image_metadata,
+    list_image_metadata,
+    resize_executor,
+    resize_image_and_record_metadata,
+)
 from .models import (
+    FolderContentsResponse,
+    ImageFile,
+    ImageMetadata,
+    ImageMetadataListResponse,
+    ImageResizeBatchRequest,
     ImageResizeRequest,
     ImageResizeResponse,
     PhotoDetails,
     PresignedUrlResponse,
+    ResizeBatchOriginal,
+    ResizeBatchResponse,
 )
 
 logger: logging.Logger = logging.getLogger(__name__)
@@ -26,23 +62,15 @@ _PATH_PREFIX = f"/{_PREFIX}"
 
 photos_router = APIRouter(prefix=_PATH_PREFIX)
 
-
-def is_user_guest(headers: Header) -> bool:
-    if headers["X-User-Is-Guest"] == "True":
-        return True
-    return False
-
-
-def get_user_oid(headers) -> UUID:
-    oid = headers["X-User-Oid"]
-    oid = UUID(oid)
-    return oid
+presigned_url_response_adapter: TypeAdapter[PresignedUrlResponse] = TypeAdapter(
+    PresignedUrlResponse
+)
 
 
 def determine_storage_account_config(
-    headers,
+    principal: Principal,
 ) -> AzureStorageAccountClientConfig:
-    if is_user_guest(headers):
+    if principal.is_guest:
         account_name = settings.AZURE_GUEST_STORAGE_ACCOUNT_NAME
         account_key = settings.AZURE_GUEST_STORAGE_ACCOUNT_KEY
         url = settings.AZURE_GUEST_STORAGE_ACCOUNT_URL
@@ -53,57 +81,128 @@ def determine_storage_account_config(
     return AzureStorageAccountClientConfig(name=account_name, key=account_key, url=url)
 
 
+def resolve_container_name(
+    principal: Principal, container_name: str | None, folder_name: str | None = None
+) -> str:
+    # Registered users may only read their own container. Guest uploads share
+    # the guest account, so guests may only read the folder (an unguessable
+    # UUID) returned with their upload URL, whatever the container.
+    if container_name is None:
+        if principal.is_guest:
+            raise HTTPException(status_code=400, detail="container_name is required")
+        return str(principal.oid)
+    if not principal.is_guest and container_name != str(principal.oid):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    if principal.is_guest and not folder_name:
+        raise HTTPException(status_code=403, detail="folder_name is required")
+    return container_name
+
+
+async def probe_original_image(
+    client: AzureStorageAccountClientFactory,
+    container_name: str,
+    folder_name: str,
+    blob_name: str,
+) -> ImageProbe:
+    try:
+        return await asyncio.to_thread(
+            client.probe_image,
+            container_name=container_name,
+            folder_name=folder_name,
+            blob_name=blob_name,
+        )
+    except ResourceNotFoundError:
+        raise HTTPException(status_code=404, detail="Image not found")
+    except ImageProbeRejectedException as e:
+        metrics_wrapper.increment_image_probe_rejection(reason=e.reason)
+        raise HTTPException(status_code=422, detail=e.detail)
+
+
 @photos_router.post(
     path="/get-signed-url",
     summary="Get a signed URL for uploading a photo",
     tags=["Presigned URLs"],
+    dependencies=[Depends(rate_limiter.limit(cost=1))],
+    response_model=PresignedUrlResponse,
 )
 async def get_signed_url(
-    request: Request, photo_details: Annotated[PhotoDetails, Body]
-) -> PresignedUrlResponse:
+    principal: Annotated[Principal, Depends(get_principal)],
+    photo_details: Annotated[PhotoDetails, Body],
+) -> Response:
     logger.info("Getting signed URL for photo upload")
-    client_config = determine_storage_account_config(request.headers)
-    client = AzureStorageAccountClientFactory(
-        account_name=client_config.name, account_key=client_config.key
+    client_config = determine_storage_account_config(principal=principal)
+    client: AzureStorageAccountClientFactory = get_storage_account_client(
+        config=client_config
     )
 
-    container_name: UUID = get_user_oid(request.headers)
+    # Guests upload into a pre-provisioned shard, registered users into their
+    # own container, which is created on first use.
+    if principal.is_guest:
+        container_name: str = await asyncio.to_thread(
+            guest_container_pool.get_container_name
+        )
+    else:
+        container_name = str(principal.oid)
 
     logger.info(
         f"Generating signed URL for blob '{photo_details.name}' in container '{container_name}'"
     )
 
-    signed_url = client.generate_post_signed_url(
-        container_name=str(container_name), blob_name=photo_details.name
+    signed_url: str = await asyncio.to_thread(
+        client.generate_post_signed_url,
+        container_name=container_name,
+        blob_name=photo_details.name,
+        ensure_container=not principal.is_guest,
     )
 
     logger.info(f"Signed URL generated: {signed_url}")
     metrics_wrapper.increment_upload_request()
 
-    return PresignedUrlResponse(url=signed_url)
+    return dump_json_response(
+        adapter=presigned_url_response_adapter,
+        content=PresignedUrlResponse(url=signed_url),
+    )
 
 
 @photos_router.post(path="/resize", summary="Resize a photo", tags=["Image Processing"])
 async def resize_photo(
     resize_request: ImageResizeRequest,
     request: Request,
-    background_task: BackgroundTasks,
+    principal: Annotated[Principal, Depends(get_principal)],
 ) -> ImageResizeResponse:
-    client_config = determine_storage_account_config(request.headers)
-    client = AzureStorageAccountClientFactory(
-        account_name=client_config.name, account_key=client_config.key
+    await rate_limiter.check(
+        request=request,
+        principal=principal,
+        cost=rate_limiter.get_resize_cost(resolutions=[resize_request.resolution]),
+    )
+
+    client_config = determine_storage_account_config(principal=principal)
+    client: AzureStorageAccountClientFactory = get_storage_account_client(
+        config=client_config
+    )
+    probe: ImageProbe = await probe_original_image(
+        client=client,
+        container_name=resize_request.container_name,
+        folder_name=resize_request.folder_name,
+        blob_name=resize_request.name,
     )
 
     logger.info(
         f"Background Task: Resizing image for request {resize_request.model_dump()}"
     )
-    background_task.add_task(
-        client.resize_image,
+    resize_executor.submit(
+        metrics_wrapper.track_background_task_queue_wait(
+            task_name="resize_image", func=resize_image_and_record_metadata
+        ),
+        client=client,
+        table_client=get_azure_table_client(),
         container_name=resize_request.container_name,
         folder_name=resize_request.folder_name,
         blob_name=resize_request.name,
-        resolution=resize_request.resolution,
+        resolutions=[resize_request.resolution],
+        probe=probe,
     )
+    record_resize_tasks(count=1)
 
     metrics_wrapper.increment_resolution_request(
         resolution=resize_request.resolution.value
@@ -117,3 +216,196 @@ async def resize_photo(
         url=f"{client_config.url}/{str(resize_request.container_name)}/{str(resize_request.folder_name)}/{resize_request.resolution.value}.{file_extension}",
         resolution=resize_request.resolution.value,
     )
+
+
+def get_batch_owner(principal: Principal) -> str:
+    # Guests get a new ID on every request, so any guest holding the batch ID
+    # (a random UUID) may read a guest batch.
+    return "guest" if principal.is_guest else str(principal.oid)
+
+
+@photos_router.post(
+    path="/resize/batch",
+    summary="Resize many photos",
+    tags=["Image Processing"],
+    status_code=202,
+)
+async def resize_photos_batch(
+    batch_request: ImageResizeBatchRequest,
+    request: Request,
+    principal: Annotated[Principal, Depends(get_principal)],
+) -> ResizeBatchResponse:
+    if len(batch_request.items) > settings.RESIZE_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"At most {settings.RESIZE_BATCH_MAX_ITEMS} items are allowed",
+        )
+
+    originals: List[ResizeBatchOriginal] = group_by_original(items=batch_request.items)
+    for original in originals:
+        original.container_name = resolve_container_name(
+            principal=principal,
+            container_name=original.container_name,
+            folder_name=original.folder_name,
+        )
+
+    await rate_limiter.check(
+        request=request,
+        principal=principal,
+        cost=sum(
+            rate_limiter.get_resize_cost(resolutions=original.resolutions)
+            for original in originals
+        ),
+    )
+
+    client_config = determine_storage_account_config(principal=principal)
+    client: AzureStorageAccountClientFactory = get_storage_account_client(
+        config=client_config
+    )
+
+    for item in batch_request.items:
+        metrics_wrapper.increment_resolution_request(resolution=item.resolution.value)
+        metrics_wrapper.increment_image_type(image_type=item.name.split(".")[-1])
+
+    return await asyncio.to_thread(
+        start_resize_batch,
+        client=client,
+        table_client=get_azure_table_client(),
+        owner=get_batch_owner(principal=principal),
+        originals=originals,
+    )
+
+
+@photos_router.get(
+    path="/resize/batch/{batch_id}",
+    summary="Get the progress of a batch resize",
+    tags=["Image Processing"],
+    dependencies=[Depends(rate_limiter.limit(cost=1))],
+)
+async def get_resize_batch_progress(
+    principal: Annotated[Principal, Depends(get_principal)],
+    batch_id: str,
+) -> ResizeBatchResponse:
+    batch: ResizeBatchResponse | None = await asyncio.to_thread(
+        get_resize_batch,
+        table_client=get_azure_table_client(),
+        batch_id=batch_id,
+        owner=get_batch_owner(principal=principal),
+    )
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Resize batch not found")
+    return batch
+
+
+@photos_router.get(
+    path="/list-folder-contents",
+    summary="List the folders and images in a container or folder",
+    dependencies=[Depends(rate_limiter.limit(cost=1))],
+)
+async def list_folder_contents(
+    principal: Annotated[Principal, Depends(get_principal)],
+    container_name: Annotated[
+        str | None,
+        Query(description="The container ID. Defaults to the user's own container"),
+    ] = None,
+    folder_name: Annotated[
+        str | None, Query(description="The folder to list. Omit to list folders")
+    ] = None,
+    page_size: Annotated[
+        int, Query(gt=0, le=settings.FOLDER_LISTING_MAX_PAGE_SIZE)
+    ] = 100,
+    continuation_token: Annotated[
+        str | None, Query(description="The token returned with the previous page")
+    ] = None,
+) -> FolderContentsResponse:
+    container_name = resolve_container_name(
+        principal=principal, container_name=container_name, folder_name=folder_name
+    )
+    client_config = determine_storage_account_config(principal=principal)
+    client: AzureStorageAccountClientFactory = get_storage_account_client(
+        config=client_config
+    )
+
+    try:
+        page: FolderContentsPage = await asyncio.to_thread(
+            client.list_folder_contents,
+            container_name=container_name,
+            folder_name=folder_name,
+            page_size=page_size,
+            continuation_token=continuation_token,
+        )
+    except ResourceNotFoundError:
+        raise HTTPException(status_code=404, detail="Container not found")
+
+    folder_url: str = "/".join(
+        quote(part) for part in (container_name, folder_name) if part
+    )
+    return FolderContentsResponse(
+        container_name=container_name,
+        folder_name=folder_name,
+        folders=page.folders,
+        image_files=[
+            ImageFile(
+                url=f"{client_config.url}/{folder_url}/{quote(file.name)}",
+                **file.model_dump(),
+            )
+            for file in page.files
+        ],
+        continuation_token=page.continuation_token,
+    )
+
+
+@photos_router.get(
+    path="/metadata",
+    summary="Get the metadata of every image in a container",
+    dependencies=[Depends(rate_limiter.limit(cost=1))],
+)
+async def list_metadata(
+    principal: Annotated[Principal, Depends(get_principal)],
+    container_name: Annotated[
+        str | None,
+        Query(description="The container ID. Defaults to the user's own container"),
+    ] = None,
+) -> ImageMetadataListResponse:
+    container_name = resolve_container_name(
+        principal=principal, container_name=container_name
+    )
+    client_config = determine_storage_account_config(principal=principal)
+
+    images: List[ImageMetadata] = await asyncio.to_thread(
+        list_image_metadata,
+        table_client=get_azure_table_client(),
+        storage_account_url=client_config.url,
+        container_name=container_name,
+    )
+    return ImageMetadataListResponse(container_name=container_name, images=images)
+
+
+@photos_router.get(
+    path="/metadata/{folder_name}",
+    summary="Get the metadata of an image and its renditions",
+    dependencies=[Depends(rate_limiter.limit(cost=1))],
+)
+async def get_metadata(
+    principal: Annotated[Principal, Depends(get_principal)],
+    folder_name: str,
+    container_name: Annotated[
+        str | None,
+        Query(description="The container ID. Defaults to the user's own container"),
+    ] = None,
+) -> ImageMetadata:
+    container_name = resolve_container_name(
+        principal=principal, container_name=container_name, folder_name=folder_name
+    )
+    client_config = determine_storage_account_config(principal=principal)
+
+    image_metadata: ImageMetadata | None = await asyncio.to_thread(
+        get_image_metadata,
+        table_client=get_azure_table_client(),
+        storage_account_url=client_config.url,
+        container_name=container_name,
+        folder_name=folder_name,
+    )
+    if image_metadata is None:
+        raise HTTPException(status_code=404, detail="Image metadata not found")
+    return image_metadata
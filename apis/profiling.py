@@ -0,0 +1,204 @@
+import asyncio
+import hashlib
+import hmac
+import logging
+import os
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from types import CodeType, FrameType
+from typing import Dict, List
+from uuid import uuid4
+
+from settings import settings
+from ttl_cache import TTLCache
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+PROFILE_REQUEST_HEADER = "X-Profile-Request"
+PROFILE_ID_HEADER = "X-Profile-Id"
+
+# Frames are labelled with paths relative to the app, site-packages or the
+# standard library, whichever is the longest match.
+_SOURCE_ROOTS: List[str] = sorted(
+    {
+        os.path.join(path, "")
+        for path in [
+            os.path.dirname(os.path.abspath(__file__)),
+            *sysconfig.get_paths().values(),
+        ]
+    },
+    key=len,
+    reverse=True,
+)
+
+
+def _describe(code: CodeType) -> str:
+    filename: str = code.co_filename
+    for root in _SOURCE_ROOTS:
+        if filename.startswith(root):
+            filename = filename[len(root) :]
+            break
+    # The first line identifies the function; per-line frames would split
+    # every function into many flame graph boxes.
+    return f"{code.co_qualname} ({filename}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    A statistical profiler: a thread that records the stack of every other
+    thread (the event loop, request and background task workers) every
+    `interval_seconds`. Nothing is traced between samples, and the thread
+    only exists while sampling, so it costs nothing when not running.
+    """
+
+    def __init__(self, interval_seconds: float) -> None:
+        self.interval_seconds: float = interval_seconds
+        self.sample_count: int = 0
+        self.stacks: Counter[str] = Counter()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _sample(self) -> None:
+        sampler_thread_id: int = threading.get_ident()
+        while not self._stop.wait(timeout=self.interval_seconds):
+            thread_names: Dict[int, str] = {
+                thread.ident: thread.name for thread in threading.enumerate()
+            }
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == sampler_thread_id:
+                    continue
+                functions: List[str] = []
+                current: FrameType | None = frame
+                while current is not None:
+                    functions.append(_describe(code=current.f_code))
+                    current = current.f_back
+                functions.append(thread_names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(functions))] += 1
+            self.sample_count += 1
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._sample, name="stack-sampler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def collapsed(self) -> str:
+        """
+        The samples in the collapsed ("folded") stack format read by
+        flamegraph.pl, inferno and speedscope: one `frame;frame;frame count`
+        line per distinct stack, outermost frame first.
+        """
+        return "".join(
+            f"{stack} {count}\n" for stack, count in self.stacks.most_common()
+        )
+
+
+class ProfilerBusyException(Exception):
+    pass
+
+
+_process_profile_lock = asyncio.Lock()
+
+
+async def profile_process(duration_seconds: float, interval_seconds: float) -> str:
+    """
+    Sample every thread of this process for `duration_seconds` and return the
+    collapsed stacks. Only one process profile runs at a time.
+    """
+    if _process_profile_lock.locked():
+        raise ProfilerBusyException()
+    async with _process_profile_lock:
+        sampler = StackSampler(interval_seconds=interval_seconds)
+        sampler.start()
+        try:
+            await asyncio.sleep(duration_seconds)
+        finally:
+            await asyncio.to_thread(sampler.stop)
+        logger.info(
+            f"Profiled the process for {duration_seconds}s ({sampler.sample_count} samples)"
+        )
+        return sampler.collapsed()
+
+
+# Per-request profiles, kept for the admin API to fetch by the ID returned in
+# the `X-Profile-Id` response header.
+request_profiles: TTLCache[str] = TTLCache(
+    ttl_seconds=settings.REQUEST_PROFILE_TTL_SECONDS,
+    max_entries=settings.REQUEST_PROFILE_MAX_ENTRIES,
+)
+
+
+_request_profile_slots = asyncio.Semaphore(settings.REQUEST_PROFILE_MAX_CONCURRENT)
+
+
+def is_request_profiler_busy() -> bool:
+    return _request_profile_slots.locked()
+
+
+def _sign(expires_at: int) -> str:
+    return hmac.new(
+        key=settings.ADMIN_API_KEY.encode(),
+        msg=f"{PROFILE_REQUEST_HEADER}:{expires_at}".encode(),
+        digestmod=hashlib.sha256,
+    ).hexdigest()
+
+
+def create_profile_request_token(ttl_seconds: int) -> str:
+    """
+    A value for the `X-Profile-Request` header that enables profiling of the
+    requests carrying it until it expires, signed with the admin API key.
+    """
+    expires_at: int = int(time.time()) + ttl_seconds
+    return f"{expires_at}.{_sign(expires_at=expires_at)}"
+
+
+def is_profile_request_token_valid(token: str) -> bool:
+    if settings.ADMIN_API_KEY is None:
+        return False
+    expires_at, _, signature = token.partition(".")
+    if not expires_at.isdigit() or int(expires_at) < time.time():
+        return False
+    return hmac.compare_digest(signature, _sign(expires_at=int(expires_at)))
+
+
+class RequestProfile:
+    """
+    Samples the process while one request is handled. Concurrent requests
+    show up in the samples too, so profile requests on a quiet replica or
+    compare against a process profile.
+
+    At most `REQUEST_PROFILE_MAX_CONCURRENT` requests are profiled at once;
+    check `is_request_profiler_busy` before entering one.
+    """
+
+    def __init__(self, description: str) -> None:
+        self.profile_id: str = str(uuid4())
+        self.description: str = description
+        self.sampler = StackSampler(
+            interval_seconds=settings.PROFILER_SAMPLING_INTERVAL_SECONDS
+        )
+
+    async def __aenter__(self) -> "RequestProfile":
+        await _request_profile_slots.acquire()
+        self.sampler.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        try:
+            # Joining the sampler thread waits for its current sample.
+            await asyncio.to_thread(self.sampler.stop)
+        finally:
+            _request_profile_slots.release()
+        request_profiles.set(key=self.profile_id, value=self.sampler.collapsed())
+        logger.info(
+            f"Profiled {self.description} as '{self.profile_id}' ({self.sampler.sample_count} samples)"
+        )
@@ -0,0 +1,286 @@
+import abc
+import asyncio
+import hashlib
+import hmac
+import logging
+import math
+import time
+from collections import OrderedDict
+from typing import Annotated, Callable, Dict, Iterable, Tuple
+
+from auth import Principal, get_principal
+from clients import get_azure_table_client
+from factories.AzureStorageAccountClientFactory.models import Resolutions
+from factories.AzureTableClientFactory.client import AzureTableClientFactory
+from fastapi import HTTPException, Request, status
+from pydantic import BaseModel, Field
+from settings import settings
+from telemetry import metrics_wrapper
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+FORWARDED_CLIENT_HEADER = "X-Forwarded-Client"
+
+
+class TokenBucketLimit(BaseModel):
+    capacity: Annotated[
+        float, Field(description="The maximum burst, in cost units", gt=0)
+    ]
+    refill_per_second: Annotated[
+        float, Field(description="The cost units regained per second", gt=0)
+    ]
+
+
+def _refill(
+    tokens: float, updated_at: float, now: float, limit: TokenBucketLimit
+) -> float:
+    return min(limit.capacity, tokens + (now - updated_at) * limit.refill_per_second)
+
+
+def _retry_after(tokens: float, cost: float, limit: TokenBucketLimit) -> float:
+    # A request costing more than the capacity could never pass; it is retried
+    # once the bucket is full and then allowed to overdraw it.
+    missing_tokens: float = min(cost, limit.capacity) - tokens
+    return max(missing_tokens, 0) / limit.refill_per_second
+
+
+class TokenBucketStore(abc.ABC):
+    @abc.abstractmethod
+    async def consume(self, key: str, cost: float, limit: TokenBucketLimit) -> float:
+        """
+        Take `cost` tokens from the bucket for `key`. Returns 0 when they were
+        taken, otherwise the seconds until enough tokens will be available.
+        """
+
+
+class InMemoryTokenBucketStore(TokenBucketStore):
+    """
+    Buckets held by this process only, so each worker and replica enforces
+    the limits on its own. The least recently used buckets are dropped once
+    `max_keys` are held.
+    """
+
+    def __init__(self, max_keys: int) -> None:
+        self.max_keys: int = max_keys
+        self._buckets: OrderedDict[str, Tuple[float, float]] = OrderedDict()
+
+    async def consume(self, key: str, cost: float, limit: TokenBucketLimit) -> float:
+        # Runs on the event loop without awaiting, so it is not interleaved.
+        now: float = time.monotonic()
+        tokens, updated_at = self._buckets.pop(key, (limit.capacity, now))
+        tokens = _refill(tokens=tokens, updated_at=updated_at, now=now, limit=limit)
+
+        retry_after: float = _retry_after(tokens=tokens, cost=cost, limit=limit)
+        if retry_after == 0:
+            tokens -= cost
+
+        self._buckets[key] = (tokens, now)
+        while len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return retry_after
+
+
+class TableTokenBucketStore(TokenBucketStore):
+    """
+    Buckets shared by every replica, stored as entities in Table Storage and
+    updated with optimistic concurrency (ETags). Requests are allowed when the
+    table cannot be reached, so an outage does not take the API down.
+    """
+
+    def __init__(
+        self, table_client: AzureTableClientFactory, max_attempts: int
+    ) -> None:
+        self.table_client: AzureTableClientFactory = table_client
+        self.max_attempts: int = max_attempts
+
+    async def consume(self, key: str, cost: float, limit: TokenBucketLimit) -> float:
+        try:
+            return await asyncio.to_thread(
+                self._consume, key=key, cost=cost, limit=limit
+            )
+        except Exception as e:
+            logger.error(f"Rate limit store unavailable, allowing request: {e}")
+            return 0
+
+    def _consume(self, key: str, cost: float, limit: TokenBucketLimit) -> float:
+        partition_key: str = f"rate-limit-{key}"
+        for _ in range(self.max_attempts):
+            now: float = time.time()
+            entity = self.table_client.get_entity(
+                partition_key=partition_key, row_key="bucket"
+            )
+            if entity is None:
+                tokens: float = limit.capacity
+            else:
+                tokens = _refill(
+                    tokens=entity["tokens"],
+                    updated_at=entity["updated_at"],
+                    now=now,
+                    limit=limit,
+                )
+
+            retry_after: float = _retry_after(tokens=tokens, cost=cost, limit=limit)
+            if retry_after > 0:
+                return retry_after
+
+            if entity is None:
+                is_consumed: bool = self.table_client.create_entity_if_absent(
+                    entity={
+                        "PartitionKey": partition_key,
+                        "RowKey": "bucket",
+                        "tokens": tokens - cost,
+                        "updated_at": now,
+                    }
+                )
+            else:
+                entity["tokens"] = tokens - cost
+                entity["updated_at"] = now
+                is_consumed = self.table_client.replace_entity_if_unchanged(
+                    entity=entity
+                )
+            if is_consumed:
+                return 0
+
+        logger.warning(f"Rate limit bucket '{key}' is contended, allowing request")
+        return 0
+
+
+class RateLimiter:
+    """
+    Token bucket rate limiting per principal. Registered users are limited by
+    object ID; guests get a new ID on every request, so they are limited by
+    client address instead.
+
+    Guests using the frontend all reach the API from the frontend's address.
+    It forwards each visitor's address in an `X-Forwarded-Client` header
+    signed with `forwarded_client_secret`, and guests are limited by that
+    address when the signature is valid.
+    """
+
+    def __init__(
+        self,
+        store: TokenBucketStore,
+        guest_limit: TokenBucketLimit,
+        registered_limit: TokenBucketLimit,
+        resolution_costs: Dict[str, float],
+        trusted_proxy_count: int,
+        forwarded_client_secret: str | None = None,
+        is_enabled: bool = True,
+    ) -> None:
+        self.store: TokenBucketStore = store
+        self.guest_limit: TokenBucketLimit = guest_limit
+        self.registered_limit: TokenBucketLimit = registered_limit
+        self.resolution_costs: Dict[str, float] = resolution_costs
+        self.trusted_proxy_count: int = trusted_proxy_count
+        self.forwarded_client_secret: str | None = forwarded_client_secret
+        self.is_enabled: bool = is_enabled
+
+    def get_resize_cost(self, resolutions: Iterable[Resolutions]) -> float:
+        return sum(
+            self.resolution_costs.get(resolution.value, 1) for resolution in resolutions
+        )
+
+    def _sign_forwarded_client(self, expires_at: int, address: str) -> str:
+        return hmac.new(
+            key=self.forwarded_client_secret.encode(),
+            msg=f"{FORWARDED_CLIENT_HEADER}:{expires_at}:{address}".encode(),
+            digestmod=hashlib.sha256,
+        ).hexdigest()
+
+    def get_forwarded_client_address(self, request: Request) -> str | None:
+        """
+        The visitor address from an `X-Forwarded-Client` header of the form
+        `<expires_at>.<signature>.<address>`, or None when the header is
+        missing, expired or not signed with the shared secret.
+        """
+        value: str | None = request.headers.get(FORWARDED_CLIENT_HEADER)
+        # An empty secret (e.g. an unset Compose variable) is not a secret.
+        if not self.forwarded_client_secret or value is None:
+            return None
+        expires_at, _, value = value.partition(".")
+        signature, _, address = value.partition(".")
+        if not expires_at.isdigit() or int(expires_at) < time.time() or not address:
+            return None
+        if not hmac.compare_digest(
+            signature,
+            self._sign_forwarded_client(expires_at=int(expires_at), address=address),
+        ):
+            logger.warning(f"Ignoring invalid {FORWARDED_CLIENT_HEADER} header")
+            return None
+        return address
+
+    def get_client_address(self, request: Request) -> str:
+        forwarded_client_address: str | None = self.get_forwarded_client_address(
+            request=request
+        )
+        if forwarded_client_address is not None:
+            return forwarded_client_address
+
+        # Each trusted proxy appends the address it received the request from,
+        # so the client is the entry that many places from the end.
+        forwarded_for = [
+            address.strip()
+            for address in request.headers.get("X-Forwarded-For", "").split(",")
+            if address.strip()
+        ]
+        if self.trusted_proxy_count and len(forwarded_for) >= self.trusted_proxy_count:
+            return forwarded_for[-self.trusted_proxy_count]
+        return request.client.host if request.client else "unknown"
+
+    async def check(self, request: Request, principal: Principal, cost: float) -> None:
+        if not self.is_enabled or cost <= 0:
+            return
+
+        if principal.is_guest:
+            user_type, limit = "Guest", self.guest_limit
+            key: str = f"guest-{self.get_client_address(request=request)}"
+        else:
+            user_type, limit = "Registered", self.registered_limit
+            key = f"registered-{principal.oid}"
+
+        retry_after: float = await self.store.consume(key=key, cost=cost, limit=limit)
+        if retry_after > 0:
+            metrics_wrapper.increment_rate_limited_request(user_type=user_type)
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+    def limit(self, cost: float) -> Callable:
+        """
+        A route dependency that charges `cost` to the caller's bucket.
+        """
+
+        async def dependency(request: Request) -> None:
+            await self.check(
+                request=request, principal=get_principal(request=request), cost=cost
+            )
+
+        return dependency
+
+
+def create_token_bucket_store() -> TokenBucketStore:
+    if settings.RATE_LIMIT_STORE == "table":
+        return TableTokenBucketStore(
+            table_client=get_azure_table_client(),
+            max_attempts=settings.RATE_LIMIT_TABLE_STORE_MAX_ATTEMPTS,
+        )
+    return InMemoryTokenBucketStore(max_keys=settings.RATE_LIMIT_MEMORY_STORE_MAX_KEYS)
+
+
+rate_limiter = RateLimiter(
+    store=create_token_bucket_store(),
+    guest_limit=TokenBucketLimit(
+        capacity=settings.RATE_LIMIT_GUEST_CAPACITY,
+        refill_per_second=settings.RATE_LIMIT_GUEST_REFILL_PER_SECOND,
+    ),
+    registered_limit=TokenBucketLimit(
+        capacity=settings.RATE_LIMIT_REGISTERED_CAPACITY,
+        refill_per_second=settings.RATE_LIMIT_REGISTERED_REFILL_PER_SECOND,
+    ),
+    resolution_costs=settings.RATE_LIMIT_RESOLUTION_COSTS,
+    trusted_proxy_count=settings.RATE_LIMIT_TRUSTED_PROXY_COUNT,
+    forwarded_client_secret=settings.RATE_LIMIT_FORWARDED_CLIENT_SECRET,
+    is_enabled=settings.RATE_LIMIT_ENABLED,
+)
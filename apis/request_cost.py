@@ -0,0 +1,175 @@
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Tuple
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+AUTH_PHASE = "auth"
+STORAGE_PHASE = "storage"
+SERIALIZATION_PHASE = "serialize"
+
+
+class RequestCost:
+    """
+    What handling one request cost: time per phase (auth, storage,
+    serialization), storage round trips by service and operation, bytes moved
+    to and from storage and resize tasks scheduled.
+
+    Serialization is only reported by routes that serialize their responses
+    with `serialization.dump_json_response`. Storage calls made from worker
+    threads report here too: `asyncio.to_thread` and Starlette's thread pool
+    copy the request's context. Phase durations of calls that ran
+    concurrently add up, so they can exceed the total.
+    """
+
+    def __init__(self) -> None:
+        self.started_at: float = time.perf_counter()
+        self.durations_ms: Dict[str, float] = defaultdict(float)
+        self.storage_round_trips: Counter[Tuple[str, str]] = Counter()
+        self.storage_bytes: Counter[str] = Counter()
+        self.resize_tasks: int = 0
+        self._lock = threading.Lock()
+
+    @property
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self.started_at) * 1000
+
+    def add_duration(self, phase: str, duration_ms: float) -> None:
+        with self._lock:
+            self.durations_ms[phase] += duration_ms
+
+    def add_storage_round_trip(
+        self, service: str, operation: str, duration_ms: float
+    ) -> None:
+        with self._lock:
+            self.storage_round_trips[(service, operation)] += 1
+            self.durations_ms[STORAGE_PHASE] += duration_ms
+
+    def add_storage_bytes(self, direction: str, amount: int) -> None:
+        with self._lock:
+            self.storage_bytes[direction] += amount
+
+    def add_resize_tasks(self, count: int) -> None:
+        with self._lock:
+            self.resize_tasks += count
+
+    def get_storage_round_trips_by_service(self) -> Dict[str, int]:
+        round_trips: Dict[str, int] = defaultdict(int)
+        for (service, _), count in self.storage_round_trips.items():
+            round_trips[service] += count
+        return dict(round_trips)
+
+    def to_server_timing(self) -> str:
+        """
+        The `Server-Timing` header value, e.g. `auth;dur=1.2, storage;dur=35.0;
+        desc="blob=2 table=1", serialize;dur=0.3, total;dur=41.7`.
+        """
+        round_trips: str = " ".join(
+            f"{service}={count}"
+            for service, count in sorted(
+                self.get_storage_round_trips_by_service().items()
+            )
+        )
+        metrics = [
+            f"{AUTH_PHASE};dur={self.durations_ms[AUTH_PHASE]:.1f}",
+            f"{STORAGE_PHASE};dur={self.durations_ms[STORAGE_PHASE]:.1f}"
+            + (f';desc="{round_trips}"' if round_trips else ""),
+        ]
+        if SERIALIZATION_PHASE in self.durations_ms:
+            metrics.append(
+                f"{SERIALIZATION_PHASE};dur={self.durations_ms[SERIALIZATION_PHASE]:.1f}"
+            )
+        if self.storage_bytes:
+            metrics.append(
+                'bytes;desc="'
+                + " ".join(
+                    f"{direction}={amount}"
+                    for direction, amount in sorted(self.storage_bytes.items())
+                )
+                + '"'
+            )
+        if self.resize_tasks:
+            metrics.append(f'resize;desc="tasks={self.resize_tasks}"')
+        metrics.append(f"total;dur={self.total_ms:.1f}")
+        return ", ".join(metrics)
+
+    def to_span_attributes(self) -> Dict[str, Any]:
+        attributes: Dict[str, Any] = {
+            f"request_cost.{phase}_ms": round(duration_ms, 3)
+            for phase, duration_ms in self.durations_ms.items()
+        }
+        attributes["request_cost.storage_round_trips"] = sum(
+            self.storage_round_trips.values()
+        )
+        for (service, operation), count in self.storage_round_trips.items():
+            attributes[f"request_cost.storage_round_trips.{service}.{operation}"] = (
+                count
+            )
+        for direction, amount in self.storage_bytes.items():
+            attributes[f"request_cost.storage_bytes.{direction}"] = amount
+        attributes["request_cost.resize_tasks"] = self.resize_tasks
+        return attributes
+
+
+_current_request_cost: ContextVar[RequestCost | None] = ContextVar(
+    "request_cost", default=None
+)
+
+
+def get_request_cost() -> RequestCost | None:
+    return _current_request_cost.get()
+
+
+@contextmanager
+def track_request_cost() -> Iterator[RequestCost]:
+    """
+    Make a new `RequestCost` the one everything called within reports into.
+    """
+    request_cost = RequestCost()
+    token = _current_request_cost.set(request_cost)
+    try:
+        yield request_cost
+    finally:
+        _current_request_cost.reset(token)
+
+
+# The functions below report into the current request's cost and do nothing
+# outside of a request, e.g. in the batch resize pool. Background tasks run
+# after the response and report into a cost that was already recorded.
+
+
+@contextmanager
+def measure_request_phase(phase: str) -> Iterator[None]:
+    started_at: float = time.perf_counter()
+    try:
+        yield
+    finally:
+        request_cost: RequestCost | None = _current_request_cost.get()
+        if request_cost is not None:
+            request_cost.add_duration(
+                phase=phase, duration_ms=(time.perf_counter() - started_at) * 1000
+            )
+
+
+def record_storage_round_trip(service: str, operation: str, duration_ms: float) -> None:
+    request_cost: RequestCost | None = _current_request_cost.get()
+    if request_cost is not None:
+        request_cost.add_storage_round_trip(
+            service=service, operation=operation, duration_ms=duration_ms
+        )
+
+
+def record_storage_bytes(direction: str, amount: int) -> None:
+    request_cost: RequestCost | None = _current_request_cost.get()
+    if request_cost is not None:
+        request_cost.add_storage_bytes(direction=direction, amount=amount)
+
+
+def record_resize_tasks(count: int) -> None:
+    request_cost: RequestCost | None = _current_request_cost.get()
+    if request_cost is not None:
+        request_cost.add_resize_tasks(count=count)
@@ -1,38 +1,100 @@
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 from typing import AsyncGenerator, Annotated, List
-from uuid import uuid4
 
-from pydantic import BaseModel, computed_field
+from pydantic import BaseModel, TypeAdapter
 
 from factories.AzureTableClientFactory.client import AzureTableClientFactory
-from factories.AzureTableClientFactory.models import (
-    AzureTableClientFactoryConfig,
-    ShortUrlTableEntity,
-)
+from factories.AzureTableClientFactory.models import ShortUrlTableEntity
 from url_shortener.models import ShortUrlCommonResponse
-from auth import azure_scheme, decode_jwt_token
-from fastapi import FastAPI, HTTPException, Request, Security, Body, BackgroundTasks
+from admin.router import admin_router
+from clients import get_azure_table_client, get_storage_account_client
+from auth import (
+    Principal,
+    authenticate_request,
+    get_principal,
+    require_admin_api_key,
+    require_registered_principal,
+)
+from fastapi import (
+    FastAPI,
+    HTTPException,
+    Request,
+    Response,
+    Security,
+    Body,
+    Header,
+)
+from event_loop_monitor import event_loop_monitor
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi_azure_auth.user import Claims
+from fastapi.responses import JSONResponse
+from health.readiness import readiness_monitor
 from health.router import health_router
-from photos.router import determine_storage_account_config, photos_router
+from idempotency import IdempotencyStore
+from photos.guest_container_pool import guest_container_pool
+from photos.metadata import resize_executor, resize_image_and_record_metadata
+from photos.router import (
+    determine_storage_account_config,
+    photos_router,
+    probe_original_image,
+)
+from profiling import (
+    PROFILE_ID_HEADER,
+    PROFILE_REQUEST_HEADER,
+    RequestProfile,
+    is_profile_request_token_valid,
+    is_request_profiler_busy,
+)
+from rate_limiting import rate_limiter
+from request_cost import (
+    AUTH_PHASE,
+    measure_request_phase,
+    record_resize_tasks,
+    track_request_cost,
+)
 from photos.models import ImageResizeResponse, PresignedUrlResponse, ImageResizeRequest
 from factories.AzureStorageAccountClientFactory.client import (
     AzureStorageAccountClientFactory,
-    AzureNamedKeyCredential,
     Resolutions,
 )
+from factories.AzureStorageAccountClientFactory.models import (
+    AzureStorageAccountClientConfig,
+    ImageProbe,
+)
+from serialization import dump_json_response
 from settings import settings
-from starlette.datastructures import MutableHeaders
 from telemetry import initialize_telemetry, metrics_wrapper
+from opentelemetry import trace
 from url_shortener.router import generate_short_id, url_shortener_router
+from warmup import warm_up
 
 logger: logging.Logger = logging.getLogger(__name__)
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
+    """
+    Start the event loop monitor, the readiness checks and the guest container
+    provisioner, and warm up the replica on startup. Uvicorn only starts
+    serving requests once this completes. On shutdown, wait for running
+    resizes.
+    """
+    await event_loop_monitor.start()
+    await readiness_monitor.start()
+    await guest_container_pool.start()
+    await warm_up(app=app, timeout_seconds=settings.WARMUP_TIMEOUT_SECONDS)
+    yield
+    # Let running resizes finish, but drop the ones still queued.
+    await asyncio.to_thread(resize_executor.shutdown, wait=True, cancel_futures=True)
+    await guest_container_pool.stop()
+    await readiness_monitor.stop()
+    await event_loop_monitor.stop()
+
+
 logger.info("Creating FastAPI app instance")
 app = FastAPI(
+    lifespan=lifespan,
     docs_url="/docs",
     version="1.0.0",
     title="Image App API",
@@ -52,6 +114,7 @@ app = FastAPI(
         {"name": "Guest Access", "description": "Operations for guest users"},
         {"name": "Presigned URLs", "description": "Operations for presigned URLs"},
         {"name": "Image Processing", "description": "Operations for image processing"},
+        {"name": "Admin", "description": "Operational controls for this replica"},
     ],
 )
 
@@ -68,51 +131,71 @@ app.add_middleware(
 initialize_telemetry(app=app)
 
 
-@asynccontextmanager
-async def lifespan(azure_scheme: FastAPI) -> AsyncGenerator[None, None]:
-    """
-    Load OpenID config on startup.
-    """
-    await azure_scheme.openid_config.load_config()
-    yield
-
-
 @app.middleware(middleware_type="http")
-async def add_claims_header(request: Request, call_next):
-    new_header = MutableHeaders(headers=request.headers)
-    if "Authorization" in request.headers:
-        claims = Claims(
-            **decode_jwt_token(
-                token=request.headers["Authorization"],
-                jwks_url=settings.JWKS_URL,
-                audience=settings.APP_CLIENT_ID,
-            )
+async def authenticate(request: Request, call_next):
+    try:
+        with measure_request_phase(phase=AUTH_PHASE):
+            principal: Principal = await authenticate_request(request=request)
+    except HTTPException as e:
+        return JSONResponse(
+            status_code=e.status_code, content={"detail": e.detail}, headers=e.headers
         )
 
-        new_header["X-User-Claims"] = claims.model_dump_json(
-            exclude_none=True, exclude_unset=True
-        )
-        new_header["X-User-Is-Guest"] = str(False)
-        new_header["X-User-Oid"] = claims.oid
-        metrics_wrapper.increment_user_type(user_type="Registered")
-    else:
-        new_header["X-User-Is-Guest"] = str(True)
-        new_header["X-User-Oid"] = str(uuid4())
+    if principal.is_guest:
         metrics_wrapper.increment_user_type(user_type="Guest")
+    else:
+        metrics_wrapper.increment_user_type(user_type="Registered")
 
-    request._headers = new_header
-    request.scope.update(headers=request.headers.raw)
     response = await call_next(request)
     return response
 
 
+@app.middleware(middleware_type="http")
+async def account_request_cost(request: Request, call_next):
+    with track_request_cost() as request_cost:
+        response = await call_next(request)
+
+    # The route is only known once routing has run; requests rejected before
+    # (e.g. by authentication) are grouped together.
+    route = request.scope.get("route")
+    metrics_wrapper.record_request_cost(
+        method=request.method,
+        route=route.path if route is not None else "unmatched",
+        request_cost=request_cost,
+    )
+    trace.get_current_span().set_attributes(request_cost.to_span_attributes())
+    if settings.REQUEST_COST_SERVER_TIMING_ENABLED:
+        response.headers["Server-Timing"] = request_cost.to_server_timing()
+    return response
+
+
+if settings.ADMIN_API_KEY is not None:
+    # Only added when request profiling can be enabled, so it costs nothing
+    # otherwise.
+    @app.middleware(middleware_type="http")
+    async def profile_request(request: Request, call_next):
+        token: str | None = request.headers.get(PROFILE_REQUEST_HEADER)
+        if token is None or not is_profile_request_token_valid(token=token):
+            return await call_next(request)
+        if is_request_profiler_busy():
+            logger.warning("Too many requests are being profiled, not profiling")
+            return await call_next(request)
+
+        async with RequestProfile(
+            description=f"{request.method} {request.url.path}"
+        ) as profile:
+            response = await call_next(request)
+        response.headers[PROFILE_ID_HEADER] = profile.profile_id
+        return response
+
+
 app.include_router(
     router=url_shortener_router, tags=["Image Sharing API", "URL Shortener"]
 )
 app.include_router(
     router=photos_router,
     tags=["Image Sharing API", "Photos", "Registered User"],
-    dependencies=[Security(dependency=azure_scheme)],
+    dependencies=[Security(dependency=require_registered_principal)],
 )
 app.include_router(
     router=photos_router,
@@ -122,32 +205,87 @@ app.include_router(
 app.include_router(
     router=health_router, tags=["Image Sharing API", "Health Check"], prefix="/health"
 )
+app.include_router(
+    router=admin_router,
+    tags=["Admin"],
+    prefix="/admin",
+    dependencies=[Security(dependency=require_admin_api_key)],
+)
 
 
-class OrchestratorResponse(BaseModel):
-    image_resize_responses: List[ImageResizeResponse]
-    short_url_responses: List[ShortUrlCommonResponse]
+class OrchestratedImage(BaseModel):
+    image_resize_response: ImageResizeResponse
+    short_url_response: ShortUrlCommonResponse
 
-    @computed_field
-    @property
-    def mapped_items(self) -> List[dict]:
-        return [
-            {
-                "image_resize_response": image_resize_response,
-                "short_url_response": short_url_response,
-            }
-            for image_resize_response, short_url_response in zip(
-                self.image_resize_responses, self.short_url_responses
-            )
-        ]
 
+orchestrate_response_adapter: TypeAdapter[List[OrchestratedImage]] = TypeAdapter(
+    List[OrchestratedImage]
+)
 
-@app.post(path="/orchestrate", tags=["Image Sharing API", "Image Processing"])
+
+orchestrate_idempotency_store: IdempotencyStore[List[OrchestratedImage]] = (
+    IdempotencyStore(
+        ttl_seconds=settings.ORCHESTRATE_IDEMPOTENCY_TTL_SECONDS,
+        max_entries=settings.ORCHESTRATE_IDEMPOTENCY_MAX_ENTRIES,
+    )
+)
+
+
+@app.post(
+    path="/orchestrate",
+    tags=["Image Sharing API", "Image Processing"],
+    response_model=List[OrchestratedImage],
+)
 async def orchestrate(
     request_body: Annotated[PresignedUrlResponse, Body],
     request: Request,
-    background_task: BackgroundTasks,
-):
+    idempotency_key: Annotated[
+        str | None,
+        Header(
+            description="Repeat calls with the same key and blob return the first response without resizing again"
+        ),
+    ] = None,
+) -> Response:
+    principal: Principal = get_principal(request=request)
+    client_config = determine_storage_account_config(principal=principal)
+
+    # Keyed on the blob, so retries and double submits of the same upload are
+    # deduplicated even without an Idempotency-Key header.
+    orchestrated_images, is_replayed = await orchestrate_idempotency_store.run(
+        key=(
+            client_config.name,
+            str(request_body.container_id),
+            str(request_body.folder_name),
+            request_body.blob_name,
+            idempotency_key,
+        ),
+        operation=lambda: orchestrate_image(
+            request_body=request_body,
+            request=request,
+            principal=principal,
+            client_config=client_config,
+        ),
+    )
+    return dump_json_response(
+        adapter=orchestrate_response_adapter,
+        content=orchestrated_images,
+        headers={"Idempotent-Replayed": "true"} if is_replayed else None,
+    )
+
+
+async def orchestrate_image(
+    request_body: PresignedUrlResponse,
+    request: Request,
+    principal: Principal,
+    client_config: AzureStorageAccountClientConfig,
+) -> List[OrchestratedImage]:
+    # Charged here rather than as a dependency so replayed calls are free.
+    await rate_limiter.check(
+        request=request,
+        principal=principal,
+        cost=rate_limiter.get_resize_cost(resolutions=Resolutions),
+    )
+
     image_resize_requests: list[ImageResizeRequest] = [
         ImageResizeRequest(
             name=request_body.blob_name,
@@ -158,19 +296,35 @@ async def orchestrate(
         for resolution in Resolutions
     ]
 
-    client_config = determine_storage_account_config(request.headers)
-    client = AzureStorageAccountClientFactory(
-        account_name=client_config.name, account_key=client_config.key
+    client: AzureStorageAccountClientFactory = get_storage_account_client(
+        config=client_config
+    )
+    probe: ImageProbe = await probe_original_image(
+        client=client,
+        container_name=request_body.container_id,
+        folder_name=request_body.folder_name,
+        blob_name=request_body.blob_name,
     )
 
-    for resize_command in image_resize_requests:
-        background_task.add_task(
-            client.resize_image,
-            container_name=resize_command.container_name,
-            folder_name=resize_command.folder_name,
-            blob_name=resize_command.name,
-            resolution=resize_command.resolution,
-        )
+    azure_table_client: AzureTableClientFactory = get_azure_table_client()
+
+    # One task for every resolution, so the original is downloaded and
+    # decoded once.
+    resize_executor.submit(
+        metrics_wrapper.track_background_task_queue_wait(
+            task_name="resize_image", func=resize_image_and_record_metadata
+        ),
+        client=client,
+        table_client=azure_table_client,
+        container_name=request_body.container_id,
+        folder_name=request_body.folder_name,
+        blob_name=request_body.blob_name,
+        resolutions=[
+            resize_request.resolution for resize_request in image_resize_requests
+        ],
+        probe=probe,
+    )
+    record_resize_tasks(count=1)
 
     file_extension: str = request_body.blob_name.split(".")[-1]
 
@@ -184,18 +338,7 @@ async def orchestrate(
         for resize_request in image_resize_requests
     ]
 
-    azure_table_client = AzureTableClientFactory(
-        config=AzureTableClientFactoryConfig(
-            storage_account_table_endpoint=settings.AZURE_TABLE_STORAGE_ACCOUNT_URL,
-            table_name=settings.AZURE_STORAGE_ACCOUNT_TABLE_NAME,
-            credentials=AzureNamedKeyCredential(
-                name=settings.AZURE_TABLE_STORAGE_ACCOUNT_NAME,
-                key=settings.AZURE_STORAGE_ACCOUNT_TABLE_KEY,
-            ),
-        )
-    )
-
-    short_url_responses: List[ShortUrlCommonResponse] = []
+    orchestrated_images: List[OrchestratedImage] = []
     for image_resize_response in image_resize_responses:
         short_id: str = generate_short_id(url=image_resize_response.url)
         entity = ShortUrlTableEntity(
@@ -203,23 +346,22 @@ async def orchestrate(
         )
 
         try:
-            azure_table_client.insert_entity(entity=entity)
+            await asyncio.to_thread(azure_table_client.insert_entity, entity=entity)
 
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
         short_url = f"{settings.HTTP_PROTOCOL}{settings.DNS_TO_USE}/s/{short_id}"
-        response = ShortUrlCommonResponse(
-            short_id=short_id,
-            short_url=short_url,
-            original_url=image_resize_response.url,
-            should_redirect=False,
+        orchestrated_images.append(
+            OrchestratedImage(
+                image_resize_response=image_resize_response,
+                short_url_response=ShortUrlCommonResponse(
+                    short_id=short_id,
+                    short_url=short_url,
+                    original_url=str(image_resize_response.url),
+                    should_redirect=False,
+                ),
+            )
         )
 
-        short_url_responses.append(response)
-
-    return OrchestratorResponse(
-        image_resize_responses=image_resize_responses,
-        short_url_responses=short_url_responses,
-        presigned_url_response=request_body,
-    ).mapped_items
+    return orchestrated_images
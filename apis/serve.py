@@ -0,0 +1,94 @@
+"""
+Production entrypoint: serves `router:app` with pre-forked uvicorn workers.
+
+The worker count defaults to the CPU quota of the container (cgroup v2
+`cpu.max`, or the cgroup v1 CFS quota), falling back to the CPUs this process
+may run on. Each worker runs the lifespan, so every worker warms up before it
+accepts requests, and is replaced by the supervisor once it has served
+`SERVER_WORKER_MAX_REQUESTS` requests.
+
+    python serve.py [--workers N] [--port PORT]
+"""
+
+import argparse
+import logging
+import math
+import os
+from pathlib import Path
+
+import uvicorn
+from settings import settings
+from uvicorn.supervisors import Multiprocess
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+_CGROUP_V2_CPU_MAX = Path("/sys/fs/cgroup/cpu.max")
+_CGROUP_V1_CPU_QUOTA = Path("/sys/fs/cgroup/cpu/cpu.cfs_quota_us")
+_CGROUP_V1_CPU_PERIOD = Path("/sys/fs/cgroup/cpu/cpu.cfs_period_us")
+
+
+def get_cgroup_cpu_limit() -> float | None:
+    try:
+        if _CGROUP_V2_CPU_MAX.exists():
+            quota, period = _CGROUP_V2_CPU_MAX.read_text().split()
+            if quota == "max":
+                return None
+            return int(quota) / int(period)
+
+        if _CGROUP_V1_CPU_QUOTA.exists() and _CGROUP_V1_CPU_PERIOD.exists():
+            quota = int(_CGROUP_V1_CPU_QUOTA.read_text())
+            if quota <= 0:
+                return None
+            return quota / int(_CGROUP_V1_CPU_PERIOD.read_text())
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read the cgroup CPU limit: {e}")
+
+    return None
+
+
+def get_available_cpu_count() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def get_default_worker_count() -> int:
+    """
+    One worker per CPU of the container quota, rounded up so a fractional
+    quota still gets a worker, and never more than the CPUs available.
+    """
+    available_cpu_count: int = get_available_cpu_count()
+    cpu_limit: float | None = get_cgroup_cpu_limit()
+    if cpu_limit is None:
+        return available_cpu_count
+    return max(1, min(available_cpu_count, math.ceil(cpu_limit)))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default=settings.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=settings.SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=settings.SERVER_WORKERS)
+    args = parser.parse_args()
+
+    workers: int = args.workers or get_default_worker_count()
+    logging.basicConfig(level=logging.INFO)
+    logger.info(f"Starting {workers} worker(s) on {args.host}:{args.port}")
+
+    config = uvicorn.Config(
+        "router:app",
+        host=args.host,
+        port=args.port,
+        workers=workers,
+        limit_max_requests=settings.SERVER_WORKER_MAX_REQUESTS,
+        limit_max_requests_jitter=settings.SERVER_WORKER_MAX_REQUESTS_JITTER,
+        timeout_graceful_shutdown=settings.SERVER_GRACEFUL_SHUTDOWN_SECONDS,
+    )
+    # `uvicorn.run` only supervises workers when there are at least two of
+    # them; a recycled single worker would otherwise stop the container.
+    Multiprocess(config=config, sockets=[config.bind_socket()]).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List, Literal
 
 from pydantic import HttpUrl, computed_field
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -56,6 +56,133 @@ class Settings(BaseSettings):
 
     OTEL_EXPORTER_OTLP_ENDPOINT: str
 
+    # Startup settings
+    WARMUP_TIMEOUT_SECONDS: float = 20
+
+    # Serving settings. The worker count defaults to the container's CPU quota.
+    SERVER_HOST: str = "0.0.0.0"
+    SERVER_PORT: int = 8000
+    SERVER_WORKERS: int | None = None
+    # Workers are recycled after this many requests (plus a random jitter so
+    # they do not all restart at once) to bound Pillow's memory fragmentation.
+    SERVER_WORKER_MAX_REQUESTS: int | None = 5000
+    SERVER_WORKER_MAX_REQUESTS_JITTER: int = 500
+    SERVER_GRACEFUL_SHUTDOWN_SECONDS: int = 30
+
+    # Event loop monitoring settings. Capturing the stacks of blocking calls
+    # is meant for debugging; it adds a watchdog thread.
+    EVENT_LOOP_MONITOR_INTERVAL_SECONDS: float = 0.25
+    EVENT_LOOP_BLOCKING_THRESHOLD_SECONDS: float = 0.1
+    EVENT_LOOP_CAPTURE_BLOCKING_STACKS: bool = False
+
+    # Readiness probe settings
+    READINESS_CHECK_INTERVAL_SECONDS: float = 30
+    READINESS_CHECK_TIMEOUT_SECONDS: float = 10
+
+    # Trace sampling and export settings
+    TRACE_SAMPLING_RATIO: float = 1.0
+    TRACE_SAMPLING_ROUTE_RATIOS: Dict[str, float] = {"/health/": 0.0, "/s/": 0.05}
+    TRACE_SAMPLING_KEEP_ERRORS: bool = True
+    TRACE_SAMPLING_SLOW_THRESHOLD_MS: float | None = 1000
+    TRACE_EXPORT_MAX_QUEUE_SIZE: int = 2048
+    TRACE_EXPORT_MAX_BATCH_SIZE: int = 512
+    TRACE_EXPORT_SCHEDULE_DELAY_MILLIS: int = 5000
+
+    # Request cost accounting settings. The time each request spent in auth,
+    # storage and serialization and its storage round trips are always
+    # recorded as metrics and span attributes; this also returns them to
+    # clients in a Server-Timing header.
+    REQUEST_COST_SERVER_TIMING_ENABLED: bool = True
+
+    # Admin API settings. The admin endpoints are disabled when no key is set.
+    ADMIN_API_KEY: str | None = None
+
+    # Profiler settings. Requests are only profiled when they carry an
+    # X-Profile-Request header signed with the admin API key.
+    PROFILER_SAMPLING_INTERVAL_SECONDS: float = 0.01
+    PROFILER_MAX_DURATION_SECONDS: float = 60
+    PROFILE_REQUEST_TOKEN_MAX_TTL_SECONDS: int = 3600
+    REQUEST_PROFILE_TTL_SECONDS: float = 600
+    REQUEST_PROFILE_MAX_ENTRIES: int = 100
+    # Each profiled request runs its own sampler thread; requests beyond this
+    # many at once are served without being profiled.
+    REQUEST_PROFILE_MAX_CONCURRENT: int = 2
+
+    # Logging settings
+    LOG_QUEUE_SIZE: int = 10000
+    LOG_BATCH_SIZE: int = 256
+    # Fraction of INFO and DEBUG records kept per logger name, e.g.
+    # {"url_shortener.router": 0.1}. WARNING and above are always kept.
+    LOG_SAMPLING_RATES: Dict[str, float] = {}
+
+    # Guest container pool settings. Guest uploads go into this many shared
+    # containers named <prefix>000, <prefix>001, ...
+    GUEST_CONTAINER_POOL_NAME_PREFIX: str = "guest-shard-"
+    GUEST_CONTAINER_POOL_SIZE: int = 16
+    GUEST_CONTAINER_POOL_PROVISION_INTERVAL_SECONDS: float = 300
+
+    # Rate limiting settings. Limits are token buckets in cost units: most
+    # routes cost 1 and resizes cost the sum of their resolution costs.
+    RATE_LIMIT_ENABLED: bool = True
+    # "memory" (per worker process) or "table" (shared through Table Storage)
+    RATE_LIMIT_STORE: Literal["memory", "table"] = "memory"
+    RATE_LIMIT_MEMORY_STORE_MAX_KEYS: int = 100000
+    RATE_LIMIT_TABLE_STORE_MAX_ATTEMPTS: int = 3
+    RATE_LIMIT_GUEST_CAPACITY: float = 30
+    RATE_LIMIT_GUEST_REFILL_PER_SECOND: float = 0.2
+    RATE_LIMIT_REGISTERED_CAPACITY: float = 120
+    RATE_LIMIT_REGISTERED_REFILL_PER_SECOND: float = 1
+    RATE_LIMIT_RESOLUTION_COSTS: Dict[str, float] = {
+        "720p": 1,
+        "1080p": 2,
+        "4k": 6,
+    }
+    # Proxies in front of the API that append to X-Forwarded-For (the
+    # Container Apps ingress); guests are limited by the address before them.
+    RATE_LIMIT_TRUSTED_PROXY_COUNT: int = 1
+    # Secret shared with the frontend. All of its guest traffic comes from its
+    # own address, so it forwards each visitor's address in a signed
+    # X-Forwarded-Client header; the header is ignored when this is not set.
+    RATE_LIMIT_FORWARDED_CLIENT_SECRET: str | None = None
+
+    # /orchestrate deduplication settings
+    ORCHESTRATE_IDEMPOTENCY_TTL_SECONDS: float = 600
+    ORCHESTRATE_IDEMPOTENCY_MAX_ENTRIES: int = 10000
+
+    # Resize settings. Large downscales are box-reduced to a few times the
+    # target first: "fast" to 1.5x then BILINEAR, "balanced" to 2x then
+    # BICUBIC, "quality" to 3x then LANCZOS (see benchmarks/resampling.py).
+    RESIZE_RESAMPLING_PROFILE: Literal["fast", "balanced", "quality"] = "balanced"
+    # Resizes wait while the decoded originals of running resizes (width x
+    # height x bands, known from the header probe) would exceed this budget.
+    RESIZE_MEMORY_BUDGET_BYTES: int = 1073741824
+    # Resizes run on a pool of this many threads per worker process, apart
+    # from the request thread pool.
+    RESIZE_MAX_WORKERS: int = 4
+    # Batch resizes: at most this many blob/resolution pairs per call
+    RESIZE_BATCH_MAX_ITEMS: int = 300
+
+    # Original image validation settings. Originals are probed by reading their
+    # header before they are resized; larger ones are rejected.
+    IMAGE_PROBE_INITIAL_BYTES: int = 4096
+    IMAGE_PROBE_MAX_BYTES: int = 262144
+    IMAGE_MAX_BYTES: int = 104857600
+    IMAGE_MAX_PIXELS: int = 100_000_000
+
+    # Rendition blob settings. Cache-Control for renditions, optionally per
+    # resolution, e.g. {"4k": "public, max-age=604800, immutable"}.
+    RENDITION_CACHE_CONTROL: str = "public, max-age=31536000, immutable"
+    RENDITION_CACHE_CONTROL_BY_RESOLUTION: Dict[str, str] = {}
+
+    # Folder listing settings
+    FOLDER_LISTING_CACHE_TTL_SECONDS: float = 10
+    FOLDER_LISTING_CACHE_MAX_ENTRIES: int = 1000
+    FOLDER_LISTING_MAX_PAGE_SIZE: int = 500
+
+    # Short URL analytics settings
+    SHORT_URL_TOP_K: int = 20
+    SHORT_URL_TRACKER_CAPACITY: int = 1000
+
     CUSTOM_DNS: str
     CONTAINER_APP_HOSTNAME: str
     ALLOWED_HOSTS: str
@@ -1,21 +1,59 @@
-import json
+import atexit
+import copy
+import functools
 import logging
-from datetime import datetime
-from typing import Any, Dict
+import os
+import random
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from queue import Empty, Full, Queue
+from threading import Thread
+from typing import Any, Callable, Dict, Iterable, Iterator, List
+from urllib.parse import urlsplit, urlunsplit
 
+import orjson
+from heavy_hitters import SpaceSavingCounter
 from opentelemetry import metrics, trace
-from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
-from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
 from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 from opentelemetry.instrumentation.httpx import HTTPXClientInstrumentor
 from opentelemetry.instrumentation.logging import LoggingInstrumentor
-from opentelemetry.metrics import Counter
+from opentelemetry.metrics import CallbackOptions, Counter, Histogram, Observation
+from opentelemetry.sdk import metrics as sdk_metrics
+from opentelemetry.sdk.environment_variables import (
+    OTEL_EXPORTER_OTLP_METRICS_DEFAULT_HISTOGRAM_AGGREGATION,
+    OTEL_EXPORTER_OTLP_METRICS_TEMPORALITY_PREFERENCE,
+)
 from opentelemetry.sdk.metrics import Meter, MeterProvider
-from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+from opentelemetry.sdk.metrics.export import (
+    AggregationTemporality,
+    MetricExporter,
+    MetricExportResult,
+    MetricsData,
+    PeriodicExportingMetricReader,
+)
+from opentelemetry.sdk.metrics.view import (
+    Aggregation,
+    ExplicitBucketHistogramAggregation,
+    ExponentialBucketHistogramAggregation,
+)
 from opentelemetry.sdk.resources import Resource
-from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
+from opentelemetry.sdk.trace import Tracer, TracerProvider
+from opentelemetry.sdk.trace.export import SpanExporter
+from opentelemetry.sdk.trace.sampling import ParentBased
+from request_cost import (
+    RequestCost,
+    record_storage_bytes,
+    record_storage_round_trip,
+)
 from settings import settings
+from trace_sampling import (
+    RouteRatioSampler,
+    TailSamplingSpanProcessor,
+    TraceExportConfig,
+    TraceSamplingConfig,
+)
 
 resource: Resource = Resource.create(
     attributes={
@@ -25,18 +63,154 @@ resource: Resource = Resource.create(
     }
 )
 
-trace.set_tracer_provider(tracer_provider=TracerProvider(resource=resource))
+trace_sampler = RouteRatioSampler(
+    config=TraceSamplingConfig(
+        ratio=settings.TRACE_SAMPLING_RATIO,
+        route_ratios=settings.TRACE_SAMPLING_ROUTE_RATIOS,
+        keep_errors=settings.TRACE_SAMPLING_KEEP_ERRORS,
+        slow_threshold_ms=settings.TRACE_SAMPLING_SLOW_THRESHOLD_MS,
+    )
+)
+
+trace.set_tracer_provider(
+    tracer_provider=TracerProvider(
+        resource=resource, sampler=ParentBased(root=trace_sampler)
+    )
+)
 tracer_provider: TracerProvider = trace.get_tracer_provider()
-otlp_trace_exporter = OTLPSpanExporter(
-    endpoint=settings.OTEL_EXPORTER_OTLP_ENDPOINT,
-    insecure=True,
+
+
+def create_otlp_trace_exporter() -> SpanExporter:
+    # Imported here so gRPC is only loaded when the span processor is created.
+    from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import (
+        OTLPSpanExporter,
+    )
+
+    return OTLPSpanExporter(
+        endpoint=settings.OTEL_EXPORTER_OTLP_ENDPOINT,
+        insecure=True,
+    )
+
+
+span_processor = TailSamplingSpanProcessor(
+    span_exporter_factory=create_otlp_trace_exporter,
+    sampling_config=trace_sampler.config,
+    export_config=TraceExportConfig(
+        max_queue_size=settings.TRACE_EXPORT_MAX_QUEUE_SIZE,
+        max_export_batch_size=settings.TRACE_EXPORT_MAX_BATCH_SIZE,
+        schedule_delay_millis=settings.TRACE_EXPORT_SCHEDULE_DELAY_MILLIS,
+    ),
 )
-span_processor = BatchSpanProcessor(span_exporter=otlp_trace_exporter)
 tracer_provider.add_span_processor(span_processor=span_processor)
 
-otlp_metrics_exporter = OTLPMetricExporter(
-    endpoint=settings.OTEL_EXPORTER_OTLP_ENDPOINT,
-    insecure=True,
+tracer: Tracer = tracer_provider.get_tracer("image-api")
+
+
+def create_otlp_metric_exporter() -> MetricExporter:
+    from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import (
+        OTLPMetricExporter,
+    )
+
+    return OTLPMetricExporter(
+        endpoint=settings.OTEL_EXPORTER_OTLP_ENDPOINT,
+        insecure=True,
+    )
+
+
+def get_otlp_preferred_temporality() -> Dict[type, AggregationTemporality]:
+    """
+    The temporality the OTLP metric exporter prefers per instrument, read from
+    the same environment variable it reads.
+    """
+    preference: str = (
+        os.environ.get(OTEL_EXPORTER_OTLP_METRICS_TEMPORALITY_PREFERENCE, "CUMULATIVE")
+        .upper()
+        .strip()
+    )
+    delta: List[type] = []
+    if preference == "DELTA":
+        delta = [
+            sdk_metrics.Counter,
+            sdk_metrics.Histogram,
+            sdk_metrics.ObservableCounter,
+        ]
+    elif preference == "LOWMEMORY":
+        delta = [sdk_metrics.Counter, sdk_metrics.Histogram]
+    return {
+        instrument: (
+            AggregationTemporality.DELTA
+            if instrument in delta
+            else AggregationTemporality.CUMULATIVE
+        )
+        for instrument in (
+            sdk_metrics.Counter,
+            sdk_metrics.UpDownCounter,
+            sdk_metrics.Histogram,
+            sdk_metrics.ObservableCounter,
+            sdk_metrics.ObservableUpDownCounter,
+            sdk_metrics.ObservableGauge,
+        )
+    }
+
+
+def get_otlp_preferred_aggregation() -> Dict[type, Aggregation]:
+    """
+    The histogram aggregation the OTLP metric exporter prefers, read from the
+    same environment variable it reads.
+    """
+    if (
+        os.environ.get(OTEL_EXPORTER_OTLP_METRICS_DEFAULT_HISTOGRAM_AGGREGATION)
+        == "base2_exponential_bucket_histogram"
+    ):
+        return {sdk_metrics.Histogram: ExponentialBucketHistogramAggregation()}
+    return {sdk_metrics.Histogram: ExplicitBucketHistogramAggregation()}
+
+
+class LazyMetricExporter(MetricExporter):
+    """
+    Creates the wrapped exporter on the first export, which happens on the
+    reader's thread one interval after startup, so loading gRPC is kept off
+    the import and startup path. The reader asks for the temporality and
+    aggregation before then, so they are passed in up front and must match
+    the wrapped exporter's.
+    """
+
+    def __init__(
+        self,
+        exporter_factory: Callable[[], MetricExporter],
+        preferred_temporality: Dict[type, AggregationTemporality] | None = None,
+        preferred_aggregation: Dict[type, Aggregation] | None = None,
+    ) -> None:
+        super().__init__(
+            preferred_temporality=preferred_temporality,
+            preferred_aggregation=preferred_aggregation,
+        )
+        self.exporter_factory: Callable[[], MetricExporter] = exporter_factory
+        self._exporter: MetricExporter | None = None
+
+    def export(
+        self, metrics_data: MetricsData, timeout_millis: float = 10_000, **kwargs
+    ) -> MetricExportResult:
+        if self._exporter is None:
+            self._exporter = self.exporter_factory()
+        return self._exporter.export(
+            metrics_data=metrics_data, timeout_millis=timeout_millis, **kwargs
+        )
+
+    def force_flush(self, timeout_millis: float = 10_000) -> bool:
+        if self._exporter is None:
+            return True
+        return self._exporter.force_flush(timeout_millis=timeout_millis)
+
+    def shutdown(self, timeout_millis: float = 30_000, **kwargs) -> None:
+        if self._exporter is not None:
+            self._exporter.shutdown(timeout_millis=timeout_millis, **kwargs)
+
+
+otlp_metrics_exporter = LazyMetricExporter(
+    exporter_factory=create_otlp_metric_exporter,
+    preferred_temporality=get_otlp_preferred_temporality(),
+    preferred_aggregation=get_otlp_preferred_aggregation(),
 )
 
 metric_reader = PeriodicExportingMetricReader(
@@ -54,6 +228,15 @@ def initialize_telemetry(app) -> None:
     HTTPXClientInstrumentor().instrument()
 
 
+def update_trace_sampling(
+    sampling_config: TraceSamplingConfig, export_config: TraceExportConfig
+) -> None:
+    trace_sampler.config = sampling_config
+    span_processor.sampling_config = sampling_config
+    if export_config != span_processor.export_config:
+        span_processor.reconfigure_export(export_config=export_config)
+
+
 class MetricsWrapper:
     def __init__(self, meter: Meter) -> None:
         self.user_type_counter: Counter = meter.create_counter(
@@ -81,10 +264,81 @@ class MetricsWrapper:
             description="Counts the number of requests made to the URL shortener",
             unit="count",
         )
+        self.rate_limited_request_counter: Counter = meter.create_counter(
+            name="rate_limited_request_counter",
+            description="Counts the number of requests rejected by the rate limiter",
+            unit="count",
+        )
+        self.image_probe_rejection_counter: Counter = meter.create_counter(
+            name="image_probe_rejection_counter",
+            description="Counts the original images rejected by the header probe",
+            unit="count",
+        )
 
-        self.most_common_short_urls_counter: Counter = meter.create_counter(
+        # Short URL popularity is tracked in-process and only the top-K links of
+        # each export interval are exported, keeping the series count bounded.
+        self.most_common_short_urls_tracker = SpaceSavingCounter(
+            capacity=settings.SHORT_URL_TRACKER_CAPACITY
+        )
+        meter.create_observable_gauge(
             name="most_common_short_urls",
-            description="Counts the number of times a short URL is accessed",
+            callbacks=[self._observe_most_common_short_urls],
+            description="Number of times each of the most accessed short URLs was accessed during the export interval",
+            unit="count",
+        )
+
+        self.image_pipeline_stage_duration_histogram: Histogram = (
+            meter.create_histogram(
+                name="image_pipeline_stage_duration",
+                description="Duration of each stage of the image resize pipeline",
+                unit="ms",
+            )
+        )
+        self.image_pipeline_bytes_downloaded_counter: Counter = meter.create_counter(
+            name="image_pipeline_bytes_downloaded",
+            description="Counts the bytes of original images downloaded for resizing",
+            unit="By",
+        )
+        self.image_pipeline_bytes_uploaded_counter: Counter = meter.create_counter(
+            name="image_pipeline_bytes_uploaded",
+            description="Counts the bytes of resized images uploaded",
+            unit="By",
+        )
+        self.background_task_queue_wait_histogram: Histogram = meter.create_histogram(
+            name="background_task_queue_wait",
+            description="Time between scheduling a background task and it starting",
+            unit="ms",
+        )
+        self.event_loop_lag_histogram: Histogram = meter.create_histogram(
+            name="event_loop_lag",
+            description="How much later than scheduled the event loop ran a sampling callback",
+            unit="ms",
+        )
+        self.storage_round_trip_duration_histogram: Histogram = meter.create_histogram(
+            name="storage_round_trip_duration",
+            description="Duration of round trips to Azure Blob and Table Storage",
+            unit="ms",
+        )
+
+        # What each request cost, per route, from the request's `RequestCost`.
+        self.request_phase_duration_histogram: Histogram = meter.create_histogram(
+            name="request_phase_duration",
+            description="Time each request spent authenticating, in storage round trips, serializing and in total",
+            unit="ms",
+        )
+        self.request_storage_round_trips_histogram: Histogram = meter.create_histogram(
+            name="request_storage_round_trips",
+            description="Number of Blob and Table Storage round trips made by each request",
+            unit="count",
+        )
+        self.request_storage_bytes_histogram: Histogram = meter.create_histogram(
+            name="request_storage_bytes",
+            description="Bytes each request downloaded from or uploaded to Blob Storage",
+            unit="By",
+        )
+        self.request_resize_tasks_histogram: Histogram = meter.create_histogram(
+            name="request_resize_tasks",
+            description="Number of resize tasks scheduled by each request",
             unit="count",
         )
 
@@ -107,43 +361,289 @@ class MetricsWrapper:
             amount=1, attributes={"request_type": request_type}
         )
 
+    def increment_rate_limited_request(self, user_type: str) -> None:
+        self.rate_limited_request_counter.add(
+            amount=1, attributes={"user_type": user_type}
+        )
+
+    def record_event_loop_lag(self, lag_ms: float) -> None:
+        self.event_loop_lag_histogram.record(amount=lag_ms)
+
+    def increment_image_probe_rejection(self, reason: str) -> None:
+        self.image_probe_rejection_counter.add(amount=1, attributes={"reason": reason})
+
     def increment_most_common_short_urls(
         self, short_id: str, original_url: str
     ) -> None:
-        self.most_common_short_urls_counter.add(
-            amount=1, attributes={"short_id": short_id, "original_url": original_url}
+        self.most_common_short_urls_tracker.add(
+            key=(short_id, _strip_query_string(url=str(original_url)))
+        )
+
+    def increment_image_pipeline_bytes_downloaded(self, amount: int) -> None:
+        self.image_pipeline_bytes_downloaded_counter.add(amount=amount)
+        record_storage_bytes(direction="downloaded", amount=amount)
+
+    def increment_image_pipeline_bytes_uploaded(self, amount: int) -> None:
+        self.image_pipeline_bytes_uploaded_counter.add(amount=amount)
+        record_storage_bytes(direction="uploaded", amount=amount)
+
+    @contextmanager
+    def measure_image_pipeline_stage(
+        self,
+        stage: str,
+        resolution: str,
+        durations_ms: Dict[str, float] | None = None,
+    ) -> Iterator:
+        attributes: Dict[str, str] = {"stage": stage, "resolution": resolution}
+        started_at: float = time.perf_counter()
+        with tracer.start_as_current_span(name=f"resize_image.{stage}") as span:
+            span.set_attributes(attributes)
+            try:
+                yield span
+            finally:
+                duration_ms: float = (time.perf_counter() - started_at) * 1000
+                self.image_pipeline_stage_duration_histogram.record(
+                    amount=duration_ms, attributes=attributes
+                )
+                if durations_ms is not None:
+                    durations_ms[stage] = duration_ms
+
+    @contextmanager
+    def measure_storage_round_trip(self, service: str, operation: str) -> Iterator:
+        started_at: float = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration_ms: float = (time.perf_counter() - started_at) * 1000
+            self.storage_round_trip_duration_histogram.record(
+                amount=duration_ms,
+                attributes={"service": service, "operation": operation},
+            )
+            record_storage_round_trip(
+                service=service, operation=operation, duration_ms=duration_ms
+            )
+
+    def record_request_cost(
+        self, method: str, route: str, request_cost: RequestCost
+    ) -> None:
+        attributes: Dict[str, str] = {"method": method, "route": route}
+        for phase, duration_ms in [
+            *request_cost.durations_ms.items(),
+            ("total", request_cost.total_ms),
+        ]:
+            self.request_phase_duration_histogram.record(
+                amount=duration_ms, attributes={**attributes, "phase": phase}
+            )
+        round_trips: Dict[str, int] = request_cost.get_storage_round_trips_by_service()
+        for service in ["blob", "table"]:
+            self.request_storage_round_trips_histogram.record(
+                amount=round_trips.get(service, 0),
+                attributes={**attributes, "service": service},
+            )
+        for direction, amount in request_cost.storage_bytes.items():
+            self.request_storage_bytes_histogram.record(
+                amount=amount, attributes={**attributes, "direction": direction}
+            )
+        if request_cost.resize_tasks:
+            self.request_resize_tasks_histogram.record(
+                amount=request_cost.resize_tasks, attributes=attributes
+            )
+
+    def track_background_task_queue_wait(
+        self, task_name: str, func: Callable
+    ) -> Callable:
+        """
+        Wrap a callable about to be handed to `BackgroundTasks` or an executor
+        so the time it spends waiting to start is recorded when it eventually
+        runs.
+        """
+        enqueued_at: float = time.perf_counter()
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            self.background_task_queue_wait_histogram.record(
+                amount=(time.perf_counter() - enqueued_at) * 1000,
+                attributes={"task": task_name},
+            )
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    def _observe_most_common_short_urls(
+        self, options: CallbackOptions
+    ) -> Iterable[Observation]:
+        top_short_urls = self.most_common_short_urls_tracker.drain(
+            n=settings.SHORT_URL_TOP_K
         )
+        for (short_id, original_url), count in top_short_urls:
+            yield Observation(
+                value=count,
+                attributes={"short_id": short_id, "original_url": original_url},
+            )
+
+
+def _strip_query_string(url: str) -> str:
+    return urlunsplit(urlsplit(url)._replace(query="", fragment=""))
+
+
+_exception_formatter = logging.Formatter()
 
 
 class JSONLogHandler(logging.Handler):
-    def __init__(self) -> None:
+    """
+    Serializes and writes log records on a background thread.
+
+    `emit` only applies per-logger sampling and puts the record on a bounded
+    queue; JSON encoding and batched writes to stdout happen on the writer
+    thread. Records are dropped and counted when the queue is full instead of
+    blocking the caller.
+    """
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        queue_size: int,
+        batch_size: int,
+        sampling_rates: Dict[str, float],
+    ) -> None:
         super().__init__()
+        self.batch_size: int = batch_size
+        self.sampling_rates: Dict[str, float] = sampling_rates
+        self.dropped_records: int = 0
+        self.sampled_out_records: int = 0
+        self._queue: Queue = Queue(maxsize=queue_size)
+        self._stream = sys.stdout.buffer
+        self._writer = Thread(
+            target=self._write_forever, name="log-writer", daemon=True
+        )
+        self._writer.start()
 
     def emit(self, record: logging.LogRecord) -> None:
+        if record.levelno < logging.WARNING and not self._is_sampled(record=record):
+            self.sampled_out_records += 1
+            return
+
         try:
-            log_entry: Dict[str, Any] = {
-                "timestamp": datetime.now().isoformat() + "Z",
-                "name": record.name,
-                "level": record.levelname,
-                "message": record.getMessage(),
-                "filename": record.pathname,
-                "function": record.funcName,
-                "line_number": record.lineno,
-            }
-
-            if hasattr(record, "trace_id") and hasattr(record, "span_id"):
-                log_entry.update(
-                    {"trace_id": record.trace_id, "span_id": record.span_id}
+            prepared_record: logging.LogRecord = self._prepare(record=record)
+        except Exception:
+            self.handleError(record)
+            return
+
+        try:
+            self._queue.put_nowait(prepared_record)
+        except Full:
+            self.dropped_records += 1
+
+    @staticmethod
+    def _prepare(record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Render the message and exception on the logging thread, as
+        `logging.handlers.QueueHandler.prepare` does: rendered on the writer
+        thread, they would show arguments as changed after the call.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+    def close(self) -> None:
+        if self._writer.is_alive():
+            self._queue.put(self._STOP)
+            self._writer.join(timeout=5)
+        super().close()
+
+    def observe_log_records(self, options: CallbackOptions) -> Iterable[Observation]:
+        yield Observation(
+            value=self.dropped_records, attributes={"reason": "queue_full"}
+        )
+        yield Observation(
+            value=self.sampled_out_records, attributes={"reason": "sampled_out"}
+        )
+
+    def _is_sampled(self, record: logging.LogRecord) -> bool:
+        sampling_rate: float | None = self.sampling_rates.get(record.name)
+        return sampling_rate is None or random.random() < sampling_rate
+
+    def _write_forever(self) -> None:
+        while True:
+            records: List[logging.LogRecord] = [self._queue.get()]
+            while len(records) < self.batch_size:
+                try:
+                    records.append(self._queue.get_nowait())
+                except Empty:
+                    break
+
+            is_stopping: bool = records[-1] is self._STOP
+            if is_stopping:
+                records.pop()
+
+            self._write(records=records)
+
+            if is_stopping:
+                return
+
+    def _write(self, records: List[logging.LogRecord]) -> None:
+        lines: List[bytes] = []
+        for record in records:
+            try:
+                lines.append(
+                    orjson.dumps(self._to_log_entry(record=record), default=str)
                 )
+            except Exception as e:
+                lines.append(orjson.dumps({"message": f"Failed to emit log: {e}"}))
+
+        if not lines:
+            return
+
+        try:
+            self._stream.write(b"\n".join(lines) + b"\n")
+            self._stream.flush()
+        except Exception:
+            self.dropped_records += len(lines)
 
-            print(json.dumps(log_entry))
-        except Exception as e:
-            print(f"Failed to emit log: {e}")
+    @staticmethod
+    def _to_log_entry(record: logging.LogRecord) -> Dict[str, Any]:
+        log_entry: Dict[str, Any] = {
+            "timestamp": datetime.fromtimestamp(record.created, tz=timezone.utc)
+            .replace(tzinfo=None)
+            .isoformat()
+            + "Z",
+            "name": record.name,
+            "level": record.levelname,
+            "message": record.getMessage(),
+            "filename": record.pathname,
+            "function": record.funcName,
+            "line_number": record.lineno,
+        }
+
+        if hasattr(record, "trace_id") and hasattr(record, "span_id"):
+            log_entry.update({"trace_id": record.trace_id, "span_id": record.span_id})
+
+        if record.exc_text:
+            log_entry["exception"] = record.exc_text
+
+        return log_entry
 
 
 # Create and configure the global JSON log handler
-json_handler = JSONLogHandler()
+json_handler = JSONLogHandler(
+    queue_size=settings.LOG_QUEUE_SIZE,
+    batch_size=settings.LOG_BATCH_SIZE,
+    sampling_rates=settings.LOG_SAMPLING_RATES,
+)
 json_handler.setLevel(level=logging.INFO)
+atexit.register(json_handler.close)
+
+meter.create_observable_counter(
+    name="log_records_not_written",
+    callbacks=[json_handler.observe_log_records],
+    description="Counts the log records dropped under back-pressure or sampled out",
+    unit="count",
+)
 
 logging.basicConfig(level=logging.INFO, handlers=[json_handler])
 metrics_wrapper = MetricsWrapper(meter=meter)
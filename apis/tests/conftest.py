@@ -0,0 +1,24 @@
+import os
+
+# The settings the application requires, for tests that import it. Nothing
+# here reaches Azure: tests replace the clients that would.
+for name, value in {
+    "AZURE_TABLE_STORAGE_ACCOUNT_NAME": "tables",
+    "AZURE_STORAGE_ACCOUNT_TABLE_NAME": "images",
+    "AZURE_STORAGE_ACCOUNT_TABLE_KEY": "dGVzdA==",
+    "AZURE_GUEST_STORAGE_ACCOUNT_NAME": "guest",
+    "AZURE_GUEST_STORAGE_ACCOUNT_KEY": "dGVzdA==",
+    "AZURE_REGISTERED_STORAGE_ACCOUNT_NAME": "registered",
+    "AZURE_REGISTERED_STORAGE_ACCOUNT_KEY": "dGVzdA==",
+    "TENANT_ID": "tenant",
+    "APP_CLIENT_ID": "app",
+    "OPEN_API_CLIENT_ID": "openapi",
+    "SCOPE": "api://app/user_impersonation",
+    "OTEL_EXPORTER_OTLP_ENDPOINT": "http://localhost:4317",
+    "CUSTOM_DNS": "localhost:8000",
+    "CONTAINER_APP_HOSTNAME": "localhost:8000",
+    "ALLOWED_HOSTS": "http://localhost:8501",
+    # No collector listens in tests; exporting to it would retry at exit
+    "OTEL_SDK_DISABLED": "true",
+}.items():
+    os.environ.setdefault(name, value)
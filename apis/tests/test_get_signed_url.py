@@ -0,0 +1,45 @@
+from io import BytesIO
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from factories.AzureStorageAccountClientFactory.probe import probe_image_header
+
+
+def create_jpeg() -> bytes:
+    buffer = BytesIO()
+    Image.new("RGB", (640, 480)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def test_frontend_upload_is_stored_under_its_own_extension(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    import photos.router as photos_router
+    from router import app
+
+    monkeypatch.setattr(
+        photos_router.guest_container_pool,
+        "get_container_name",
+        lambda: "guest-shard-000",
+    )
+
+    # The body the frontend's ImageHandler.get_presigned_url sends
+    response = TestClient(app).post(
+        "/guest/photos/get-signed-url", json={"name": "holiday.jpeg"}
+    )
+    assert response.status_code == 200
+    blob_name: str = response.json()["blob_name"]
+    assert blob_name == "original.jpeg"
+
+    image: bytes = create_jpeg()
+    probe = probe_image_header(
+        name=blob_name,
+        header=image,
+        blob_size=len(image),
+        max_bytes=len(image),
+        max_pixels=640 * 480,
+        is_final=True,
+    )
+    assert (probe.format, probe.width, probe.height) == ("JPEG", 640, 480)
@@ -0,0 +1,69 @@
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from factories.AzureStorageAccountClientFactory.probe import (
+    ImageProbeRejectedException,
+    get_blob_size,
+    probe_image_header,
+)
+
+_MAX_BYTES = 100 * 1024 * 1024
+_MAX_PIXELS = 100_000_000
+
+
+def create_jpeg_with_large_exif() -> bytes:
+    exif = Image.Exif()
+    exif[0x010E] = "x" * 20000  # ImageDescription, before the SOF marker
+    buffer = BytesIO()
+    Image.new("RGB", (4000, 3000)).save(buffer, format="JPEG", exif=exif)
+    return buffer.getvalue()
+
+
+def test_get_blob_size_reads_the_total_from_the_content_range() -> None:
+    assert (
+        get_blob_size(content_range="bytes 0-4095/123456", downloaded_size=4096)
+        == 123456
+    )
+    assert get_blob_size(content_range=None, downloaded_size=4096) == 4096
+
+
+def test_probe_reads_past_a_large_exif_block() -> None:
+    image: bytes = create_jpeg_with_large_exif()
+
+    probe = probe_image_header(
+        name="a.jpg",
+        header=image[:4096],
+        blob_size=len(image),
+        max_bytes=_MAX_BYTES,
+        max_pixels=_MAX_PIXELS,
+        is_final=False,
+    )
+    assert probe is None
+
+    probe = probe_image_header(
+        name="a.jpg",
+        header=image[:65536],
+        blob_size=len(image),
+        max_bytes=_MAX_BYTES,
+        max_pixels=_MAX_PIXELS,
+        is_final=False,
+    )
+    assert (probe.format, probe.width, probe.height) == ("JPEG", 4000, 3000)
+    assert probe.bytes == len(image)
+
+
+def test_probe_rejects_blobs_over_the_size_limit() -> None:
+    image: bytes = create_jpeg_with_large_exif()
+
+    with pytest.raises(ImageProbeRejectedException) as e:
+        probe_image_header(
+            name="a.jpg",
+            header=image[:4096],
+            blob_size=len(image),
+            max_bytes=len(image) - 1,
+            max_pixels=_MAX_PIXELS,
+            is_final=False,
+        )
+    assert e.value.reason == "too_large"
@@ -0,0 +1,106 @@
+import asyncio
+import time
+from typing import Dict
+from uuid import uuid4
+
+import pytest
+from fastapi import HTTPException, Request
+
+from auth import Principal
+from rate_limiting import (
+    FORWARDED_CLIENT_HEADER,
+    InMemoryTokenBucketStore,
+    RateLimiter,
+    TokenBucketLimit,
+)
+
+FRONTEND_ADDRESS = "10.0.0.5"
+
+
+def create_rate_limiter(forwarded_client_secret: str = "secret") -> RateLimiter:
+    return RateLimiter(
+        store=InMemoryTokenBucketStore(max_keys=100),
+        guest_limit=TokenBucketLimit(capacity=2, refill_per_second=0.001),
+        registered_limit=TokenBucketLimit(capacity=2, refill_per_second=0.001),
+        resolution_costs={},
+        trusted_proxy_count=1,
+        forwarded_client_secret=forwarded_client_secret,
+    )
+
+
+def create_request(headers: Dict[str, str]) -> Request:
+    # A request from the frontend, through the ingress
+    headers = {"X-Forwarded-For": FRONTEND_ADDRESS, **headers}
+    return Request(
+        {
+            "type": "http",
+            "headers": [
+                (name.lower().encode(), value.encode())
+                for name, value in headers.items()
+            ],
+            "client": ("10.0.0.1", 443),
+        }
+    )
+
+
+def sign(rate_limiter: RateLimiter, address: str, expires_at: int) -> str:
+    signature: str = rate_limiter._sign_forwarded_client(
+        expires_at=expires_at, address=address
+    )
+    return f"{expires_at}.{signature}.{address}"
+
+
+def charge(rate_limiter: RateLimiter, request: Request) -> None:
+    asyncio.run(
+        rate_limiter.check(
+            request=request, principal=Principal(oid=uuid4(), is_guest=True), cost=2
+        )
+    )
+
+
+def test_guests_forwarded_by_the_frontend_have_their_own_buckets() -> None:
+    rate_limiter = create_rate_limiter()
+    expires_at: int = int(time.time()) + 60
+
+    for address in ["203.0.113.1", "203.0.113.2"]:
+        request = create_request(
+            {FORWARDED_CLIENT_HEADER: sign(rate_limiter, address, expires_at)}
+        )
+        assert rate_limiter.get_client_address(request=request) == address
+        charge(rate_limiter=rate_limiter, request=request)
+
+    with pytest.raises(HTTPException) as error:
+        charge(
+            rate_limiter=rate_limiter,
+            request=create_request(
+                {FORWARDED_CLIENT_HEADER: sign(rate_limiter, "203.0.113.1", expires_at)}
+            ),
+        )
+    assert error.value.status_code == 429
+
+
+@pytest.mark.parametrize(
+    "header",
+    [
+        f"{int(time.time()) + 60}.{'0' * 64}.203.0.113.1",
+        "not-a-timestamp.signature.203.0.113.1",
+    ],
+)
+def test_unsigned_forwarded_client_is_ignored(header: str) -> None:
+    rate_limiter = create_rate_limiter()
+    request = create_request({FORWARDED_CLIENT_HEADER: header})
+    assert rate_limiter.get_client_address(request=request) == FRONTEND_ADDRESS
+
+
+def test_forwarded_client_is_ignored_without_a_secret() -> None:
+    rate_limiter = create_rate_limiter(forwarded_client_secret="")
+    header: str = sign(rate_limiter, "203.0.113.1", int(time.time()) + 60)
+    request = create_request({FORWARDED_CLIENT_HEADER: header})
+    assert rate_limiter.get_client_address(request=request) == FRONTEND_ADDRESS
+
+
+def test_expired_forwarded_client_is_ignored() -> None:
+    rate_limiter = create_rate_limiter()
+    header: str = sign(rate_limiter, "203.0.113.1", int(time.time()) - 1)
+    request = create_request({FORWARDED_CLIENT_HEADER: header})
+    assert rate_limiter.get_client_address(request=request) == FRONTEND_ADDRESS
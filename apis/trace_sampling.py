@@ -0,0 +1,248 @@
+from threading import Lock
+from typing import Annotated, Callable, Dict, Optional, Sequence
+
+from opentelemetry.context import Context
+from opentelemetry.sdk.trace import ReadableSpan, Span, SpanProcessor
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExporter
+from opentelemetry.sdk.trace.sampling import Decision, Sampler, SamplingResult
+from opentelemetry.trace import (
+    Link,
+    SpanContext,
+    SpanKind,
+    StatusCode,
+    TraceFlags,
+    TraceState,
+    get_current_span,
+)
+from opentelemetry.util.types import Attributes
+from pydantic import BaseModel, Field, model_validator
+
+_TRACE_ID_LIMIT = (1 << 64) - 1
+
+
+class TraceSamplingConfig(BaseModel):
+    ratio: Annotated[
+        float,
+        Field(
+            description="Fraction of root traces to sample when no route rule matches",
+            ge=0,
+            le=1,
+        ),
+    ] = 1.0
+    route_ratios: Annotated[
+        Dict[str, Annotated[float, Field(ge=0, le=1)]],
+        Field(
+            description="Sampling ratio per request path prefix. The longest matching prefix wins and a ratio of 0 drops the trace entirely, including errors."
+        ),
+    ] = {}
+    keep_errors: Annotated[
+        bool, Field(description="Export unsampled root spans that failed")
+    ] = True
+    slow_threshold_ms: Annotated[
+        float | None,
+        Field(description="Export unsampled root spans slower than this"),
+    ] = None
+
+    def ratio_for(self, path: str | None) -> float:
+        if path is None:
+            return self.ratio
+        matching_prefixes = [
+            prefix for prefix in self.route_ratios if path.startswith(prefix)
+        ]
+        if not matching_prefixes:
+            return self.ratio
+        return self.route_ratios[max(matching_prefixes, key=len)]
+
+
+class TraceExportConfig(BaseModel):
+    max_queue_size: Annotated[
+        int, Field(description="Maximum number of spans buffered for export", gt=0)
+    ] = 2048
+    max_export_batch_size: Annotated[
+        int, Field(description="Maximum number of spans per export call", gt=0)
+    ] = 512
+    schedule_delay_millis: Annotated[
+        int, Field(description="Delay between two consecutive exports", gt=0)
+    ] = 5000
+
+    @model_validator(mode="after")
+    def check_batch_fits_queue(self) -> "TraceExportConfig":
+        # BatchSpanProcessor refuses batches larger than its queue
+        if self.max_export_batch_size > self.max_queue_size:
+            raise ValueError("max_export_batch_size must not exceed max_queue_size")
+        return self
+
+
+class RouteRatioSampler(Sampler):
+    """
+    Samples root spans by trace ID ratio, with per-route ratios.
+
+    Root spans that lose the ratio draw are still recorded (but not sampled)
+    when errors or slow requests should be kept, so that
+    `TailSamplingSpanProcessor` can export them once their outcome is known.
+    Use it as the root of a `ParentBased` sampler so children of those spans
+    are not recorded at all.
+    """
+
+    def __init__(self, config: TraceSamplingConfig) -> None:
+        self.config: TraceSamplingConfig = config
+
+    def should_sample(
+        self,
+        parent_context: Optional[Context],
+        trace_id: int,
+        name: str,
+        kind: Optional[SpanKind] = None,
+        attributes: Attributes = None,
+        links: Optional[Sequence[Link]] = None,
+        trace_state: Optional[TraceState] = None,
+    ) -> SamplingResult:
+        config: TraceSamplingConfig = self.config
+        ratio: float = config.ratio_for(path=_get_path(attributes=attributes))
+
+        if ratio <= 0:
+            decision = Decision.DROP
+        elif trace_id & _TRACE_ID_LIMIT < ratio * (_TRACE_ID_LIMIT + 1):
+            decision = Decision.RECORD_AND_SAMPLE
+        elif config.keep_errors or config.slow_threshold_ms is not None:
+            decision = Decision.RECORD_ONLY
+        else:
+            decision = Decision.DROP
+
+        return SamplingResult(
+            decision=decision,
+            attributes=attributes if decision.is_recording() else None,
+            trace_state=get_current_span(parent_context).get_span_context().trace_state,
+        )
+
+    def get_description(self) -> str:
+        return f"RouteRatioSampler{{{self.config.model_dump_json()}}}"
+
+
+class TailSamplingSpanProcessor(SpanProcessor):
+    """
+    Forwards sampled spans to a `BatchSpanProcessor` and promotes recorded but
+    unsampled spans that ended with an error or exceeded the slow threshold.
+
+    The batch processor (and its exporter) is created on first use, keeping
+    exporter setup off the import path; the application creates it while it
+    warms up, before the first request records a span. It can be replaced at
+    runtime to apply new queue and batch sizes; the previous one is flushed and
+    shut down.
+    """
+
+    def __init__(
+        self,
+        span_exporter_factory: Callable[[], SpanExporter],
+        sampling_config: TraceSamplingConfig,
+        export_config: TraceExportConfig,
+    ) -> None:
+        self.span_exporter_factory: Callable[[], SpanExporter] = span_exporter_factory
+        self.sampling_config: TraceSamplingConfig = sampling_config
+        self.export_config: TraceExportConfig = export_config
+        self._span_processor: BatchSpanProcessor | None = None
+        self._lock = Lock()
+
+    @property
+    def span_processor(self) -> BatchSpanProcessor:
+        if self._span_processor is None:
+            with self._lock:
+                if self._span_processor is None:
+                    self._span_processor = self._create_span_processor(
+                        export_config=self.export_config
+                    )
+        return self._span_processor
+
+    def reconfigure_export(self, export_config: TraceExportConfig) -> None:
+        with self._lock:
+            previous_span_processor: BatchSpanProcessor | None = self._span_processor
+            self._span_processor = self._create_span_processor(
+                export_config=export_config
+            )
+            self.export_config = export_config
+
+        if previous_span_processor is not None:
+            previous_span_processor.shutdown()
+
+    def on_start(self, span: Span, parent_context: Optional[Context] = None) -> None:
+        self.span_processor.on_start(span=span, parent_context=parent_context)
+
+    def on_end(self, span: ReadableSpan) -> None:
+        if span.context.trace_flags.sampled:
+            self.span_processor.on_end(span=span)
+        elif self._should_keep(span=span):
+            self.span_processor.on_end(span=_as_sampled(span=span))
+
+    def shutdown(self) -> None:
+        if self._span_processor is not None:
+            self._span_processor.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        if self._span_processor is None:
+            return True
+        return self._span_processor.force_flush(timeout_millis=timeout_millis)
+
+    def _create_span_processor(
+        self, export_config: TraceExportConfig
+    ) -> BatchSpanProcessor:
+        return BatchSpanProcessor(
+            span_exporter=self.span_exporter_factory(),
+            max_queue_size=export_config.max_queue_size,
+            max_export_batch_size=export_config.max_export_batch_size,
+            schedule_delay_millis=export_config.schedule_delay_millis,
+        )
+
+    def _should_keep(self, span: ReadableSpan) -> bool:
+        config: TraceSamplingConfig = self.sampling_config
+
+        if config.keep_errors and _is_error(span=span):
+            return True
+
+        if config.slow_threshold_ms is None:
+            return False
+
+        duration_ms: float = (span.end_time - span.start_time) / 1e6
+        return duration_ms >= config.slow_threshold_ms
+
+
+def _get_path(attributes: Attributes) -> str | None:
+    if not attributes:
+        return None
+    path = attributes.get("url.path") or attributes.get("http.target")
+    if path is None:
+        return None
+    return str(path).split("?")[0]
+
+
+def _is_error(span: ReadableSpan) -> bool:
+    if span.status.status_code is StatusCode.ERROR:
+        return True
+    attributes = span.attributes or {}
+    status_code = attributes.get("http.response.status_code") or attributes.get(
+        "http.status_code"
+    )
+    return isinstance(status_code, int) and status_code >= 500
+
+
+def _as_sampled(span: ReadableSpan) -> ReadableSpan:
+    context: SpanContext = span.context
+    return ReadableSpan(
+        name=span.name,
+        context=SpanContext(
+            trace_id=context.trace_id,
+            span_id=context.span_id,
+            is_remote=context.is_remote,
+            trace_flags=TraceFlags(TraceFlags.SAMPLED),
+            trace_state=context.trace_state,
+        ),
+        parent=span.parent,
+        resource=span.resource,
+        attributes=span.attributes,
+        events=span.events,
+        links=span.links,
+        kind=span.kind,
+        status=span.status,
+        start_time=span.start_time,
+        end_time=span.end_time,
+        instrumentation_scope=span.instrumentation_scope,
+    )
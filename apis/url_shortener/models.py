@@ -1,12 +1,20 @@
 from typing import Annotated
 
-from pydantic import BaseModel, Field, HttpUrl
+from pydantic import BaseModel, Field
 
 
 class ShortUrlCommonResponse(BaseModel):
     short_id: Annotated[str, Field(description="The shortened URL.")]
-    short_url: Annotated[HttpUrl | None, Field(description="The shortened URL.")] = None
-    original_url: Annotated[HttpUrl, Field(description="The original URL.")]
+    # URLs are built or validated before they get here, so they are kept as
+    # the strings they are rather than parsed again.
+    short_url: Annotated[
+        str | None,
+        Field(description="The shortened URL.", json_schema_extra={"format": "uri"}),
+    ] = None
+    original_url: Annotated[
+        str,
+        Field(description="The original URL.", json_schema_extra={"format": "uri"}),
+    ]
     should_redirect: Annotated[
         bool, Field(description="Whether the URL should redirect.")
     ] = True
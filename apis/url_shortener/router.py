@@ -1,3 +1,4 @@
+import asyncio
 import base64
 import hashlib
 import logging
@@ -6,16 +7,17 @@ import urllib.parse
 
 from fastapi.responses import RedirectResponse
 
+from clients import get_azure_table_client
 from factories.AzureTableClientFactory.client import (
     AzureTableClientFactory,
 )
 from factories.AzureTableClientFactory.models import (
-    AzureNamedKeyCredential,
-    AzureTableClientFactoryConfig,
     QueryFilter,
     ShortUrlTableEntity,
 )
-from fastapi import APIRouter, HTTPException, Request
+from fastapi import APIRouter, HTTPException, Request, Response
+from pydantic import HttpUrl, TypeAdapter
+from serialization import dump_json_response
 from settings import settings
 from telemetry import metrics_wrapper
 
@@ -28,6 +30,10 @@ _PATH_PREFIX = f"/{_PREFIX}"
 
 url_shortener_router = APIRouter(prefix=_PATH_PREFIX)
 
+short_url_response_adapter: TypeAdapter[ShortUrlCommonResponse] = TypeAdapter(
+    ShortUrlCommonResponse
+)
+
 
 def generate_short_id(url: str) -> str:
     current_time = str(time.time())
@@ -39,38 +45,38 @@ def generate_short_id(url: str) -> str:
     return short_id.upper()
 
 
-@url_shortener_router.post(path="", summary="Create a new short URL")
-async def create_url(url: str, request: Request) -> ShortUrlCommonResponse:
-    logger.info(f"Creating short url for: {url}.")
+@url_shortener_router.post(
+    path="", summary="Create a new short URL", response_model=ShortUrlCommonResponse
+)
+async def create_url(url: HttpUrl, request: Request) -> Response:
+    # Validated here, once, and stored and returned as the normalized string
+    original_url: str = str(url)
+    logger.info(f"Creating short url for: {original_url}.")
     metrics_wrapper.increment_url_shortener_request(request_type="create")
-    azure_table_client = AzureTableClientFactory(
-        config=AzureTableClientFactoryConfig(
-            storage_account_table_endpoint=settings.AZURE_TABLE_STORAGE_ACCOUNT_URL,
-            table_name=settings.AZURE_STORAGE_ACCOUNT_TABLE_NAME,
-            credentials=AzureNamedKeyCredential(
-                name=settings.AZURE_TABLE_STORAGE_ACCOUNT_NAME,
-                key=settings.AZURE_STORAGE_ACCOUNT_TABLE_KEY,
-            ),
-        )
-    )
+    azure_table_client: AzureTableClientFactory = get_azure_table_client()
 
-    short_id: str = generate_short_id(url=url)
-    entity = ShortUrlTableEntity(PartitionKey=short_id, RowKey=short_id, url=url)
+    short_id: str = generate_short_id(url=original_url)
+    entity = ShortUrlTableEntity(
+        PartitionKey=short_id, RowKey=short_id, url=original_url
+    )
 
     try:
-        azure_table_client.insert_entity(entity=entity)
+        await asyncio.to_thread(azure_table_client.insert_entity, entity=entity)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
     short_url = f"{settings.HTTP_PROTOCOL}{settings.DNS_TO_USE}/{_PREFIX}/{short_id}"
     response = ShortUrlCommonResponse(
-        short_id=short_id, short_url=short_url, original_url=url, should_redirect=False
+        short_id=short_id,
+        short_url=short_url,
+        original_url=original_url,
+        should_redirect=False,
     )
 
     logger.info(f"Created short url: {short_url}")
 
-    return response
+    return dump_json_response(adapter=short_url_response_adapter, content=response)
 
 
 @url_shortener_router.get(
@@ -81,20 +87,11 @@ async def create_url(url: str, request: Request) -> ShortUrlCommonResponse:
 async def get_url(short_id: str, request: Request) -> RedirectResponse:
     logger.info(f"Getting URL for short id: {short_id}.")
     metrics_wrapper.increment_url_shortener_request(request_type="get")
-    azure_table_client = AzureTableClientFactory(
-        config=AzureTableClientFactoryConfig(
-            storage_account_table_endpoint=settings.AZURE_TABLE_STORAGE_ACCOUNT_URL,
-            table_name=settings.AZURE_STORAGE_ACCOUNT_TABLE_NAME,
-            credentials=AzureNamedKeyCredential(
-                name=settings.AZURE_TABLE_STORAGE_ACCOUNT_NAME,
-                key=settings.AZURE_STORAGE_ACCOUNT_TABLE_KEY,
-            ),
-        )
-    )
+    azure_table_client: AzureTableClientFactory = get_azure_table_client()
 
     query_filter = QueryFilter(value=short_id)
-    short_url_table_entity: ShortUrlTableEntity = azure_table_client.query_entities(
-        query_filter=query_filter
+    short_url_table_entity: ShortUrlTableEntity = await asyncio.to_thread(
+        azure_table_client.query_entities, query_filter=query_filter
     )
 
     if not short_url_table_entity:
@@ -107,7 +104,7 @@ async def get_url(short_id: str, request: Request) -> RedirectResponse:
         short_url=short_url,
         original_url=short_url_table_entity["url"],
     )
-    logger.warning(request.headers)
+    logger.debug(request.headers)
     logger.info(f"Resolved URL for short id: {short_id}. URL: {response.original_url}.")
 
     metrics_wrapper.increment_most_common_short_urls(
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import time
+from io import BytesIO
+from typing import Awaitable, Callable, Dict
+
+from auth import azure_scheme
+from clients import get_azure_table_client, get_storage_account_client
+from factories.AzureTableClientFactory.models import QueryFilter
+from fastapi import FastAPI
+from health.readiness import (
+    guest_users_storage_account,
+    registered_users_storage_account,
+)
+from telemetry import span_processor
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+async def load_openid_config() -> None:
+    # Fetches the OpenID discovery document and the JWKS signing keys.
+    await azure_scheme.openid_config.load_config()
+
+
+def open_storage_account_connections() -> None:
+    for config in (guest_users_storage_account, registered_users_storage_account):
+        get_storage_account_client(
+            config=config
+        ).blob_service_client.get_account_information()
+
+
+def open_table_connection() -> None:
+    get_azure_table_client().query_entities(query_filter=QueryFilter(value="warmup"))
+
+
+def run_synthetic_resize() -> None:
+    from PIL import Image
+
+    Image.init()
+    image: Image.Image = Image.new(mode="RGB", size=(64, 64))
+    resized_image: Image.Image = image.resize(size=(32, 18))
+    for image_format in ("png", "jpeg"):
+        resized_image.save(BytesIO(), format=image_format)
+
+
+def create_span_exporter() -> None:
+    # The span processor and its gRPC exporter are created on first use.
+    span_processor.span_processor
+
+
+def build_openapi_schema(app: FastAPI) -> None:
+    app.openapi()
+
+
+async def warm_up(app: FastAPI, timeout_seconds: float) -> None:
+    """
+    Prefetch everything the first requests would otherwise pay for: OpenID
+    discovery and signing keys, TLS connections to Blob and Table Storage,
+    Pillow plugins and codecs, the span exporter and the OpenAPI schema. Steps
+    run concurrently and a failing step is logged rather than preventing
+    startup, since each of them is also done lazily on first use.
+    """
+    steps: Dict[str, Callable[[], Awaitable[None]]] = {
+        "openid_config": load_openid_config,
+        "storage_account_connections": lambda: asyncio.to_thread(
+            open_storage_account_connections
+        ),
+        "table_connection": lambda: asyncio.to_thread(open_table_connection),
+        "synthetic_resize": lambda: asyncio.to_thread(run_synthetic_resize),
+        "span_exporter": lambda: asyncio.to_thread(create_span_exporter),
+        "openapi_schema": lambda: asyncio.to_thread(build_openapi_schema, app),
+    }
+
+    started_at: float = time.perf_counter()
+    await asyncio.gather(
+        *[
+            _run_step(name=name, step=step, timeout_seconds=timeout_seconds)
+            for name, step in steps.items()
+        ]
+    )
+    logger.info(f"Warm-up finished in {(time.perf_counter() - started_at):.3f}s")
+
+
+async def _run_step(
+    name: str, step: Callable[[], Awaitable[None]], timeout_seconds: float
+) -> None:
+    started_at: float = time.perf_counter()
+    try:
+        await asyncio.wait_for(step(), timeout=timeout_seconds)
+        logger.info(
+            f"Warm-up step '{name}' finished in {(time.perf_counter() - started_at):.3f}s"
+        )
+    except Exception as e:
+        logger.warning(f"Warm-up step '{name}' failed: {e!r}")
@@ -0,0 +1,125 @@
+import asyncio
+import base64
+import logging
+from typing import BinaryIO, List
+from xml.sax.saxutils import escape
+
+import httpx
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+_RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class BlockUploadFailedException(Exception):
+    def __init__(self, block_id: str, reason: str) -> None:
+        self.block_id: str = block_id
+        self.reason: str = reason
+        super().__init__(f"Block '{block_id}' failed to upload: {reason}")
+
+
+def get_block_id(index: int) -> str:
+    # Block IDs must all have the same length before base64 encoding.
+    return base64.b64encode(f"{index:08d}".encode()).decode()
+
+
+def get_file_size(file: BinaryIO) -> int:
+    position: int = file.tell()
+    size: int = file.seek(0, 2)
+    file.seek(position)
+    return size
+
+
+def create_block_list_xml(block_ids: List[str]) -> str:
+    blocks: str = "".join(
+        f"<Latest>{escape(block_id)}</Latest>" for block_id in block_ids
+    )
+    return f'<?xml version="1.0" encoding="utf-8"?><BlockList>{blocks}</BlockList>'
+
+
+async def put_block(
+    client: httpx.AsyncClient,
+    presigned_url: str,
+    block_id: str,
+    data: bytes,
+    max_attempts: int,
+) -> None:
+    for attempt in range(1, max_attempts + 1):
+        try:
+            response = await client.put(
+                presigned_url,
+                params={"comp": "block", "blockid": block_id},
+                content=data,
+            )
+            if not response.is_error:
+                return
+            reason = f"HTTP {response.status_code}"
+            if response.status_code not in _RETRYABLE_STATUS_CODES:
+                raise BlockUploadFailedException(block_id=block_id, reason=reason)
+        except httpx.TransportError as e:
+            reason = repr(e)
+
+        logger.warning(f"Block '{block_id}' attempt {attempt} failed: {reason}")
+        if attempt < max_attempts:
+            await asyncio.sleep(0.5 * 2 ** (attempt - 1))
+
+    raise BlockUploadFailedException(block_id=block_id, reason=reason)
+
+
+async def upload_in_blocks(
+    client: httpx.AsyncClient,
+    presigned_url: str,
+    file: BinaryIO,
+    block_size: int,
+    max_blocks_in_flight: int,
+    max_attempts: int,
+    content_type: str | None = None,
+) -> None:
+    """
+    Upload `file` to a block blob with Put Block and commit it with Put Block
+    List, using the blob's SAS URL.
+
+    At most `max_blocks_in_flight` blocks are read from the file and uploaded
+    at a time, so memory use is bounded by that many blocks rather than the
+    file size. A failed block is retried on its own; the blob only becomes
+    visible once the block list is committed. An empty file has no blocks and
+    is created with a single Put Blob instead.
+    """
+    headers = {"x-ms-blob-content-type": content_type} if content_type else {}
+    file_size: int = get_file_size(file=file)
+    if not file_size:
+        response = await client.put(
+            presigned_url,
+            content=b"",
+            headers={"x-ms-blob-type": "BlockBlob", **headers},
+        )
+        response.raise_for_status()
+        return
+
+    block_count: int = -(-file_size // block_size)
+    block_ids: List[str] = [get_block_id(index=index) for index in range(block_count)]
+    semaphore = asyncio.Semaphore(max_blocks_in_flight)
+
+    async def upload_block(index: int) -> None:
+        async with semaphore:
+            # Runs on a single event loop, so the seek and read are not
+            # interleaved with another block's.
+            file.seek(index * block_size)
+            data: bytes = file.read(block_size)
+            await put_block(
+                client=client,
+                presigned_url=presigned_url,
+                block_id=block_ids[index],
+                data=data,
+                max_attempts=max_attempts,
+            )
+
+    await asyncio.gather(*[upload_block(index=index) for index in range(block_count)])
+
+    response = await client.put(
+        presigned_url,
+        params={"comp": "blocklist"},
+        content=create_block_list_xml(block_ids=block_ids),
+        headers=headers,
+    )
+    response.raise_for_status()
@@ -0,0 +1,64 @@
+import asyncio
+import importlib.util
+import threading
+from concurrent.futures import Future
+from typing import Coroutine, TypeVar
+
+import httpx
+import streamlit as st
+from settings import settings
+
+T = TypeVar("T")
+
+# HTTP/2 needs the optional `h2` package; without it httpx keeps using pooled
+# HTTP/1.1 keep-alive connections.
+HTTP2_AVAILABLE: bool = importlib.util.find_spec("h2") is not None
+
+
+def _create_timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        timeout=settings.HTTP_TIMEOUT_SECONDS,
+        connect=settings.HTTP_CONNECT_TIMEOUT_SECONDS,
+    )
+
+
+def _create_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.HTTP_MAX_CONNECTIONS,
+        keepalive_expiry=settings.HTTP_KEEPALIVE_EXPIRY_SECONDS,
+    )
+
+
+class AsyncHttpClient:
+    """
+    An `httpx.AsyncClient` that lives on its own event loop thread.
+
+    Streamlit reruns the script for every interaction, and connections pooled
+    by an async client cannot be reused from another event loop, so
+    coroutines are submitted to this long-lived loop with `run` instead of
+    being started with `asyncio.run`.
+    """
+
+    def __init__(self) -> None:
+        self.loop: asyncio.AbstractEventLoop = asyncio.new_event_loop()
+        self.thread = threading.Thread(
+            target=self.loop.run_forever, name="async-http-client", daemon=True
+        )
+        self.thread.start()
+        self.client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE, timeout=_create_timeout(), limits=_create_limits()
+        )
+
+    def submit(self, coroutine: Coroutine[None, None, T]) -> Future[T]:
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def run(self, coroutine: Coroutine[None, None, T]) -> T:
+        return self.submit(coroutine=coroutine).result()
+
+
+# Cached per Streamlit server process, so every session and rerun shares the
+# same connection pools to the API and to Blob Storage.
+@st.cache_resource
+def get_async_http_client() -> AsyncHttpClient:
+    return AsyncHttpClient()
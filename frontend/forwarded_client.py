@@ -0,0 +1,39 @@
+import hashlib
+import hmac
+import time
+from typing import Dict, Mapping
+
+from settings import settings
+
+FORWARDED_CLIENT_HEADER = "X-Forwarded-Client"
+
+
+def get_visitor_address(headers: Mapping[str, str]) -> str | None:
+    # Each trusted proxy appends the address it received the request from,
+    # so the visitor is the entry that many places from the end.
+    forwarded_for = [
+        address.strip()
+        for address in headers.get("X-Forwarded-For", "").split(",")
+        if address.strip()
+    ]
+    proxy_count: int = settings.TRUSTED_PROXY_COUNT
+    if proxy_count and len(forwarded_for) >= proxy_count:
+        return forwarded_for[-proxy_count]
+    return None
+
+
+def create_forwarded_client_headers(address: str | None) -> Dict[str, str]:
+    """
+    An `X-Forwarded-Client` header carrying the visitor's address, signed
+    with the secret shared with the API so that guests are rate limited per
+    visitor rather than as the frontend. Empty when either is unknown.
+    """
+    if not settings.RATE_LIMIT_FORWARDED_CLIENT_SECRET or address is None:
+        return {}
+    expires_at: int = int(time.time()) + settings.FORWARDED_CLIENT_TTL_SECONDS
+    signature: str = hmac.new(
+        key=settings.RATE_LIMIT_FORWARDED_CLIENT_SECRET.encode(),
+        msg=f"{FORWARDED_CLIENT_HEADER}:{expires_at}:{address}".encode(),
+        digestmod=hashlib.sha256,
+    ).hexdigest()
+    return {FORWARDED_CLIENT_HEADER: f"{expires_at}.{signature}.{address}"}
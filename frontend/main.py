@@ -1,9 +1,17 @@
+import asyncio
+from queue import Empty, Queue
+
 import streamlit as st
 import httpx
-from typing import List, Dict, Optional, Annotated
-from pydantic import BaseModel, Field, HttpUrl, UUID4
+from streamlit.delta_generator import DeltaGenerator
+from streamlit.runtime.uploaded_file_manager import UploadedFile
+from typing import BinaryIO, List, Dict, Optional, Annotated, Tuple
+from pydantic import BaseModel, Field, HttpUrl, UUID4, ValidationError
 from enum import Enum
 from settings import settings
+from block_upload import BlockUploadFailedException, upload_in_blocks
+from clients import AsyncHttpClient, get_async_http_client
+from forwarded_client import create_forwarded_client_headers, get_visitor_address
 
 
 class PresignedURLResponse(BaseModel):
@@ -15,7 +23,7 @@ class PresignedURLResponse(BaseModel):
     ]
 
     container_id: Annotated[
-        UUID4, Field(description="The ID of the Azure Storage container")
+        str, Field(description="The ID of the Azure Storage container")
     ]
 
     folder_name: Annotated[
@@ -68,104 +76,367 @@ class ImageResizeAndShortUrlResponse(BaseModel):
     ]
 
 
+class ImageFile(BaseModel):
+    name: Annotated[str, Field(description="The file name within the folder")]
+    url: Annotated[HttpUrl, Field(description="The direct URL to the file")]
+    size: Annotated[int, Field(description="The file size in bytes")]
+
+
+class FolderContentsResponse(BaseModel):
+    container_name: Annotated[str, Field(description="The container ID")]
+    folder_name: Annotated[str | None, Field(description="The listed folder")] = None
+    folders: Annotated[List[str], Field(description="The folders in the listing")] = []
+    image_files: Annotated[
+        List[ImageFile], Field(description="The files in the listing")
+    ] = []
+    continuation_token: Annotated[
+        str | None, Field(description="The token for the next page")
+    ] = None
+
+
+class FolderListing(BaseModel):
+    container_name: Annotated[str, Field(description="The container ID")]
+    folder_name: Annotated[str, Field(description="The folder name")]
+    image_files: Annotated[
+        List[ImageFile], Field(description="Every file in the folder")
+    ] = []
+    error: Annotated[str | None, Field(description="Why the listing failed")] = None
+
+
+class UploadStep(str, Enum):
+    PENDING = "Waiting"
+    PRESIGNED = "Presigned"
+    UPLOADED = "Uploaded, resizing"
+    RESIZED = "Done"
+    FAILED = "Failed"
+
+
+class UploadProgress(BaseModel):
+    file_id: Annotated[str, Field(description="The Streamlit ID of the uploaded file")]
+    filename: Annotated[str, Field(description="The name of the uploaded file")]
+    step: Annotated[UploadStep, Field(description="The last step that finished")] = (
+        UploadStep.PENDING
+    )
+    presigned_data: Annotated[
+        PresignedURLResponse | None, Field(description="The presigned URL response")
+    ] = None
+    responses: Annotated[
+        List[ImageResizeAndShortUrlResponse],
+        Field(description="The resized images and their short URLs"),
+    ] = []
+    error: Annotated[str | None, Field(description="Why the upload failed")] = None
+
+
 # Initialize session state for caching container-folder pairs
 if "container_folder_pairs" not in st.session_state:
     st.session_state.container_folder_pairs = []
 
+# Finished uploads by file ID, so reruns do not upload the same file again
+if "upload_progress" not in st.session_state:
+    st.session_state.upload_progress = {}
+
 
 class ImageHandler:
-    def __init__(self, backend_url: str):
+    """
+    API and Blob Storage calls. They are coroutines for the shared async
+    client's event loop, e.g. `image_handler.async_http_client.run(...)`.
+    """
+
+    def __init__(
+        self,
+        backend_url: str,
+        async_http_client: Optional[AsyncHttpClient] = None,
+        visitor_address: Optional[str] = None,
+    ):
         self.backend_url = backend_url
+        self.async_http_client = async_http_client or get_async_http_client()
+        self.visitor_address = visitor_address
+
+    def get_api_headers(self) -> Dict[str, str]:
+        # Signed per request, as uploads can outlive a single signature.
+        return create_forwarded_client_headers(address=self.visitor_address)
+
+    async def get_presigned_url(self, filename: str) -> PresignedURLResponse:
+        response = await self.async_http_client.client.post(
+            f"{self.backend_url}guest/photos/get-signed-url",
+            json={"name": filename},
+            headers=self.get_api_headers(),
+        )
+        response.raise_for_status()
+        return PresignedURLResponse(**response.json())
+
+    async def upload_image(
+        self, presigned_url: str, file: BinaryIO, content_type: str | None = None
+    ) -> None:
+        await upload_in_blocks(
+            client=self.async_http_client.client,
+            presigned_url=presigned_url,
+            file=file,
+            block_size=settings.UPLOAD_BLOCK_SIZE_BYTES,
+            max_blocks_in_flight=settings.UPLOAD_MAX_BLOCKS_IN_FLIGHT,
+            max_attempts=settings.UPLOAD_BLOCK_MAX_ATTEMPTS,
+            content_type=content_type,
+        )
 
-    def get_presigned_url(self, filename: str) -> PresignedURLResponse:
-        with httpx.Client(timeout=10) as client:
-            response = client.post(
-                f"{self.backend_url}guest/photos/get-signed-url",
-                json={"filename": filename},
-            )
-            if response.is_error:
-                st.error("Failed to get a presigned URL. Please try again.")
-                return None
-            return PresignedURLResponse(**response.json())
-
-    def upload_image(self, presigned_url: str, file_content: bytes) -> bool:
-        with httpx.Client(
-            timeout=10, headers={"x-ms-blob-type": "BlockBlob"}
-        ) as client:
-            response = client.put(presigned_url, content=file_content)
-            if response.is_error:
-                st.error("Failed to upload the image. Please try again.")
-                return False
-            return True
-
-    def request_image_resize(self, url: str) -> Optional[List[str]]:
-        with httpx.Client(timeout=10) as client:
-            response = client.post(
-                f"{self.backend_url}orchestrate",
-                json={
-                    "url": url,
-                },
-            )
-            if response.is_error:
-                st.error("Failed to resize the image. Please try again.")
-                return None
-            return response.json()
+    async def request_image_resize(
+        self, url: str
+    ) -> List[ImageResizeAndShortUrlResponse]:
+        response = await self.async_http_client.client.post(
+            f"{self.backend_url}orchestrate",
+            json={
+                "url": url,
+            },
+            headers=self.get_api_headers(),
+        )
+        response.raise_for_status()
+        return [
+            ImageResizeAndShortUrlResponse(**responses) for responses in response.json()
+        ]
 
     async def list_folder_contents(
-        self, container_name: str, folder_name: str
-    ) -> Optional[List[Dict]]:
-        async with httpx.AsyncClient(timeout=10) as client:
-            response = await client.get(
-                f"{self.backend_url}/list-folder-contents",
-                params={"container_name": container_name, "folder_name": folder_name},
+        self,
+        container_name: str,
+        folder_name: str | None = None,
+        continuation_token: str | None = None,
+    ) -> FolderContentsResponse:
+        params = {
+            "container_name": container_name,
+            "page_size": settings.FOLDER_LISTING_PAGE_SIZE,
+        }
+        if folder_name:
+            params["folder_name"] = folder_name
+        if continuation_token:
+            params["continuation_token"] = continuation_token
+        response = await self.async_http_client.client.get(
+            f"{self.backend_url}guest/photos/list-folder-contents",
+            params=params,
+            headers=self.get_api_headers(),
+        )
+        response.raise_for_status()
+        return FolderContentsResponse(**response.json())
+
+
+async def upload_files(
+    image_handler: ImageHandler,
+    files: List[UploadedFile],
+    max_concurrent_uploads: int,
+    progress_queue: "Queue[UploadProgress]",
+) -> None:
+    """
+    Presign every file at once, then upload at most `max_concurrent_uploads`
+    files at a time and request the resize of each file as soon as its own
+    upload finishes. Every finished step is put on `progress_queue`.
+    """
+    semaphore = asyncio.Semaphore(max_concurrent_uploads)
+
+    async def upload_file(file: UploadedFile) -> None:
+        progress = UploadProgress(file_id=file.file_id, filename=file.name)
+        try:
+            progress.presigned_data = await image_handler.get_presigned_url(
+                filename=file.name
+            )
+            progress.step = UploadStep.PRESIGNED
+            progress_queue.put(progress.model_copy())
+
+            async with semaphore:
+                await image_handler.upload_image(
+                    presigned_url=str(progress.presigned_data.url),
+                    file=file,
+                    content_type=file.type,
+                )
+            progress.step = UploadStep.UPLOADED
+            progress_queue.put(progress.model_copy())
+
+            progress.responses = await image_handler.request_image_resize(
+                url=str(progress.presigned_data.url)
             )
-            if response.is_error:
-                st.error(f"Failed to list images for {folder_name}. Please try again.")
-                return None
-            return response.json().get("image_files", [])
+            progress.step = UploadStep.RESIZED
+        except (BlockUploadFailedException, httpx.HTTPError, ValidationError) as e:
+            # A response the models reject fails this file, not the whole batch
+            progress.step = UploadStep.FAILED
+            progress.error = str(e)
+        progress_queue.put(progress)
+
+    await asyncio.gather(*[upload_file(file=file) for file in files])
+
+
+def render_upload_progress(progress: UploadProgress) -> None:
+    if progress.step is UploadStep.FAILED:
+        st.error(f"{progress.filename}: upload failed. Please try again.")
+        return
+
+    st.write(f"**{progress.filename}**: {progress.step.value}")
+    for response in progress.responses:
+        st.write(
+            f"Short URL for {response.image_resize_response.resolution.value} image."
+        )
+        st.code(response.short_url_response.short_url, language="html")
 
 
 def handle_image_upload(image_handler: ImageHandler):
-    uploaded_file = st.file_uploader(
-        "Upload an image", type=["png", "jpeg"], accept_multiple_files=False
+    uploaded_files: List[UploadedFile] = st.file_uploader(
+        "Upload images", type=["png", "jpeg"], accept_multiple_files=True
     )
-    if not uploaded_file:
+    if not uploaded_files:
+        return
+
+    upload_progress: Dict[str, UploadProgress] = st.session_state.upload_progress
+    placeholders: Dict[str, DeltaGenerator] = {}
+    for file in uploaded_files:
+        placeholders[file.file_id] = st.empty()
+        if not file.size:
+            placeholders[file.file_id].error(f"{file.name}: the file is empty.")
+            continue
+        progress = upload_progress.get(
+            file.file_id, UploadProgress(file_id=file.file_id, filename=file.name)
+        )
+        with placeholders[file.file_id].container():
+            render_upload_progress(progress=progress)
+
+    pending_files: List[UploadedFile] = [
+        file
+        for file in uploaded_files
+        if file.size and file.file_id not in upload_progress
+    ]
+    if not pending_files:
         return
 
-    print(uploaded_file.name)
+    # The pipeline runs on the async client's loop thread, which cannot draw
+    # on the page, so its progress is rendered here as it arrives.
+    progress_queue: "Queue[UploadProgress]" = Queue()
+    future = image_handler.async_http_client.submit(
+        upload_files(
+            image_handler=image_handler,
+            files=pending_files,
+            max_concurrent_uploads=settings.UPLOAD_MAX_CONCURRENT_FILES,
+            progress_queue=progress_queue,
+        )
+    )
+    while not (future.done() and progress_queue.empty()):
+        try:
+            progress = progress_queue.get(timeout=0.1)
+        except Empty:
+            continue
+        with placeholders[progress.file_id].container():
+            render_upload_progress(progress=progress)
+        if progress.step in (UploadStep.RESIZED, UploadStep.FAILED):
+            if progress.step is UploadStep.RESIZED:
+                upload_progress[progress.file_id] = progress
+                st.session_state.container_folder_pairs.append(
+                    (
+                        progress.presigned_data.container_id,
+                        progress.presigned_data.folder_name,
+                    )
+                )
+    future.result()
+
+
+async def list_folders(
+    image_handler: ImageHandler,
+    folders: List[Tuple[str, str]],
+    max_concurrent_requests: int,
+    listing_queue: "Queue[FolderListing]",
+) -> None:
+    """
+    List the given (container, folder) pairs concurrently, walking the pages
+    of each folder. Each listed folder is put on `listing_queue`.
+    """
+    semaphore = asyncio.Semaphore(max_concurrent_requests)
+
+    async def list_folder(container_name: str, folder_name: str) -> None:
+        listing = FolderListing(container_name=container_name, folder_name=folder_name)
+        continuation_token: str | None = None
+        try:
+            while True:
+                async with semaphore:
+                    page = await image_handler.list_folder_contents(
+                        container_name=container_name,
+                        folder_name=folder_name,
+                        continuation_token=continuation_token,
+                    )
+                listing.image_files.extend(page.image_files)
+                continuation_token = page.continuation_token
+                if not continuation_token:
+                    break
+        except (httpx.HTTPError, ValidationError) as e:
+            listing.error = str(e)
+        listing_queue.put(listing)
+
+    await asyncio.gather(
+        *[
+            list_folder(container_name=container_name, folder_name=folder_name)
+            for container_name, folder_name in folders
+        ]
+    )
 
-    filename = uploaded_file.name
 
-    presigned_data = image_handler.get_presigned_url(filename)
-    if not presigned_data:
+def render_folder_listing(listing: FolderListing) -> None:
+    if listing.error:
+        st.error(
+            f"Failed to list images for {listing.folder_name or listing.container_name}. Please try again."
+        )
         return
 
-    image_handler.upload_image(str(presigned_data.url), uploaded_file.getvalue())
+    with st.expander(f"{listing.folder_name} ({len(listing.image_files)} images)"):
+        for image_file in listing.image_files:
+            st.markdown(f"[{image_file.name}]({image_file.url})")
 
-    st.success("Image uploaded successfully!")
 
-    image_resize_and_short_url_responses: List[ImageResizeAndShortUrlResponse] = [
-        ImageResizeAndShortUrlResponse(**responses)
-        for responses in image_handler.request_image_resize(url=str(presigned_data.url))
+def handle_list_image_folders(image_handler: ImageHandler):
+    container_name: str = st.text_input(
+        "Container ID", placeholder="Leave empty to list the uploads of this session"
+    )
+    # Guests may only list the folders (unguessable upload UUIDs) of their own
+    # uploads, so this session's uploads are listed folder by folder, those in
+    # the given container only if one is entered.
+    folders: List[Tuple[str, str]] = [
+        (container_id, folder_name)
+        for container_id, folder_name in dict.fromkeys(
+            (str(container_id), str(folder_name))
+            for container_id, folder_name in st.session_state.container_folder_pairs
+        )
+        if not container_name or container_id == container_name.strip()
     ]
+    if not folders:
+        st.info("Upload an image to list its folder.")
+        return
 
-    print(image_resize_and_short_url_responses)
-
-    st.write("Image resizing completed. Here are the resized images:")
-    for response in image_resize_and_short_url_responses:
-        st.write(
-            f"Short URL for {response.image_resize_response.resolution.value} image."
+    # Folders are rendered in the order their listings finish.
+    listing_queue: "Queue[FolderListing]" = Queue()
+    future = image_handler.async_http_client.submit(
+        list_folders(
+            image_handler=image_handler,
+            folders=folders,
+            max_concurrent_requests=settings.FOLDER_LISTING_MAX_CONCURRENT_REQUESTS,
+            listing_queue=listing_queue,
         )
-        st.code(response.short_url_response.short_url, language="html")
+    )
+    folder_count: int = 0
+    while not (future.done() and listing_queue.empty()):
+        try:
+            listing = listing_queue.get(timeout=0.1)
+        except Empty:
+            continue
+        render_folder_listing(listing=listing)
+        folder_count += 1
+    future.result()
+
+    if not folder_count:
+        st.info("No folders found.")
 
 
 def main():
-    image_handler = ImageHandler(backend_url=str(settings.BACKEND_API_URL))
+    image_handler = ImageHandler(
+        backend_url=str(settings.BACKEND_API_URL),
+        visitor_address=get_visitor_address(headers=st.context.headers),
+    )
     menu_options = ["Upload Image", "List Image Folders"]
     selected_option = st.sidebar.radio("Navigate", menu_options)
 
     if selected_option == "Upload Image":
         handle_image_upload(image_handler)
+    elif selected_option == "List Image Folders":
+        handle_list_image_folders(image_handler)
 
 
 if __name__ == "__main__":
@@ -1,4 +1,4 @@
-from pydantic import HttpUrl
+from pydantic import Field, HttpUrl
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -6,6 +6,31 @@ class Settings(BaseSettings):
     BACKEND_API_URL: HttpUrl
     OTEL_EXPORTER_OTLP_ENDPOINT: str
 
+    # HTTP client settings
+    HTTP_TIMEOUT_SECONDS: float = 30
+    HTTP_CONNECT_TIMEOUT_SECONDS: float = 5
+    HTTP_MAX_CONNECTIONS: int = 20
+    HTTP_KEEPALIVE_EXPIRY_SECONDS: float = 60
+
+    # Block upload settings
+    UPLOAD_BLOCK_SIZE_BYTES: int = Field(default=4 * 1024 * 1024, gt=0)
+    UPLOAD_MAX_BLOCKS_IN_FLIGHT: int = Field(default=4, gt=0)
+    UPLOAD_BLOCK_MAX_ATTEMPTS: int = Field(default=3, gt=0)
+    UPLOAD_MAX_CONCURRENT_FILES: int = Field(default=3, gt=0)
+
+    # Guests are rate limited by the address the API sees, which is the
+    # frontend's, so each visitor's address is forwarded to it in a header
+    # signed with this secret (the API's RATE_LIMIT_FORWARDED_CLIENT_SECRET).
+    RATE_LIMIT_FORWARDED_CLIENT_SECRET: str | None = None
+    FORWARDED_CLIENT_TTL_SECONDS: int = Field(default=60, gt=0)
+    # Proxies in front of the frontend that append to X-Forwarded-For (the
+    # Container Apps ingress); the visitor is the address before them.
+    TRUSTED_PROXY_COUNT: int = Field(default=1, ge=0)
+
+    # Folder listing settings
+    FOLDER_LISTING_PAGE_SIZE: int = Field(default=100, gt=0)
+    FOLDER_LISTING_MAX_CONCURRENT_REQUESTS: int = Field(default=8, gt=0)
+
     model_config = SettingsConfigDict(
         env_file=".env", env_file_encoding="utf-8", extra="ignore"
     )
@@ -37,6 +37,11 @@ resource "azurerm_container_app" "frontend" {
         name  = "OTEL_EXPORTER_OTLP_ENDPOINT"
         value = local.otel_exporter_otlp_endpoint
       }
+
+      env {
+        name  = "RATE_LIMIT_FORWARDED_CLIENT_SECRET"
+        value = var.rate_limit_forwarded_client_secret
+      }
       cpu    = 0.25
       memory = "0.5Gi"
     }
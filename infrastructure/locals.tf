@@ -34,6 +34,8 @@ locals {
     "ALLOWED_HOSTS"               = "https://fe.${azurerm_dns_zone.env_dns.name},https://${azurerm_container_app.frontend.ingress[0].fqdn}"
 
     "CUSTOM_DNS" = "api.${var.env}.${var.dns_zone_name}"
+
+    "RATE_LIMIT_FORWARDED_CLIENT_SECRET" = var.rate_limit_forwarded_client_secret
   }
 
   kql_queries = { for file in fileset(path.module, "kql/*.kql") : file => file("${path.module}/${file}") }
@@ -18,6 +18,12 @@ variable "source_acr_server_name" {
   type        = string
 }
 
+variable "rate_limit_forwarded_client_secret" {
+  description = "The secret the frontend signs visitor addresses with, so the API rate limits guests per visitor"
+  type        = string
+  sensitive   = true
+}
+
 variable "dns_zone_name" {
   description = "The DNS zone name to use for the custom DNS configuration"
   type        = string